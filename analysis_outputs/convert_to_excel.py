@@ -1,31 +1,21 @@
-﻿import sys
+﻿import os
+import sys
 import csv
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment
 
-if len(sys.argv) != 3:
-    raise SystemExit("Usage: python convert_to_excel.py <src_csv> <dst_xlsx>")
+from xlsx_export import append_sheet, new_workbook
 
-src_path, dst_path = sys.argv[1:3]
+if len(sys.argv) < 3:
+    raise SystemExit("Usage: python convert_to_excel.py <src_csv> [<src_csv> ...] <dst_xlsx>")
 
-wb = Workbook()
-ws = wb.active
-ws.title = "Respuestas"
+*src_paths, dst_path = sys.argv[1:]
 
-with open(src_path, "r", encoding="utf-8") as f:
-    reader = csv.reader(f)
-    headers = next(reader)
-    ws.append(headers)
-    for row in reader:
-        ws.append(row)
-
-wrap = Alignment(wrap_text=True, vertical="top")
-for col in range(1, ws.max_column + 1):
-    letter = get_column_letter(col)
-    ws.column_dimensions[letter].width = 45 if col > 1 else 8
-    for row in range(1, ws.max_row + 1):
-        cell = ws.cell(row=row, column=col)
-        cell.alignment = wrap
+wb = new_workbook()
+for src_path in src_paths:
+    # One sheet per CSV (e.g. per evaluation run), named after the file when there are several.
+    title = "Respuestas" if len(src_paths) == 1 else os.path.splitext(os.path.basename(src_path))[0]
+    with open(src_path, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        headers = next(reader)
+        append_sheet(wb, title, headers, reader, widths={1: 8}, default_width=45)
 
 wb.save(dst_path)
@@ -0,0 +1,179 @@
+﻿import os
+import glob
+import json
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+try:
+    import ijson
+except ImportError:  # falls back to json.load, which reads whole dumps into memory
+    ijson = None
+
+BASE_DIR = r'D:\OneDrive\GitHub\premiumnutrition'
+EXEC_DIR = os.path.join(BASE_DIR, 'EJECUCIONES')
+PATTERN = os.path.join(EXEC_DIR, 'ejecucion-*-success.json')
+OUTPUT_DIR = os.path.join(BASE_DIR, 'dashboards_premiunnutrition', 'analysis_outputs')
+# Manifest of parsed executions plus what was extracted from them; shared by every report script.
+INDEX_PATH = os.path.join(OUTPUT_DIR, 'ejecuciones.sqlite')
+INDEX_VERSION = 3
+
+RUN_DATA_PREFIX = 'data.resultData.runData'
+QUESTION_NODE = 'Webhook1'
+MODEL_NODE = 'OpenAI Chat Model2'
+
+RE_JSON_BLOCK = re.compile(r"`json\s*(\{.*?\})\s*`", re.DOTALL)
+RE_URL = re.compile(r"https?://\S+")
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.svg')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS executions (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    run_id INTEGER,
+    question TEXT,
+    generation TEXT,
+    response TEXT
+);
+CREATE TABLE IF NOT EXISTS image_urls (
+    path TEXT NOT NULL,
+    url TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS image_urls_path ON image_urls (path);
+"""
+
+
+def extract_plain_response(text: str) -> str:
+    if not text:
+        return ''
+    match = RE_JSON_BLOCK.search(text)
+    if match:
+        payload = match.group(1)
+        try:
+            parsed = json.loads(payload)
+        except json.JSONDecodeError:
+            pass
+        else:
+            respuesta = parsed.get('output', {}).get('respuesta')
+            if isinstance(respuesta, list):
+                return '\n'.join(str(item) for item in respuesta)
+            if isinstance(respuesta, str):
+                return respuesta
+    return text
+
+
+def extract_image_urls(text: str) -> list[str]:
+    """Image links in ``text``; the extension is read from the path, so CDN links with ``?v=...`` count."""
+    urls = []
+    for url in RE_URL.findall(text):
+        cleaned = url.rstrip('.,);]"\' ')
+        if urlsplit(cleaned).path.lower().endswith(IMAGE_EXTENSIONS) and cleaned not in urls:
+            urls.append(cleaned)
+    return urls
+
+
+def _read_nodes(f):
+    """Top-level id and the question and model nodes of a dump, building nothing else."""
+    if ijson is None:
+        data = json.load(f)
+        run_data = data.get('data', {}).get('resultData', {}).get('runData', {})
+        return data.get('id'), {node: run_data.get(node) for node in (QUESTION_NODE, MODEL_NODE)}
+
+    run_id = None
+    builders = {}
+    for prefix, event, value in ijson.parse(f):
+        if prefix == 'id':
+            run_id = value
+            continue
+        if not prefix.startswith(RUN_DATA_PREFIX + '.'):
+            continue
+        path = prefix[len(RUN_DATA_PREFIX) + 1:]
+        for node in (QUESTION_NODE, MODEL_NODE):
+            if path == node or path.startswith(node + '.'):
+                builders.setdefault(node, ijson.ObjectBuilder()).event(event, value)
+                break
+    return run_id, {node: builder.value for node, builder in builders.items()}
+
+
+def parse_execution(filepath):
+    """(run_id, question, generation, plain response, image URLs) of one execution dump; missing parts are None."""
+    with open(filepath, 'rb') as f:
+        run_id, nodes = _read_nodes(f)
+    run_id = int(run_id) if run_id is not None else None
+
+    try:
+        question = nodes[QUESTION_NODE][0]['data']['main'][0][0]['json']['body']['message[add][0][text]']
+    except (KeyError, IndexError, TypeError):
+        question = None
+    generation = None
+    for run in nodes.get(MODEL_NODE) or []:
+        try:
+            gens = run['data']['ai_languageModel'][0][0]['json']['response']['generations']
+            if gens and gens[0] and gens[0][0].get('text'):
+                generation = gens[0][0]['text']
+                break
+        except (KeyError, IndexError, TypeError):
+            continue
+
+    if generation is None:
+        return run_id, question, None, None, []
+    response = extract_plain_response(generation)
+    return run_id, question, generation, response, extract_image_urls(response)
+
+
+def open_index(path=INDEX_PATH):
+    conn = sqlite3.connect(path)
+    if conn.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION:
+        conn.executescript('DROP TABLE IF EXISTS executions; DROP TABLE IF EXISTS image_urls;')
+        conn.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def refresh_index(conn, pattern=PATTERN, workers=None):
+    """Parse new or changed dumps in a process pool and drop rows of deleted ones; returns (parsed, removed)."""
+    on_disk = {}
+    for filepath in glob.glob(pattern):
+        stat = os.stat(filepath)
+        on_disk[filepath] = (stat.st_mtime_ns, stat.st_size)
+    manifest = {
+        path: (mtime_ns, size)
+        for path, mtime_ns, size in conn.execute('SELECT path, mtime_ns, size FROM executions')
+    }
+
+    changed = [path for path, signature in on_disk.items() if manifest.get(path) != signature]
+    removed = [path for path in manifest if path not in on_disk]
+    stale = [(path,) for path in changed + removed]
+    conn.executemany('DELETE FROM executions WHERE path = ?', stale)
+    conn.executemany('DELETE FROM image_urls WHERE path = ?', stale)
+
+    if changed:
+        chunksize = max(1, len(changed) // (4 * (workers or os.cpu_count() or 1)))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parsed = list(executor.map(parse_execution, changed, chunksize=chunksize))
+        # Dumps with nothing to extract are recorded too, so they are not parsed again.
+        conn.executemany(
+            'INSERT INTO executions VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(path, *on_disk[path], *row[:4]) for path, row in zip(changed, parsed)],
+        )
+        conn.executemany(
+            'INSERT INTO image_urls VALUES (?, ?)',
+            [(path, url) for path, row in zip(changed, parsed) for url in row[4]],
+        )
+    conn.commit()
+    return len(changed), len(removed)
+
+
+def load_index(path=INDEX_PATH, pattern=PATTERN, workers=None):
+    """Open the index and bring it up to date with the dumps on disk."""
+    conn = open_index(path)
+    parsed, removed = refresh_index(conn, pattern, workers)
+    if parsed or removed:
+        print(f'Indexed {parsed} new or changed executions, removed {removed}.')
+    return conn
+
+
+def image_urls(conn):
+    return [url for (url,) in conn.execute('SELECT DISTINCT url FROM image_urls ORDER BY url')]
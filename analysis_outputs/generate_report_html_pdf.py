@@ -1,70 +1,15 @@
 ﻿import os
-import glob
-import json
-import re
 from markdown import markdown
 from xhtml2pdf import pisa
 
-BASE_DIR = r'D:\OneDrive\GitHub\premiumnutrition'
-EXEC_DIR = os.path.join(BASE_DIR, 'EJECUCIONES')
-PATTERN = os.path.join(EXEC_DIR, 'ejecucion-*-success.json')
+from execution_logs import EXEC_DIR, image_urls, load_index
+
 TARGET_MARKDOWN = [
     os.path.join(EXEC_DIR, 'INFORME_ANALISIS_WORKFLOW.md'),
     os.path.join(EXEC_DIR, 'INFORME_FINAL_ANALISIS_KOMMO.md'),
     os.path.join(EXEC_DIR, 'PROMPT_ANALISIS_AGENTE_KOMMO.md'),
 ]
 
-RE_JSON_BLOCK = re.compile(r"`json\s*(\{.*?\})\s*`", re.DOTALL)
-RE_URL = re.compile(r"https?://\S+")
-IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.gif', '.svg')
-
-
-def extract_plain_response(text: str) -> str:
-    if not text:
-        return ''
-    match = RE_JSON_BLOCK.search(text)
-    if match:
-        payload = match.group(1)
-        try:
-            parsed = json.loads(payload)
-        except json.JSONDecodeError:
-            pass
-        else:
-            respuesta = parsed.get('output', {}).get('respuesta')
-            if isinstance(respuesta, list):
-                return "\n".join(str(item) for item in respuesta)
-            if isinstance(respuesta, str):
-                return respuesta
-    return text
-
-
-def gather_image_urls() -> list[str]:
-    urls = set()
-    for filepath in glob.glob(PATTERN):
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        run_data = data.get('data', {}).get('resultData', {}).get('runData', {})
-        node_runs = run_data.get('OpenAI Chat Model2')
-        if not node_runs:
-            continue
-        actual_raw = None
-        for run in node_runs:
-            try:
-                gens = run['data']['ai_languageModel'][0][0]['json']['response']['generations']
-                if gens and gens[0] and gens[0][0].get('text'):
-                    actual_raw = gens[0][0]['text']
-                    break
-            except (KeyError, IndexError, TypeError):
-                continue
-        if not actual_raw:
-            continue
-        plain = extract_plain_response(actual_raw)
-        for url in RE_URL.findall(plain):
-            cleaned = url.rstrip('.,);]"\'")')
-            if cleaned.lower().endswith(IMAGE_EXTENSIONS):
-                urls.add(cleaned)
-    return sorted(urls)
-
 
 def html_template(title: str, body_html: str, image_urls: list[str]) -> str:
     annex = ['<h2>Anexo: URLs de imágenes provenientes de respuestas</h2>']
@@ -127,10 +72,12 @@ def convert_markdown(md_path: str, image_urls: list[str]):
 
 
 def main():
-    image_urls = gather_image_urls()
+    conn = load_index()
+    urls = image_urls(conn)
+    conn.close()
     for md_path in TARGET_MARKDOWN:
         if os.path.exists(md_path):
-            convert_markdown(md_path, image_urls)
+            convert_markdown(md_path, urls)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,205 @@
+﻿import os
+import re
+import sys
+import json
+import codecs
+import argparse
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from execution_logs import BASE_DIR, OUTPUT_DIR
+
+# The catalog index and the classification rules live with the analysis pipeline at the repo root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analyze_bulk_data import CLASSIFICATION_RULES  # noqa: E402
+from catalog_index import CatalogIndex  # noqa: E402
+
+INPUT_PATH = os.path.join(OUTPUT_DIR, 'tabla_respuestas.csv')
+CATALOG_CSV = os.path.join(BASE_DIR, 'dashboards_premiunnutrition', 'products_aggregated.csv')
+SCORES_NAME = 'puntajes_respuestas'
+# Columns of the workbook written by build_table.py, mapped to the CSV ones.
+WORKBOOK_COLUMNS = {
+    'Pregunta': 'Question',
+    'Respuesta agente': 'ActualResponse',
+    'Respuesta esperada': 'ExpectedResponse',
+}
+
+NGRAM = 3
+LOWEST_SCORES = 10
+RE_WORD = r'\w+'
+ARTICLES = {'el', 'la', 'los', 'las', 'lo', 'un', 'una', 'unos', 'unas'}
+# UTF-8 text that was decoded as cp1252 somewhere upstream ("proteÃ­na", "ðŸ’ª").
+RE_MOJIBAKE = re.compile('[\u00c3\u00c2][\u0080-\u00bf]|\u00e2\u20ac|\u00f0\u0178')
+
+
+def _undo_cp1252(error):
+    # Bytes cp1252 leaves undefined survive as their latin-1 control characters; anything else is kept as UTF-8.
+    char = error.object[error.start]
+    return (char.encode('latin-1') if ord(char) < 256 else char.encode('utf-8')), error.start + 1
+
+
+codecs.register_error('undo_cp1252', _undo_cp1252)
+
+
+def repair_text(text):
+    if not RE_MOJIBAKE.search(text):
+        return text
+    return text.encode('cp1252', errors='undo_cp1252').decode('utf-8', errors='replace')
+
+
+def normalize(texts):
+    """Repaired, accent-free, lower-case text with collapsed whitespace."""
+    return (
+        texts.fillna('').astype(str).map(repair_text)
+        .str.normalize('NFKD')
+        .str.replace('[\u0300-\u036f]', '', regex=True)
+        .str.lower()
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+
+
+def token_counts(left, right):
+    """Word count matrices of two aligned text series over one vocabulary, articles dropped."""
+    n_rows = len(left)
+    tokens = pd.concat([left.str.findall(RE_WORD), right.str.findall(RE_WORD)], ignore_index=True).explode()
+    tokens = tokens[tokens.notna() & ~tokens.isin(ARTICLES)]
+    codes, vocabulary = pd.factorize(tokens)
+    counts = sparse.csr_matrix(
+        (np.ones(len(codes)), (tokens.index.to_numpy(), codes)), shape=(2 * n_rows, len(vocabulary))
+    )
+    return counts[:n_rows], counts[n_rows:]
+
+
+def token_f1(left, right):
+    """Bag-of-words precision, recall and F1 of ``left`` against ``right`` (SQuAD-style), row by row."""
+    actual, expected = token_counts(left, right)
+    overlap = np.asarray(actual.minimum(expected).sum(axis=1)).ravel()
+    actual_total = np.asarray(actual.sum(axis=1)).ravel()
+    expected_total = np.asarray(expected.sum(axis=1)).ravel()
+    precision = np.divide(overlap, actual_total, out=np.zeros_like(overlap), where=actual_total > 0)
+    recall = np.divide(overlap, expected_total, out=np.zeros_like(overlap), where=expected_total > 0)
+    total = precision + recall
+    f1 = np.divide(2 * precision * recall, total, out=np.zeros_like(total), where=total > 0)
+    # Two empty answers agree completely.
+    f1[(actual_total == 0) & (expected_total == 0)] = 1.0
+    return precision, recall, f1
+
+
+def char_ngram_counts(texts, n=NGRAM):
+    """Sparse (text x character n-gram) counts, built from one code-point array for all texts."""
+    padded = [f' {text} ' for text in texts]
+    codes = np.frombuffer('\0'.join(padded).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    separator = codes == 0
+    length = len(codes) - n + 1
+    gram = np.zeros(length, dtype=np.uint64)
+    crosses = np.zeros(length, dtype=bool)
+    for offset in range(n):
+        # Code points fit in 21 bits, so three of them pack losslessly into one integer.
+        gram = (gram << np.uint64(21)) | codes[offset:offset + length]
+        crosses |= separator[offset:offset + length]
+    rows = np.cumsum(separator)[:length][~crosses]
+    columns, vocabulary = pd.factorize(gram[~crosses])
+    return sparse.csr_matrix((np.ones(len(columns)), (rows, columns)), shape=(len(padded), len(vocabulary)))
+
+
+def tfidf_cosine(left, right, n=NGRAM):
+    """Cosine between the character n-gram TF-IDF vectors of aligned texts, for all rows at once."""
+    counts = char_ngram_counts(list(left) + list(right), n)
+    document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1
+    weights = counts.copy()
+    weights.data = 1 + np.log(weights.data)
+    weights = weights @ sparse.diags(idf)
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+    weights = sparse.diags(np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)) @ weights
+    n_rows = len(left)
+    return np.asarray(weights[:n_rows].multiply(weights[n_rows:]).sum(axis=1)).ravel()
+
+
+def score_frame(frame, index):
+    actual = normalize(frame['ActualResponse'])
+    expected = normalize(frame['ExpectedResponse'])
+    precision, recall, f1 = token_f1(actual, expected)
+
+    agent = index.scan_many(actual)
+    wanted = index.scan_many(expected)
+    product_recall = [
+        len(set(expected_ids) & set(agent_ids)) / len(expected_ids) if expected_ids else np.nan
+        for expected_ids, agent_ids in zip(wanted['product_ids'], agent['product_ids'])
+    ]
+    return pd.DataFrame(
+        {
+            'Id': frame['Id'].to_numpy(),
+            'Question': frame['Question'].fillna('').astype(str).map(repair_text).to_numpy(),
+            'token_precision': precision,
+            'token_recall': recall,
+            'token_f1': f1,
+            'tfidf_cosine': tfidf_cosine(actual, expected),
+            'expected_products': wanted['titles'].str.join(' | ').to_numpy(),
+            'agent_products': agent['titles'].str.join(' | ').to_numpy(),
+            'agent_product_ids': agent['product_ids'].str.join(' | ').to_numpy(),
+            'agent_categories': agent['categories'].str.join(' | ').to_numpy(),
+            'catalog_products_named': agent['product_ids'].str.len().to_numpy(),
+            'hero_products_named': agent['hero_products'].to_numpy(),
+            'product_recall': product_recall,
+        }
+    )
+
+
+def summarize(scores, index):
+    with_expected = scores['product_recall'].notna()
+    product_recall = scores.loc[with_expected, 'product_recall'].mean() if with_expected.any() else None
+    lowest = scores.nsmallest(LOWEST_SCORES, 'tfidf_cosine')
+    named = scores['agent_product_ids'].str.split(' | ', regex=False).explode()
+    return {
+        'rows': int(len(scores)),
+        'token_f1_mean': float(scores['token_f1'].mean()),
+        'token_f1_median': float(scores['token_f1'].median()),
+        'tfidf_cosine_mean': float(scores['tfidf_cosine'].mean()),
+        'tfidf_cosine_median': float(scores['tfidf_cosine'].median()),
+        'rows_with_expected_products': int(with_expected.sum()),
+        'product_recall_mean': None if product_recall is None else float(product_recall),
+        'share_naming_catalog_products': float((scores['catalog_products_named'] > 0).mean()),
+        'share_naming_hero_products': float((scores['hero_products_named'] > 0).mean()),
+        'hero_products': int(index.products['hero'].sum()),
+        'hero_coverage': index.hero_coverage(named),
+        'lowest_tfidf_cosine_ids': lowest['Id'].tolist(),
+    }
+
+
+def load_responses(path):
+    if path.lower().endswith('.xlsx'):
+        return pd.read_excel(path).rename(columns=WORKBOOK_COLUMNS)
+    return pd.read_csv(path, encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score agent answers against the expected ones.')
+    parser.add_argument(
+        '--input',
+        default=INPUT_PATH,
+        help='CSV with Id, Question, ActualResponse and ExpectedResponse, or the workbook from build_table.py.',
+    )
+    parser.add_argument('--catalog', default=CATALOG_CSV, help='products_aggregated.csv used for the product check.')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help='Where the scores go (default: next to the workbook).')
+    args = parser.parse_args()
+
+    index = CatalogIndex.build(pd.read_csv(args.catalog), CLASSIFICATION_RULES)
+    scores = score_frame(load_responses(args.input), index)
+    summary = summarize(scores, index)
+    scores_path = os.path.join(args.output_dir, SCORES_NAME + '.csv')
+    summary_path = os.path.join(args.output_dir, SCORES_NAME + '.json')
+    scores.to_csv(scores_path, index=False, encoding='utf-8')
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    print(f'Saved: {scores_path}')
+    print(f'Saved: {summary_path}')
+    print(f"Token F1 (mean): {summary['token_f1_mean']:.3f} | TF-IDF cosine (mean): {summary['tfidf_cosine_mean']:.3f}")
+    print(f"Hero coverage: {summary['hero_coverage']:.1%} of {summary['hero_products']} hero products")
+
+
+if __name__ == '__main__':
+    main()
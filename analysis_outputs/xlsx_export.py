@@ -0,0 +1,45 @@
+﻿from openpyxl import Workbook
+from openpyxl.cell import Cell, WriteOnlyCell
+from openpyxl.styles import Alignment, NamedStyle
+from openpyxl.utils import get_column_letter
+
+WRAP_STYLE = 'ajuste'
+SHEET_TITLE_LENGTH = 31  # Excel limit
+INVALID_TITLE_CHARS = str.maketrans({char: '_' for char in '[]:*?/\\'})
+
+
+def new_workbook():
+    """Write-only workbook with the shared wrap style registered once."""
+    wb = Workbook(write_only=True)
+    wb.add_named_style(NamedStyle(name=WRAP_STYLE, alignment=Alignment(wrap_text=True, vertical='top')))
+    return wb
+
+
+def sheet_title(name):
+    return name.translate(INVALID_TITLE_CHARS)[:SHEET_TITLE_LENGTH]
+
+
+def append_sheet(wb, title, headers, rows, widths=None, default_width=25):
+    """Stream ``rows`` into a new sheet, styling each cell as it is written; returns the number of data rows.
+
+    Widths must be set before the first row because write-only sheets cannot be revisited.
+    """
+    ws = wb.create_sheet(sheet_title(title))
+    widths = widths or {}
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = widths.get(col, default_width)
+
+    # Resolving the named style per cell costs as much as writing it, so resolve it once and copy the result.
+    template = WriteOnlyCell(ws)
+    template.style = WRAP_STYLE
+    style_array = template._style
+
+    def styled(values):
+        return [Cell(ws, row=1, column=1, value=value, style_array=style_array) for value in values]
+
+    ws.append(styled(headers))
+    count = 0
+    for row in rows:
+        ws.append(styled(row))
+        count += 1
+    return count
@@ -3,22 +3,83 @@
 
 from __future__ import annotations
 
+import argparse
 import json
+import sys
+import time
 from dataclasses import asdict, dataclass
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 
+from anomalies import THRESHOLD as ANOMALY_THRESHOLD, WINDOW as ANOMALY_WINDOW, detect_anomalies
+from basket_affinity import MIN_PAIR_ORDERS, CooccurrenceCounts, count_cooccurrences, merge_counts, score_affinity
+from catalog_index import KeywordClassifier
+from forecasting import MIN_HISTORY_DAYS, forecast_series
+from kpi_windows import MEASURES, WindowedKPIs, order_measures
+from similarity_index import SimilarityIndex
+from sketches import HyperLogLog, KLLSketch
+from stage_scheduler import Stage, StageTiming, format_timings, run_stages
+
 
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR.parent / "data" / "export"
 OUTPUT_DIR = BASE_DIR / "analysis_outputs"
-
+STATE_DIR = OUTPUT_DIR / "state"
+
+
+EXPORT_ORDER = (
+    "kpis",
+    "top_products",
+    "top_categories",
+    "daily",
+    "hourly",
+    "basket_shape",
+    "rfm",
+    "sales_cube",
+    "product_affinity",
+    "subcategory_affinity",
+    "cohorts",
+    "kpi_daily",
+    "demand_forecast",
+    "forecast_backtest",
+    "anomalies",
+    "similarity_index",
+    "order_sketches",
+)
+REVENUE_WINDOWS = (30, 90, 365)
+CUBE_FILENAME = "sales_cube.parquet"
+SIMILARITY_INDEX_DIRNAME = "similarity_index"
+CUBE_DIMENSIONS = ["date", "category", "subcategory", "vendor"]
 
 ORDERS_FILENAME = "bulk_orders.csv"
 LINE_ITEMS_FILENAME = "bulk_line_items.csv"
 
+ORDER_COLUMNS = [
+    "id",
+    "createdAt",
+    "updatedAt",
+    "customer.id",
+    "totalPriceSet.shopMoney.amount",
+    "subtotalPriceSet.shopMoney.amount",
+    "totalDiscountsSet.shopMoney.amount",
+    "totalShippingPriceSet.shopMoney.amount",
+    "totalTaxSet.shopMoney.amount",
+]
+LINE_ITEM_COLUMNS = [
+    "id",
+    "__parentId",
+    "quantity",
+    "discountedUnitPriceSet.shopMoney.amount",
+    "originalUnitPriceSet.shopMoney.amount",
+    "variant.title",
+    "variant.product.id",
+    "variant.product.title",
+    "variant.product.productType",
+    "variant.product.vendor",
+]
+
 
 @dataclass
 class KPIBundle:
@@ -46,6 +107,50 @@ class KPIBundle:
     revenue_last_365_days: float
 
 
+@dataclass
+class OrderSketches:
+    """Approximate order-value/lines/units distributions and distinct customers (see sketches.py)."""
+
+    order_value: KLLSketch
+    lines: KLLSketch
+    units: KLLSketch
+    customers: HyperLogLog
+
+    def update(self, orders: pd.DataFrame) -> OrderSketches:
+        self.order_value.update(orders["total_price"])
+        self.lines.update(orders["lines"])
+        self.units.update(orders["units"])
+        self.customers.update(orders["customer.id"])
+        return self
+
+    def merge(self, other: OrderSketches) -> OrderSketches:
+        self.order_value.merge(other.order_value)
+        self.lines.merge(other.lines)
+        self.units.merge(other.units)
+        self.customers.merge(other.customers)
+        return self
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name).to_dict() for name in ("order_value", "lines", "units", "customers")}
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> OrderSketches:
+        return cls(
+            order_value=KLLSketch.from_dict(payload["order_value"]),
+            lines=KLLSketch.from_dict(payload["lines"]),
+            units=KLLSketch.from_dict(payload["units"]),
+            customers=HyperLogLog.from_dict(payload["customers"]),
+        )
+
+
+def new_order_sketches() -> OrderSketches:
+    return OrderSketches(KLLSketch(), KLLSketch(), KLLSketch(), HyperLogLog())
+
+
+def build_order_sketches(orders: pd.DataFrame) -> OrderSketches:
+    return new_order_sketches().update(orders)
+
+
 CLASSIFICATION_RULES = [
     ("Proteínas", "Proteína de Suero (Whey Protein)", ("whey", "suero", "100% whey")),
     ("Proteínas", "Proteína Aislada/Hidrolizada (Isolate/Hydrolyzed)", ("isolate", "iso 100", "aislada", "hydro")),
@@ -70,6 +175,24 @@ CLASSIFICATION_RULES = [
 ]
 
 
+RFM_SCORE_BINS = np.linspace(0, 1, 6)
+
+# (segment, (min, max) recency score, (min, max) frequency score); the first matching rule wins.
+RFM_SEGMENT_RULES = [
+    ("Leal", (4, 5), (4, 5)),
+    ("Nuevo/Potencial", (4, 5), (1, 2)),
+    ("En Riesgo", (1, 2), (4, 5)),
+    ("Churn", (1, 2), (1, 2)),
+]
+RFM_DEFAULT_SEGMENT = "Activo"
+
+# Affinity table -> line-item key columns (renamed to the output column names).
+AFFINITY_KEYS = {
+    "product_affinity": {"variant.product.id": "product_id"},
+    "subcategory_affinity": {"category": "category", "subcategory": "subcategory"},
+}
+
+
 def to_json_compatible(value):
     if isinstance(value, (np.integer,)):
         return int(value)
@@ -86,7 +209,7 @@ def to_json_compatible(value):
     raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
 
 
-def classify_product(title: str | None, product_type: str | None, variant_title: str | None) -> tuple[str, str]:
+def _build_haystack(title, product_type, variant_title) -> str:
     parts: list[str] = []
     for value in (title, product_type, variant_title):
         if value is None:
@@ -94,8 +217,11 @@ def classify_product(title: str | None, product_type: str | None, variant_title:
         if isinstance(value, float) and np.isnan(value):
             continue
         parts.append(str(value))
+    return " ".join(parts).lower()
 
-    haystack = " ".join(parts).lower()
+
+def classify_product(title: str | None, product_type: str | None, variant_title: str | None) -> tuple[str, str]:
+    haystack = _build_haystack(title, product_type, variant_title)
     if any(keyword in haystack for keyword in ("combo", "pack", "kit")):
         if any(keyword in haystack for keyword in ("mass", "gainer", "creatina")):
             return "Combos y Packs", "Combo de Volumen/Masa"
@@ -112,36 +238,181 @@ def classify_product(title: str | None, product_type: str | None, variant_title:
     return "Otros", product_type or "Sin categoría"
 
 
+COMBO_KEYWORDS = ("combo", "pack", "kit")
+COMBO_RULES = [
+    ("Combo de Volumen/Masa", ("mass", "gainer", "creatina")),
+    ("Combo de Definición", ("burn", "defin", "iso", "carnit", "cla")),
+]
+CLASSIFICATION_COLUMNS = ("variant.product.title", "variant.product.productType", "variant.title")
+
+
+KEYWORD_CLASSIFIER = KeywordClassifier(CLASSIFICATION_RULES, COMBO_KEYWORDS, COMBO_RULES)
+
+
+def classify_products(frame: pd.DataFrame) -> pd.DataFrame:
+    """Batch equivalent of ``classify_product`` over the line items of ``frame``.
+
+    Each distinct (title, productType, variant title) triple is classified once, with
+    one automaton pass over its haystack, and the result is mapped back onto the rows
+    of ``frame``.
+    """
+    if frame.empty:
+        return pd.DataFrame({"category": [], "subcategory": []}, index=frame.index, dtype=object)
+
+    keys = pd.DataFrame(
+        {
+            column: frame[column] if column in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+            for column in CLASSIFICATION_COLUMNS
+        }
+    )
+    grouped = keys.groupby(list(CLASSIFICATION_COLUMNS), dropna=False, sort=False, observed=True)
+    codes = grouped.ngroup().to_numpy()
+    uniques = keys.groupby(codes).first()
+
+    classified = [
+        KEYWORD_CLASSIFIER.classify(_build_haystack(*triple)) for triple in uniques.itertuples(index=False, name=None)
+    ]
+    category = np.array([category for category, _ in classified], dtype=object)
+    subcategory = np.array(
+        [
+            subcategory if subcategory is not None else product_type or "Sin categoría"
+            for (_, subcategory), product_type in zip(classified, uniques["variant.product.productType"])
+        ],
+        dtype=object,
+    )
+
+    return pd.DataFrame(
+        {"category": category[codes], "subcategory": subcategory[codes]},
+        index=frame.index,
+    )
+
+
 def to_float(series: pd.Series) -> pd.Series:
     return pd.to_numeric(series, errors="coerce").fillna(0.0)
 
 
-def load_data() -> tuple[pd.DataFrame, pd.DataFrame]:
-    orders_path = DATA_DIR / ORDERS_FILENAME
-    items_path = DATA_DIR / LINE_ITEMS_FILENAME
+def _as_utc(since: pd.Timestamp | str | None) -> pd.Timestamp | None:
+    if since is None:
+        return None
+    since = pd.Timestamp(since)
+    return since.tz_localize("UTC") if since.tzinfo is None else since.tz_convert("UTC")
+
+
+def _parquet_dir(data_dir: Path) -> Path:
+    from bulk_parquet import PARQUET_DIR
+
+    parquet_dir = data_dir / PARQUET_DIR.name
+    if not parquet_dir.exists():
+        raise FileNotFoundError(f"Parquet datasets not found in {parquet_dir}. Run bulk_parquet.py first.")
+    return parquet_dir
+
+
+def _csv_paths(data_dir: Path) -> tuple[Path, Path]:
+    orders_path = data_dir / ORDERS_FILENAME
+    items_path = data_dir / LINE_ITEMS_FILENAME
     if not orders_path.exists() or not items_path.exists():
         raise FileNotFoundError(
-            f"Required CSV files not found in {DATA_DIR}. Expected {ORDERS_FILENAME} and {LINE_ITEMS_FILENAME}."
+            f"Required CSV files not found in {data_dir}. Expected {ORDERS_FILENAME} and {LINE_ITEMS_FILENAME}."
         )
+    return orders_path, items_path
+
+
+def load_orders(
+    source: str = "csv",
+    since: pd.Timestamp | None = None,
+    data_dir: Path = DATA_DIR,
+) -> pd.DataFrame:
+    since = _as_utc(since)
+    if source == "parquet":
+        from bulk_parquet import read_orders
 
+        return read_orders(_parquet_dir(data_dir), columns=ORDER_COLUMNS, since=since)
+
+    orders_path, _ = _csv_paths(data_dir)
     orders = pd.read_csv(
         orders_path,
+        usecols=lambda column: column in ORDER_COLUMNS,
         parse_dates=["createdAt", "updatedAt"],
         keep_default_na=False,
         na_values=["", "null", None],
     )
+    if since is not None:
+        orders = orders.loc[pd.to_datetime(orders["createdAt"], utc=True) >= since].reset_index(drop=True)
+    return orders
+
+
+def iter_line_items(
+    source: str = "csv",
+    chunksize: int = 200_000,
+    since: pd.Timestamp | None = None,
+    order_ids: pd.Series | None = None,
+    data_dir: Path = DATA_DIR,
+):
+    """Yield the line-item table in chunks of at most ``chunksize`` rows."""
+    if source == "parquet":
+        from bulk_parquet import iter_line_item_batches
+
+        chunks = iter_line_item_batches(_parquet_dir(data_dir), LINE_ITEM_COLUMNS, chunksize, _as_utc(since))
+    else:
+        _, items_path = _csv_paths(data_dir)
+        chunks = pd.read_csv(
+            items_path,
+            usecols=lambda column: column in LINE_ITEM_COLUMNS,
+            keep_default_na=False,
+            na_values=["", "null", None],
+            chunksize=chunksize,
+        )
+    for chunk in chunks:
+        if order_ids is not None:
+            chunk = chunk.loc[chunk["__parentId"].isin(order_ids)]
+        yield chunk
+
+
+def load_data(
+    source: str = "csv",
+    since: pd.Timestamp | None = None,
+    data_dir: Path = DATA_DIR,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    orders = load_orders(source, since, data_dir)
+    order_ids = orders["id"] if since is not None else None
+
+    if source == "parquet":
+        from bulk_parquet import read_line_items
+
+        items = read_line_items(
+            _parquet_dir(data_dir), columns=LINE_ITEM_COLUMNS, since=_as_utc(since), order_ids=order_ids
+        )
+        return orders, items
+
+    _, items_path = _csv_paths(data_dir)
     items = pd.read_csv(
         items_path,
+        usecols=lambda column: column in LINE_ITEM_COLUMNS,
         keep_default_na=False,
         na_values=["", "null", None],
     )
+    if order_ids is not None:
+        items = items.loc[items["__parentId"].isin(order_ids)].reset_index(drop=True)
     return orders, items
 
 
-def enrich_orders(orders: pd.DataFrame, items: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
-    orders = orders.copy()
-    items = items.copy()
+def peak_rss_mb() -> float:
+    # ru_maxrss survives execve on Linux, so prefer the per-process high-water
+    # mark from /proc when it is available.
+    status = Path("/proc/self/status")
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+    import resource
 
+    # ru_maxrss is reported in KiB on Linux and in bytes on macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def enrich_order_columns(orders: pd.DataFrame) -> pd.DataFrame:
     orders["total_price"] = to_float(orders["totalPriceSet.shopMoney.amount"])
     orders["subtotal_amount"] = to_float(orders["subtotalPriceSet.shopMoney.amount"])
     orders["discount_amount"] = to_float(orders["totalDiscountsSet.shopMoney.amount"])
@@ -153,25 +424,24 @@ def enrich_orders(orders: pd.DataFrame, items: pd.DataFrame) -> tuple[pd.DataFra
     orders["created_date"] = orders["created_at_bogota"].dt.date
     orders["created_hour"] = orders["created_at_bogota"].dt.hour
     orders["created_weekday"] = orders["created_at_bogota"].dt.day_name()
+    return orders
+
 
+def enrich_items(items: pd.DataFrame) -> pd.DataFrame:
     discounted_price = to_float(items["discountedUnitPriceSet.shopMoney.amount"])
     original_price = to_float(items["originalUnitPriceSet.shopMoney.amount"])
     items["quantity"] = to_float(items["quantity"])
     items["unit_price"] = np.where(discounted_price > 0, discounted_price, original_price)
     items["line_revenue"] = items["unit_price"] * items["quantity"]
 
-    items["category"], items["subcategory"] = zip(
-        *items.apply(
-            lambda row: classify_product(
-                row.get("variant.product.title"),
-                row.get("variant.product.productType"),
-                row.get("variant.title"),
-            ),
-            axis=1,
-        )
-    )
+    classified = classify_products(items)
+    items["category"] = classified["category"]
+    items["subcategory"] = classified["subcategory"]
+    return items
 
-    summary = (
+
+def summarize_order_lines(items: pd.DataFrame) -> pd.DataFrame:
+    return (
         items.groupby("__parentId")
         .agg(
             lines=("id", "count"),
@@ -182,17 +452,267 @@ def enrich_orders(orders: pd.DataFrame, items: pd.DataFrame) -> tuple[pd.DataFra
         .rename(columns={"__parentId": "id"})
     )
 
+
+def attach_line_summary(orders: pd.DataFrame, summary: pd.DataFrame) -> pd.DataFrame:
     orders = orders.merge(summary, on="id", how="left", validate="one_to_one")
     orders["lines"] = orders["lines"].fillna(0).astype(int)
     orders["units"] = orders["units"].fillna(0.0)
     orders["line_revenue"] = orders["line_revenue"].fillna(0.0)
+    return orders
+
+
+def classify_items(items: pd.DataFrame) -> pd.DataFrame:
+    return enrich_items(items.copy())
+
+
+def merge_order_lines(orders: pd.DataFrame, items: pd.DataFrame) -> pd.DataFrame:
+    """Order-level columns plus the per-order line summary of the classified ``items``."""
+    return attach_line_summary(enrich_order_columns(orders.copy()), summarize_order_lines(items))
+
+
+def enrich_orders(orders: pd.DataFrame, items: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    items = classify_items(items)
+    return merge_order_lines(orders, items), items
+
+
+def cube_lines(items: pd.DataFrame, order_dates: pd.Series) -> pd.DataFrame:
+    lines = pd.DataFrame(
+        {
+            "date": items["__parentId"].map(order_dates),
+            "category": items["category"],
+            "subcategory": items["subcategory"],
+            "vendor": items["variant.product.vendor"].astype(object),
+            "order_id": items["__parentId"],
+            "revenue": items["line_revenue"],
+            "units": items["quantity"],
+            "lines": 1,
+        }
+    )
+    return lines.dropna(subset=["date"])
+
+
+def aggregate_cube(lines: pd.DataFrame) -> pd.DataFrame:
+    """Collapse order lines into day x category x subcategory x vendor cells.
+
+    ``orders`` counts distinct orders per cell, so it is additive over days but
+    not across categories or vendors (an order can touch several cells).
+    """
+    per_order = lines.groupby(CUBE_DIMENSIONS + ["order_id"], dropna=False, observed=True).agg(
+        revenue=("revenue", "sum"), units=("units", "sum"), lines=("lines", "sum")
+    )
+    return per_order.groupby(level=CUBE_DIMENSIONS, dropna=False).agg(
+        revenue=("revenue", "sum"), units=("units", "sum"), lines=("lines", "sum"), orders=("lines", "size")
+    )
+
+
+def build_sales_cube(orders: pd.DataFrame, items: pd.DataFrame) -> pd.DataFrame:
+    return aggregate_cube(cube_lines(items, orders.set_index("id")["created_date"])).reset_index()
+
+
+def product_daily_lines(items: pd.DataFrame, order_dates: pd.Series) -> pd.DataFrame:
+    lines = pd.DataFrame(
+        {
+            "date": items["__parentId"].map(order_dates),
+            "variant.product.id": items["variant.product.id"],
+            "product_title": items["variant.product.title"],
+            "units": items["quantity"],
+        }
+    ).dropna(subset=["date"])
+    return lines.groupby(["date", "variant.product.id"]).agg(
+        product_title=("product_title", "first"), units=("units", "sum")
+    )
+
+
+def build_product_daily(orders: pd.DataFrame, items: pd.DataFrame) -> pd.DataFrame:
+    return product_daily_lines(items, orders.set_index("id")["created_date"]).reset_index()
+
+
+def customer_product_lines(items: pd.DataFrame, order_customers: pd.Series) -> pd.DataFrame:
+    lines = pd.DataFrame(
+        {
+            "customer.id": items["__parentId"].map(order_customers),
+            "variant.product.id": items["variant.product.id"],
+            "product_title": items["variant.product.title"],
+            "units": items["quantity"],
+        }
+    )
+    return lines.groupby(["customer.id", "variant.product.id"]).agg(
+        product_title=("product_title", "first"), units=("units", "sum")
+    )
+
+
+def build_customer_products(orders: pd.DataFrame, items: pd.DataFrame) -> pd.DataFrame:
+    return customer_product_lines(items, orders.set_index("id")["customer.id"]).reset_index()
+
+
+def _fold(running: pd.DataFrame | None, part: pd.DataFrame, level, aggregations) -> pd.DataFrame:
+    if running is None:
+        return part
+    return pd.concat([running, part]).groupby(level=level, dropna=False).agg(aggregations)
 
-    return orders, items
 
+def _mark_emitted(chunk: pd.DataFrame, order_index: pd.Index, emitted: np.ndarray) -> None:
+    positions = order_index.get_indexer(chunk["__parentId"].unique())
+    positions = positions[positions >= 0]
+    if emitted[positions].any():
+        order_id = order_index[positions[emitted[positions]][0]]
+        raise ValueError(
+            f"The line items of order {order_id} are not contiguous, so streaming would split the order. "
+            "Sort the line items by __parentId (or re-run bulk_parquet.py), or run without --chunksize."
+        )
+    emitted[positions] = True
+
+
+def _whole_orders(chunks, order_index: pd.Index | None = None):
+    """Regroup line-item chunks so every order's lines arrive in a single chunk.
+
+    The exports list an order's lines next to each other, so only the trailing
+    order of a chunk can continue into the next one and it is held back. With
+    ``order_index`` (the unique ids of the loaded orders) that requirement is
+    checked: lines of an order that was already emitted raise ``ValueError``
+    instead of silently splitting the order.
+    """
+    emitted = np.zeros(len(order_index), dtype=bool) if order_index is not None else None
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if chunk.empty:
+            continue
+        trailing = chunk["__parentId"].eq(chunk["__parentId"].iloc[-1]).to_numpy()
+        carry = chunk.loc[trailing]
+        if not trailing.all():
+            whole = chunk.loc[~trailing]
+            if emitted is not None:
+                _mark_emitted(whole, order_index, emitted)
+            yield whole
+    if carry is not None and not carry.empty:
+        if emitted is not None:
+            _mark_emitted(carry, order_index, emitted)
+        yield carry
+
+
+def stream_line_item_partials(
+    chunks,
+    order_dates: pd.Series | None = None,
+    order_customers: pd.Series | None = None,
+    sketch_orders: pd.DataFrame | None = None,
+) -> tuple[
+    pd.DataFrame,
+    pd.DataFrame,
+    pd.DataFrame,
+    pd.DataFrame | None,
+    pd.DataFrame | None,
+    pd.DataFrame | None,
+    dict[str, CooccurrenceCounts],
+    OrderSketches | None,
+]:
+    """Classify and aggregate line-item chunks into the partials the streaming stages need.
+
+    Returns per-order, per-product, per-category, cube, product-day,
+    customer-product and affinity partials. They are folded after every chunk,
+    so memory is bounded by the chunk size plus the number of distinct orders,
+    products, categories, cube cells, product-days, customer-products and
+    co-purchased pairs. An order's lines must be contiguous in ``chunks``; with
+    ``order_dates`` this is checked (see ``_whole_orders``).
+
+    With ``sketch_orders`` (``total_price`` and ``customer.id`` indexed by order
+    id) the order sketches are updated from every chunk's whole orders and
+    returned last; orders without line items are added once the stream ends.
+    """
+    order_sums = {"lines": "sum", "units": "sum", "line_revenue": "sum"}
+    product_aggs = {
+        "product_title": "first",
+        "vendor": "first",
+        "product_type": "first",
+        "category": "first",
+        "subcategory": "first",
+        "units": "sum",
+        "revenue": "sum",
+    }
+    category_sums = {"units": "sum", "revenue": "sum"}
+    cube_sums = {"revenue": "sum", "units": "sum", "lines": "sum", "orders": "sum"}
+    product_day_aggs = {"product_title": "first", "units": "sum"}
+
+    orders_partial = products_partial = categories_partial = cube_partial = None
+    product_daily_partial = customer_products_partial = None
+    affinity: dict[str, CooccurrenceCounts] = {}
+    sketches = new_order_sketches() if sketch_orders is not None else None
+    for chunk in _whole_orders(chunks, order_dates.index if order_dates is not None else None):
+        chunk = enrich_items(chunk)
+        # Chunks hold whole orders, so their co-occurrence counts are disjoint and simply add up.
+        for name, counts in count_affinities(chunk).items():
+            affinity[name] = merge_counts(affinity.get(name), counts)
+        if order_dates is not None:
+            cube_partial = _fold(
+                cube_partial, aggregate_cube(cube_lines(chunk, order_dates)), CUBE_DIMENSIONS, cube_sums
+            )
+            product_daily_partial = _fold(
+                product_daily_partial, product_daily_lines(chunk, order_dates), [0, 1], product_day_aggs
+            )
+        if order_customers is not None:
+            customer_products_partial = _fold(
+                customer_products_partial,
+                customer_product_lines(chunk, order_customers),
+                [0, 1],
+                product_day_aggs,
+            )
+        summary = summarize_order_lines(chunk)
+        if sketches is not None:
+            sketches.update(summary.join(sketch_orders, on="id", how="inner"))
+        orders_partial = _fold(orders_partial, summary.set_index("id"), 0, order_sums)
+        products_partial = _fold(products_partial, aggregate_products(chunk), 0, product_aggs)
+        categories_partial = _fold(
+            categories_partial,
+            chunk.groupby(["category", "subcategory"]).agg(units=("quantity", "sum"), revenue=("line_revenue", "sum")),
+            [0, 1],
+            category_sums,
+        )
 
-def compute_kpis(orders: pd.DataFrame) -> KPIBundle:
+    if sketches is not None:
+        seen = orders_partial.index if orders_partial is not None else pd.Index([])
+        sketches.update(sketch_orders.loc[sketch_orders.index.difference(seen)].assign(lines=0, units=0.0))
+    if orders_partial is None:
+        return (
+            pd.DataFrame(columns=["id", *order_sums]),
+            pd.DataFrame(columns=list(product_aggs)).rename_axis("variant.product.id"),
+            pd.DataFrame(columns=["category", "subcategory", *category_sums]).set_index(["category", "subcategory"]),
+            pd.DataFrame(columns=CUBE_DIMENSIONS + list(cube_sums)) if order_dates is not None else None,
+            (
+                pd.DataFrame(columns=["date", "variant.product.id", *product_day_aggs])
+                if order_dates is not None
+                else None
+            ),
+            (
+                pd.DataFrame(columns=["customer.id", "variant.product.id", *product_day_aggs])
+                if order_customers is not None
+                else None
+            ),
+            count_affinities(pd.DataFrame(columns=["__parentId", "variant.product.id", "category", "subcategory"])),
+            sketches,
+        )
+    cube = cube_partial.reset_index() if cube_partial is not None else None
+    product_daily = product_daily_partial.reset_index() if product_daily_partial is not None else None
+    customer_products = customer_products_partial.reset_index() if customer_products_partial is not None else None
+    return (
+        orders_partial.reset_index(),
+        products_partial,
+        categories_partial,
+        cube,
+        product_daily,
+        customer_products,
+        affinity,
+        sketches,
+    )
+
+
+def compute_kpis(orders: pd.DataFrame, sketches: OrderSketches | None = None) -> KPIBundle:
+    """KPIs of ``orders``; with ``sketches`` the medians and distinct customers are approximated from them."""
     total_orders = len(orders)
-    total_customers = orders["customer.id"].nunique(dropna=True)
+    if sketches is not None:
+        total_customers = round(sketches.customers.estimate())
+    else:
+        total_customers = orders["customer.id"].nunique(dropna=True)
 
     total_revenue = orders["total_price"].sum()
     subtotal_revenue = orders["subtotal_amount"].sum()
@@ -201,7 +721,10 @@ def compute_kpis(orders: pd.DataFrame) -> KPIBundle:
     total_tax = orders["tax_amount"].sum()
 
     average_order_value = orders["total_price"].mean()
-    median_order_value = orders["total_price"].median()
+    if sketches is not None:
+        median_order_value = sketches.order_value.quantile(0.5)
+    else:
+        median_order_value = orders["total_price"].median()
 
     orders_with_discount = (orders["discount_amount"] > 0).sum()
     orders_with_shipping = (orders["shipping_amount"] > 0).sum()
@@ -210,21 +733,23 @@ def compute_kpis(orders: pd.DataFrame) -> KPIBundle:
     share_orders_shipping = orders_with_shipping / total_orders if total_orders else 0.0
 
     avg_lines_per_order = orders["lines"].mean()
-    median_lines_per_order = orders["lines"].median()
     avg_units_per_order = orders["units"].mean()
-    median_units_per_order = orders["units"].median()
+    if sketches is not None:
+        median_lines_per_order = sketches.lines.quantile(0.5)
+        median_units_per_order = sketches.units.quantile(0.5)
+    else:
+        median_lines_per_order = orders["lines"].median()
+        median_units_per_order = orders["units"].median()
 
     avg_items_per_order = avg_units_per_order
     median_items_per_order = median_units_per_order
 
-    last_order_date = orders["created_at_bogota"].max()
-    cutoff_30 = last_order_date - pd.Timedelta(days=30)
-    cutoff_90 = last_order_date - pd.Timedelta(days=90)
-    cutoff_365 = last_order_date - pd.Timedelta(days=365)
-
-    revenue_last_30_days = orders.loc[orders["created_at_bogota"] >= cutoff_30, "total_price"].sum()
-    revenue_last_90_days = orders.loc[orders["created_at_bogota"] >= cutoff_90, "total_price"].sum()
-    revenue_last_365_days = orders.loc[orders["created_at_bogota"] >= cutoff_365, "total_price"].sum()
+    # Every trailing window comes from the same sorted prefix sums instead of one scan per window.
+    windows = WindowedKPIs.from_orders(orders)
+    revenue_last_30_days = revenue_last_90_days = revenue_last_365_days = 0.0
+    if windows.last is not None:
+        trailing = windows.trailing_sums(windows.last, list(REVENUE_WINDOWS))["total_revenue"]
+        revenue_last_30_days, revenue_last_90_days, revenue_last_365_days = trailing.tolist()
 
     return KPIBundle(
         total_orders=total_orders,
@@ -252,35 +777,47 @@ def compute_kpis(orders: pd.DataFrame) -> KPIBundle:
     )
 
 
-def build_top_products(items: pd.DataFrame, limit: int = 25) -> pd.DataFrame:
-    grouped = (
-        items.groupby("variant.product.id")
-        .agg(
-            product_title=("variant.product.title", "first"),
-            vendor=("variant.product.vendor", "first"),
-            product_type=("variant.product.productType", "first"),
-            category=("category", "first"),
-            subcategory=("subcategory", "first"),
-            units=("quantity", "sum"),
-            revenue=("line_revenue", "sum"),
-        )
-        .sort_values("revenue", ascending=False)
+def build_kpi_daily(orders: pd.DataFrame) -> pd.DataFrame:
+    """Daily sums of the additive KPI measures; the dashboard rebuilds ``WindowedKPIs`` from them."""
+    measures = order_measures(orders)
+    measures["date"] = orders["created_date"]
+    return measures.groupby("date")[MEASURES].sum().reset_index()
+
+
+def aggregate_products(items: pd.DataFrame) -> pd.DataFrame:
+    return items.groupby("variant.product.id").agg(
+        product_title=("variant.product.title", "first"),
+        vendor=("variant.product.vendor", "first"),
+        product_type=("variant.product.productType", "first"),
+        category=("category", "first"),
+        subcategory=("subcategory", "first"),
+        units=("quantity", "sum"),
+        revenue=("line_revenue", "sum"),
     )
+
+
+def rank_products(grouped: pd.DataFrame, limit: int = 25) -> pd.DataFrame:
+    grouped = grouped.sort_values("revenue", ascending=False)
     grouped["revenue_share"] = grouped["revenue"] / grouped["revenue"].sum()
     return grouped.head(limit).reset_index().rename(columns={"variant.product.id": "product_id"})
 
 
-def build_top_categories(items: pd.DataFrame) -> pd.DataFrame:
-    grouped = (
-        items.groupby(["category", "subcategory"])
-        .agg(units=("quantity", "sum"), revenue=("line_revenue", "sum"))
-        .sort_values("revenue", ascending=False)
-        .reset_index()
-    )
+def build_top_products(items: pd.DataFrame, limit: int = 25) -> pd.DataFrame:
+    return rank_products(aggregate_products(items), limit=limit)
+
+
+def rank_categories(grouped: pd.DataFrame) -> pd.DataFrame:
+    grouped = grouped.sort_values("revenue", ascending=False).reset_index()
     grouped["revenue_share"] = grouped["revenue"] / grouped["revenue"].sum()
     return grouped
 
 
+def build_top_categories(items: pd.DataFrame) -> pd.DataFrame:
+    return rank_categories(
+        items.groupby(["category", "subcategory"]).agg(units=("quantity", "sum"), revenue=("line_revenue", "sum"))
+    )
+
+
 def build_time_series(orders: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     daily = (
         orders.groupby("created_date")
@@ -308,7 +845,33 @@ def build_time_series(orders: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]
     return daily, hourly
 
 
-def build_basket_shape(orders: pd.DataFrame) -> pd.DataFrame:
+def build_basket_shape(orders: pd.DataFrame, sketches: OrderSketches | None = None) -> pd.DataFrame:
+    if sketches is not None:
+        lines_quartiles = sketches.lines.quantiles([0.25, 0.5, 0.75])
+        units_quartiles = sketches.units.quantiles([0.25, 0.5, 0.75])
+    else:
+        lines_quartiles = orders["lines"].quantile([0.25, 0.5, 0.75])
+        units_quartiles = orders["units"].quantile([0.25, 0.5, 0.75])
+    return basket_shape_frame(
+        orders["lines"].mean(),
+        lines_quartiles,
+        orders["units"].mean(),
+        units_quartiles,
+        (orders["lines"] == 1).mean(),
+        (orders["lines"] >= 2).mean(),
+    )
+
+
+def basket_shape_frame(
+    lines_mean: float,
+    lines_quartiles,
+    units_mean: float,
+    units_quartiles,
+    single_line_share: float,
+    multi_line_share: float,
+) -> pd.DataFrame:
+    lines_p25, lines_median, lines_p75 = lines_quartiles
+    units_p25, units_median, units_p75 = units_quartiles
     bucket = pd.DataFrame(
         {
             "metric": [
@@ -324,30 +887,26 @@ def build_basket_shape(orders: pd.DataFrame) -> pd.DataFrame:
                 "orders_multi_line",
             ],
             "value": [
-                orders["lines"].mean(),
-                orders["lines"].median(),
-                orders["lines"].quantile(0.25),
-                orders["lines"].quantile(0.75),
-                orders["units"].mean(),
-                orders["units"].median(),
-                orders["units"].quantile(0.25),
-                orders["units"].quantile(0.75),
-                (orders["lines"] == 1).mean(),
-                (orders["lines"] >= 2).mean(),
+                lines_mean,
+                lines_median,
+                lines_p25,
+                lines_p75,
+                units_mean,
+                units_median,
+                units_p25,
+                units_p75,
+                single_line_share,
+                multi_line_share,
             ],
         }
     )
     return bucket
 
 
-def build_rfm(orders: pd.DataFrame) -> pd.DataFrame:
-    orders_with_customer = orders.dropna(subset=["customer.id"]).copy()
-    if orders_with_customer.empty:
-        return pd.DataFrame()
-
-    reference_date = orders_with_customer["created_at_bogota"].max().normalize() + pd.Timedelta(days=1)
-    rfm = (
-        orders_with_customer.groupby("customer.id")
+def aggregate_customers(orders: pd.DataFrame) -> pd.DataFrame:
+    return (
+        orders.dropna(subset=["customer.id"])
+        .groupby("customer.id")
         .agg(
             last_purchase=("created_at_bogota", "max"),
             frequency=("id", "count"),
@@ -355,34 +914,251 @@ def build_rfm(orders: pd.DataFrame) -> pd.DataFrame:
         )
         .reset_index()
     )
-    rfm["recency_days"] = (reference_date - rfm["last_purchase"]).dt.days
 
-    bins = np.linspace(0, 1, 6)
+
+def _rfm_scores(percentiles: pd.Series, ascending: bool = True) -> np.ndarray:
+    # Same right-closed bins as pd.cut(..., include_lowest=True) over RFM_SCORE_BINS.
+    index = np.searchsorted(RFM_SCORE_BINS, percentiles.to_numpy(), side="left") - 1
+    index = np.clip(index, 0, len(RFM_SCORE_BINS) - 2)
+    return index + 1 if ascending else len(RFM_SCORE_BINS) - 1 - index
+
+
+def assign_rfm_segments(
+    recency_score: np.ndarray,
+    frequency_score: np.ndarray,
+    rules: list[tuple[str, tuple[int, int], tuple[int, int]]] = RFM_SEGMENT_RULES,
+    default: str = RFM_DEFAULT_SEGMENT,
+) -> np.ndarray:
+    conditions = [
+        (recency_score >= r_low) & (recency_score <= r_high) & (frequency_score >= f_low) & (frequency_score <= f_high)
+        for _, (r_low, r_high), (f_low, f_high) in rules
+    ]
+    choices = [np.full(len(recency_score), name, dtype=object) for name, _, _ in rules]
+    return np.select(conditions, choices, default=np.full(len(recency_score), default, dtype=object))
+
+
+def score_rfm(
+    rfm: pd.DataFrame,
+    reference_date: pd.Timestamp,
+    segment_rules: list[tuple[str, tuple[int, int], tuple[int, int]]] = RFM_SEGMENT_RULES,
+) -> pd.DataFrame:
+    rfm = rfm.copy()
+    rfm["recency_days"] = (reference_date - rfm["last_purchase"]).dt.days
 
     recency_pct = rfm["recency_days"].rank(method="first", pct=True)
     frequency_pct = rfm["frequency"].rank(method="first", pct=True)
     monetary_pct = rfm["monetary"].rank(method="first", pct=True)
 
-    rfm["recency_score"] = pd.cut(recency_pct, bins=bins, labels=[5, 4, 3, 2, 1], include_lowest=True).astype(int)
-    rfm["frequency_score"] = pd.cut(frequency_pct, bins=bins, labels=[1, 2, 3, 4, 5], include_lowest=True).astype(int)
-    rfm["monetary_score"] = pd.cut(monetary_pct, bins=bins, labels=[1, 2, 3, 4, 5], include_lowest=True).astype(int)
+    rfm["recency_score"] = _rfm_scores(recency_pct, ascending=False)
+    rfm["frequency_score"] = _rfm_scores(frequency_pct)
+    rfm["monetary_score"] = _rfm_scores(monetary_pct)
     rfm["rfm_score"] = rfm["recency_score"] + rfm["frequency_score"] + rfm["monetary_score"]
 
-    def segment(row: pd.Series) -> str:
-        if row["recency_score"] >= 4 and row["frequency_score"] >= 4:
-            return "Leal"
-        if row["recency_score"] >= 4 and row["frequency_score"] <= 2:
-            return "Nuevo/Potencial"
-        if row["recency_score"] <= 2 and row["frequency_score"] >= 4:
-            return "En Riesgo"
-        if row["recency_score"] <= 2 and row["frequency_score"] <= 2:
-            return "Churn"
-        return "Activo"
-
-    rfm["segment"] = rfm.apply(segment, axis=1)
+    rfm["segment"] = assign_rfm_segments(
+        rfm["recency_score"].to_numpy(), rfm["frequency_score"].to_numpy(), segment_rules
+    )
     return rfm
 
 
+def rfm_reference_date(last_purchase: pd.Series) -> pd.Timestamp:
+    return last_purchase.max().normalize() + pd.Timedelta(days=1)
+
+
+def build_rfm(
+    orders: pd.DataFrame,
+    segment_rules: list[tuple[str, tuple[int, int], tuple[int, int]]] = RFM_SEGMENT_RULES,
+) -> pd.DataFrame:
+    rfm = aggregate_customers(orders)
+    if rfm.empty:
+        return pd.DataFrame()
+    return score_rfm(rfm, rfm_reference_date(rfm["last_purchase"]), segment_rules)
+
+
+def build_cohorts(orders: pd.DataFrame) -> pd.DataFrame:
+    """Acquisition-cohort x months-since-first-order matrix of active customers and revenue, in long form.
+
+    Customers and months are integer-encoded so the matrix comes from bincounts
+    over flat ``cohort * n_ages + age`` cell indices, without grouping per customer.
+    """
+    columns = ["cohort", "months_since_first", "customers", "revenue", "retention", "cumulative_revenue_per_customer"]
+    buyers = orders.dropna(subset=["customer.id"])
+    if buyers.empty:
+        return pd.DataFrame(columns=columns)
+
+    customer_codes, customers = pd.factorize(buyers["customer.id"])
+    created = buyers["created_at_bogota"]
+    month = (created.dt.year * 12 + created.dt.month - 1).to_numpy()
+    first_month = np.full(len(customers), month.max())
+    np.minimum.at(first_month, customer_codes, month)
+
+    origin = month.min()
+    n_months = month.max() - origin + 1
+    cohort = first_month[customer_codes] - origin
+    age = month - first_month[customer_codes]
+    cell = cohort * n_months + age
+
+    # A customer counts once per cell however many orders they placed that month.
+    active_cells = np.unique(customer_codes.astype(np.int64) * (n_months * n_months) + cell) % (n_months * n_months)
+    active = np.bincount(active_cells, minlength=n_months * n_months).reshape(n_months, n_months)
+    revenue = np.bincount(cell, weights=buyers["total_price"].to_numpy(), minlength=n_months * n_months).reshape(
+        n_months, n_months
+    )
+
+    # Keep the observable triangle: cohort c can only be followed for n_months - c months.
+    cohort_index, age_index = np.nonzero(np.add.outer(np.arange(n_months), np.arange(n_months)) < n_months)
+    sizes = active[:, 0]
+    populated = sizes[cohort_index] > 0
+    cohort_index, age_index = cohort_index[populated], age_index[populated]
+    cumulative_revenue = np.cumsum(revenue, axis=1)
+
+    cohorts = pd.DataFrame(
+        {
+            "cohort": pd.PeriodIndex.from_ordinals(cohort_index + origin - 1970 * 12, freq="M").astype(str),
+            "months_since_first": age_index,
+            "customers": active[cohort_index, age_index],
+            "revenue": revenue[cohort_index, age_index],
+            "retention": active[cohort_index, age_index] / sizes[cohort_index],
+            "cumulative_revenue_per_customer": cumulative_revenue[cohort_index, age_index] / sizes[cohort_index],
+        }
+    )
+    return cohorts[columns]
+
+
+def count_affinities(lines: pd.DataFrame, min_item_orders: int = 1) -> dict[str, CooccurrenceCounts]:
+    return {
+        name: count_cooccurrences(lines["__parentId"], lines[list(keys)].rename(columns=keys), min_item_orders)
+        for name, keys in AFFINITY_KEYS.items()
+    }
+
+
+def score_affinities(
+    counts: dict[str, CooccurrenceCounts], products: pd.DataFrame
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Top-K affinity tables; ``products`` is indexed by product id and provides ``product_title``."""
+    product_affinity = score_affinity(counts["product_affinity"])
+    for side in ("antecedent", "consequent"):
+        product_affinity.insert(
+            product_affinity.columns.get_loc(f"{side}_product_id") + 1,
+            f"{side}_title",
+            product_affinity[f"{side}_product_id"].map(products["product_title"]),
+        )
+    return product_affinity, score_affinity(counts["subcategory_affinity"])
+
+
+def build_affinity(items: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # No pair can reach the minimum pair count if one of its items does not, so
+    # rare items are pruned before the co-occurrence product.
+    counts = count_affinities(items, min_item_orders=MIN_PAIR_ORDERS)
+    titles = items.groupby("variant.product.id").agg(product_title=("variant.product.title", "first"))
+    return score_affinities(counts, titles)
+
+
+def build_forecasts(
+    product_daily: pd.DataFrame,
+    sales_cube: pd.DataFrame,
+    workers: int = 1,
+    top_products: int | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Daily unit forecasts with intervals and holdout errors for products and categories.
+
+    ``top_products`` keeps only the best-selling products by units; by default
+    every product is forecast. Categories come from the sales cube.
+    """
+    if top_products is not None:
+        ranked = product_daily.groupby("variant.product.id")["units"].sum().nlargest(top_products).index
+        product_daily = product_daily.loc[product_daily["variant.product.id"].isin(ranked)]
+    category_daily = sales_cube.groupby(["date", "category"])["units"].sum().reset_index()
+    titles = product_daily.groupby("variant.product.id")["product_title"].first()
+
+    forecasts, backtests = [], []
+    for level, daily, key, labels in (
+        ("product", product_daily, "variant.product.id", titles),
+        ("category", category_daily, "category", None),
+    ):
+        dates = pd.to_datetime(daily["date"])
+        if daily.empty or (dates.max() - dates.min()).days + 1 < MIN_HISTORY_DAYS:
+            continue
+        forecast, backtest = forecast_series(daily, key, labels, workers=workers)
+        forecasts.append(forecast.assign(level=level))
+        backtests.append(backtest.assign(level=level))
+    if not forecasts:
+        return pd.DataFrame(), pd.DataFrame()
+    demand_forecast = pd.concat(forecasts, ignore_index=True)
+    forecast_backtest = pd.concat(backtests, ignore_index=True)
+    return (
+        demand_forecast[["level", *demand_forecast.columns[:-1]]],
+        forecast_backtest[["level", *forecast_backtest.columns[:-1]]],
+    )
+
+
+def summarize_backtest(forecast_backtest: pd.DataFrame) -> dict[str, dict[str, float]]:
+    """Unit-weighted holdout WAPE per level, i.e. total absolute error over total units sold."""
+    summary = {}
+    for level, rows in forecast_backtest.groupby("level"):
+        weights = rows["units_last_horizon"]
+        chosen = rows["wape_holt_winters"].where(rows["model"] == "holt_winters", rows["wape_weekday_baseline"])
+        summary[level] = {
+            "series": int(len(rows)),
+            "wape_holt_winters": float((rows["wape_holt_winters"] * weights).sum() / weights.sum()),
+            "wape_weekday_baseline": float((rows["wape_weekday_baseline"] * weights).sum() / weights.sum()),
+            "wape_selected": float((chosen * weights).sum() / weights.sum()),
+        }
+    return summary
+
+
+def build_anomalies(
+    orders: pd.DataFrame, sales_cube: pd.DataFrame, since: pd.Timestamp | None = None
+) -> pd.DataFrame:
+    """Unusual days per store, category and vendor (from the cube) and unusual hours for the whole store.
+
+    Hours are compared with the same hour on previous days. With ``since`` only
+    points from that date on are scored, which is what incremental runs need.
+    """
+    cube = sales_cube.assign(date=pd.to_datetime(sales_cube["date"]))
+    daily = [cube.groupby("date")[["revenue", "units"]].sum().reset_index().assign(dimension="store", key="Total")]
+    for dimension in ("category", "vendor"):
+        daily.append(
+            cube.groupby(["date", dimension])[["revenue", "units"]]
+            .sum()
+            .reset_index()
+            .rename(columns={dimension: "key"})
+            .assign(dimension=dimension)
+        )
+    hourly = (
+        orders.assign(hour=orders["created_at_bogota"].dt.floor("h").dt.tz_localize(None))
+        .groupby("hour")
+        .agg(revenue=("total_price", "sum"), orders=("id", "size"))
+        .reset_index()
+        .assign(dimension="store", key="Total")
+    )
+    anomalies = pd.concat(
+        [
+            detect_anomalies(pd.concat(daily, ignore_index=True), "date", ["revenue", "units"], "D", since=since),
+            detect_anomalies(hourly, "hour", ["revenue", "orders"], "h", period=24, since=since),
+        ],
+        ignore_index=True,
+    )
+    return anomalies.sort_values(["period", "dimension", "key", "metric"], ascending=[False, True, True, True])
+
+
+def build_similarity_index(customer_products: pd.DataFrame) -> SimilarityIndex | None:
+    """Item-item neighbours and per-customer recommendations; None without identified customers."""
+    if customer_products.empty:
+        return None
+    return SimilarityIndex.build(customer_products)
+
+
+def export_anomalies(anomalies: pd.DataFrame) -> None:
+    payload = {
+        "window": ANOMALY_WINDOW,
+        "threshold": ANOMALY_THRESHOLD,
+        "anomalies": anomalies.to_dict(orient="records"),
+    }
+    (OUTPUT_DIR / "anomalies.json").write_text(
+        json.dumps(payload, indent=2, ensure_ascii=False, default=to_json_compatible), encoding="utf-8"
+    )
+
+
 def export_outputs(
     kpis: KPIBundle,
     top_products: pd.DataFrame,
@@ -391,6 +1167,16 @@ def export_outputs(
     hourly: pd.DataFrame,
     basket_shape: pd.DataFrame,
     rfm: pd.DataFrame,
+    sales_cube: pd.DataFrame | None = None,
+    product_affinity: pd.DataFrame | None = None,
+    subcategory_affinity: pd.DataFrame | None = None,
+    cohorts: pd.DataFrame | None = None,
+    kpi_daily: pd.DataFrame | None = None,
+    demand_forecast: pd.DataFrame | None = None,
+    forecast_backtest: pd.DataFrame | None = None,
+    anomalies: pd.DataFrame | None = None,
+    similarity_index: SimilarityIndex | None = None,
+    order_sketches: OrderSketches | None = None,
 ) -> None:
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -408,6 +1194,26 @@ def export_outputs(
     basket_shape.to_csv(OUTPUT_DIR / "basket_shape.csv", index=False)
     if not rfm.empty:
         rfm.to_csv(OUTPUT_DIR / "rfm_segments.csv", index=False)
+    if sales_cube is not None:
+        sales_cube.to_parquet(OUTPUT_DIR / CUBE_FILENAME, index=False)
+    if product_affinity is not None:
+        product_affinity.to_csv(OUTPUT_DIR / "product_affinity.csv", index=False)
+    if subcategory_affinity is not None:
+        subcategory_affinity.to_csv(OUTPUT_DIR / "subcategory_affinity.csv", index=False)
+    if cohorts is not None:
+        cohorts.to_csv(OUTPUT_DIR / "cohort_retention.csv", index=False)
+    if kpi_daily is not None:
+        kpi_daily.to_csv(OUTPUT_DIR / "kpi_daily.csv", index=False)
+    if demand_forecast is not None and not demand_forecast.empty:
+        demand_forecast.to_csv(OUTPUT_DIR / "demand_forecast.csv", index=False)
+    if forecast_backtest is not None and not forecast_backtest.empty:
+        forecast_backtest.to_csv(OUTPUT_DIR / "forecast_backtest.csv", index=False)
+    if anomalies is not None:
+        export_anomalies(anomalies)
+    if similarity_index is not None:
+        similarity_index.save(OUTPUT_DIR / SIMILARITY_INDEX_DIRNAME)
+    if order_sketches is not None:
+        (OUTPUT_DIR / "order_sketches.json").write_text(json.dumps(order_sketches.to_dict()), encoding="utf-8")
 
     summary_payload = {
         "kpis": asdict(kpis),
@@ -418,27 +1224,293 @@ def export_outputs(
             rfm["segment"].value_counts(normalize=True).round(4).to_dict() if not rfm.empty else {}
         ),
     }
+    if forecast_backtest is not None and not forecast_backtest.empty:
+        summary_payload["forecast_backtest"] = summarize_backtest(forecast_backtest)
     (OUTPUT_DIR / "analysis_summary.json").write_text(
         json.dumps(summary_payload, indent=2, ensure_ascii=False, default=to_json_compatible),
         encoding="utf-8",
     )
 
 
-def main() -> None:
-    orders_raw, items_raw = load_data()
-    orders, items = enrich_orders(orders_raw, items_raw)
-
-    kpis = compute_kpis(orders)
-    top_products = build_top_products(items)
-    top_categories = build_top_categories(items)
-    daily, hourly = build_time_series(orders)
-    basket_shape = build_basket_shape(orders)
-    rfm = build_rfm(orders)
+def analysis_stages(
+    line_inputs: str = "items", sketches: bool = False, workers: int = 1, forecast_top: int | None = None
+) -> list[Stage]:
+    """Aggregation stages run after enrichment; they only read the shared frames."""
+    sketch_inputs = ("order_sketches",) if sketches else ()
+    stages = [
+        Stage("kpis", compute_kpis, ("orders", *sketch_inputs)),
+        Stage("time_series", build_time_series, ("orders",), outputs=("daily", "hourly")),
+        Stage("basket_shape", build_basket_shape, ("orders", *sketch_inputs)),
+        Stage("rfm", build_rfm, ("orders",)),
+        Stage("cohorts", build_cohorts, ("orders",)),
+        Stage("kpi_daily", build_kpi_daily, ("orders",)),
+        Stage("anomalies", build_anomalies, ("orders", "sales_cube")),
+    ]
+    if line_inputs == "items":
+        if sketches:
+            stages.append(Stage("order_sketches", build_order_sketches, ("orders",)))
+        stages += [
+            Stage("top_products", build_top_products, ("items",)),
+            Stage("top_categories", build_top_categories, ("items",)),
+            Stage("sales_cube", build_sales_cube, ("orders", "items")),
+            Stage("product_daily", build_product_daily, ("orders", "items")),
+            Stage("customer_products", build_customer_products, ("orders", "items")),
+            Stage("affinity", build_affinity, ("items",), outputs=("product_affinity", "subcategory_affinity")),
+        ]
+    else:
+        stages += [
+            Stage("top_products", rank_products, ("products",)),
+            Stage("top_categories", rank_categories, ("categories",)),
+            Stage(
+                "affinity",
+                score_affinities,
+                ("affinity_counts", "products"),
+                outputs=("product_affinity", "subcategory_affinity"),
+            ),
+        ]
+    stages += [
+        Stage(
+            "forecast",
+            build_forecasts,
+            ("product_daily", "sales_cube"),
+            kwargs={"workers": workers, "top_products": forecast_top},
+            outputs=("demand_forecast", "forecast_backtest"),
+        ),
+        Stage("similarity_index", build_similarity_index, ("customer_products",)),
+    ]
+    return stages
+
+
+def collect_outputs(results: dict) -> tuple:
+    # Optional outputs (e.g. order_sketches) are None when their stage did not run.
+    return tuple(results.get(name) for name in EXPORT_ORDER)
+
+
+def run_full(
+    source: str = "csv",
+    since: pd.Timestamp | None = None,
+    data_dir: Path = DATA_DIR,
+    workers: int = 1,
+    sketches: bool = False,
+    forecast_top: int | None = None,
+    trace_memory: bool = False,
+) -> tuple[tuple, list[StageTiming]]:
+    stages = [
+        Stage(
+            "load",
+            load_data,
+            kwargs={"source": source, "since": since, "data_dir": data_dir},
+            outputs=("orders_raw", "items_raw"),
+        ),
+        Stage("classify", classify_items, ("items_raw",), outputs=("items",)),
+        Stage("merge", merge_order_lines, ("orders_raw", "items"), outputs=("orders",)),
+        *analysis_stages("items", sketches, workers, forecast_top),
+    ]
+    results, timings = run_stages(stages, {}, workers, trace_memory)
+    return collect_outputs(results), timings
+
+
+def _streaming_partials(source: str, since, chunksize: int, data_dir: Path, sketches: bool = False) -> tuple:
+    orders = enrich_order_columns(load_orders(source, since, data_dir))
+    order_ids = orders["id"] if since is not None else None
+    summary, *partials = stream_line_item_partials(
+        iter_line_items(source, chunksize, since=since, order_ids=order_ids, data_dir=data_dir),
+        order_dates=orders.set_index("id")["created_date"],
+        order_customers=orders.set_index("id")["customer.id"],
+        sketch_orders=orders.set_index("id")[["total_price", "customer.id"]] if sketches else None,
+    )
+    return attach_line_summary(orders, summary), *partials
+
+
+def run_streaming(
+    source: str = "csv",
+    since: pd.Timestamp | None = None,
+    chunksize: int = 200_000,
+    data_dir: Path = DATA_DIR,
+    workers: int = 1,
+    sketches: bool = False,
+    forecast_top: int | None = None,
+    trace_memory: bool = False,
+) -> tuple[tuple, list[StageTiming]]:
+    stages = [
+        Stage(
+            "stream",
+            _streaming_partials,
+            kwargs={
+                "source": source,
+                "since": since,
+                "chunksize": chunksize,
+                "data_dir": data_dir,
+                "sketches": sketches,
+            },
+            outputs=(
+                "orders",
+                "products",
+                "categories",
+                "sales_cube",
+                "product_daily",
+                "customer_products",
+                "affinity_counts",
+                "order_sketches",
+            ),
+        ),
+        *analysis_stages("partials", sketches, workers, forecast_top),
+    ]
+    results, timings = run_stages(stages, {}, workers, trace_memory)
+    return collect_outputs(results), timings
+
+
+def _advance_state(orders_raw: pd.DataFrame, items_raw: pd.DataFrame, state_dir: Path, reset_state: bool):
+    from incremental_state import PipelineState, apply_delta, load_state, select_delta
+
+    state = PipelineState() if reset_state else load_state(state_dir)
+    delta_orders, delta_items = select_delta(orders_raw, items_raw, state.watermark)
+    print(f"Incremental run: {len(delta_orders)} new or updated orders since {state.watermark or 'the beginning'}.")
+    return apply_delta(state, delta_orders, delta_items)
+
+
+def _save_state(state, state_dir: Path) -> None:
+    from incremental_state import save_state
+
+    save_state(state, state_dir)
+    print(f"State saved to {state_dir} (watermark {state.watermark}).")
+
+
+def run_incremental(
+    state_dir: Path,
+    reset_state: bool = False,
+    source: str = "csv",
+    data_dir: Path = DATA_DIR,
+    workers: int = 1,
+    sketches: bool = False,
+    forecast_top: int | None = None,
+    trace_memory: bool = False,
+) -> tuple[tuple, list[StageTiming]]:
+    from incremental_state import output_stages
+
+    stages = [
+        Stage(
+            "load",
+            load_data,
+            kwargs={"source": source, "data_dir": data_dir},
+            outputs=("orders_raw", "items_raw"),
+        ),
+        Stage(
+            "apply_delta",
+            _advance_state,
+            ("orders_raw", "items_raw"),
+            kwargs={"state_dir": state_dir, "reset_state": reset_state},
+            outputs=("state",),
+        ),
+        # Saving only reads the state, so it overlaps with the output stages.
+        Stage("save_state", _save_state, ("state",), kwargs={"state_dir": state_dir}),
+        *output_stages(workers, forecast_top, sketches),
+    ]
+    results, timings = run_stages(stages, {}, workers, trace_memory)
+    return collect_outputs(results), timings
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only ingest orders updated at or after the stored watermark and merge them into the persisted state.",
+    )
+    parser.add_argument("--state-dir", type=Path, default=STATE_DIR, help="Directory of the incremental state store.")
+    parser.add_argument(
+        "--reset-state", action="store_true", help="Discard the stored state and rebuild it from the full export."
+    )
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="Directory with the bulk exports.")
+    parser.add_argument(
+        "--source",
+        choices=("csv", "parquet"),
+        default="csv",
+        help="Read the bulk CSVs or the Parquet datasets written by bulk_parquet.py.",
+    )
+    parser.add_argument(
+        "--since", type=pd.Timestamp, default=None, help="Only analyse orders created on or after this date."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Threads used to run independent aggregation stages concurrently (and processes for forecasting).",
+    )
+    parser.add_argument(
+        "--forecast-top",
+        type=int,
+        default=None,
+        help="Only forecast this many best-selling products by units (default: every product).",
+    )
+    parser.add_argument(
+        "--sketches",
+        action="store_true",
+        help=(
+            "Approximate medians, quartiles and distinct customers with mergeable sketches, updated per chunk "
+            "when streaming and kept in the state by incremental runs."
+        ),
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Record the peak memory allocated by every stage (slower; needs --workers 1).",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=None,
+        help="Stream the line items in chunks of this many rows to bound peak memory.",
+    )
+    args = parser.parse_args(argv)
+    if args.incremental and args.since is not None:
+        parser.error("--since cannot be combined with --incremental, which always ingests from the stored watermark.")
+    if args.incremental and args.chunksize:
+        parser.error("--chunksize cannot be combined with --incremental, which does not stream the export.")
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    started = time.perf_counter()
+    timings: list[StageTiming] = []
+    if args.incremental:
+        outputs, timings = run_incremental(
+            args.state_dir,
+            args.reset_state,
+            args.source,
+            args.data_dir,
+            args.workers,
+            args.sketches,
+            args.forecast_top,
+            args.trace_memory,
+        )
+    elif args.chunksize:
+        outputs, timings = run_streaming(
+            args.source,
+            args.since,
+            args.chunksize,
+            args.data_dir,
+            args.workers,
+            args.sketches,
+            args.forecast_top,
+            args.trace_memory,
+        )
+    else:
+        outputs, timings = run_full(
+            args.source, args.since, args.data_dir, args.workers, args.sketches, args.forecast_top, args.trace_memory
+        )
 
-    export_outputs(kpis, top_products, top_categories, daily, hourly, basket_shape, rfm)
+    export_started = time.perf_counter()
+    export_outputs(*outputs)
+    if timings:
+        timings.append(StageTiming("export", time.perf_counter() - export_started, export_started - started))
 
     print("Analysis completed.")
     print(f"Outputs saved to {OUTPUT_DIR}")
+    if timings:
+        print(format_timings(timings, time.perf_counter() - started))
+    print(f"Peak memory (RSS high-water mark): {peak_rss_mb():.1f} MiB")
 
 
 if __name__ == "__main__":
@@ -4,25 +4,178 @@
 from __future__ import annotations
 
 import json
+from dataclasses import dataclass
 from pathlib import Path
 
 import altair as alt
+import numpy as np
 import pandas as pd
 import streamlit as st
 
-
-DATA_DIR = Path(__file__).resolve().parent
+from anomalies import COLUMNS as ANOMALY_COLUMNS
+from chart_data import POINT_BUDGET, downsample
+from dashboard_profiler import profiled_cache, start_profiler
+from kpi_windows import WindowedKPIs
 
 
-@st.cache_data
-def load_data():
+DATA_DIR = Path(__file__).resolve().parent
+CUBE_PATH = DATA_DIR / "analysis_outputs" / "sales_cube.parquet"
+# Committed exports used when the cube has not been generated yet.
+SALES_BY_DAY_PATH = DATA_DIR / "analysis_outputs" / "sales_by_day.csv"
+CATEGORY_BREAKDOWN_PATH = DATA_DIR / "category_breakdown.csv"
+PRODUCT_AFFINITY_PATH = DATA_DIR / "analysis_outputs" / "product_affinity.csv"
+SUBCATEGORY_AFFINITY_PATH = DATA_DIR / "analysis_outputs" / "subcategory_affinity.csv"
+COHORTS_PATH = DATA_DIR / "analysis_outputs" / "cohort_retention.csv"
+KPI_DAILY_PATH = DATA_DIR / "analysis_outputs" / "kpi_daily.csv"
+ANOMALIES_PATH = DATA_DIR / "analysis_outputs" / "anomalies.json"
+KPI_WINDOWS = {"7 días": 7, "30 días": 30, "90 días": 90, "365 días": 365}
+ANOMALY_LABELS = {
+    "granularity": {"day": "Día", "hour": "Hora"},
+    "dimension": {"store": "Tienda", "category": "Categoría", "vendor": "Marca"},
+    "metric": {"revenue": "Ingresos", "units": "Unidades", "orders": "Órdenes"},
+    "direction": {"spike": "Pico", "drop": "Caída"},
+}
+RECENT_ANOMALIES = 20
+QUERY_CACHE_ENTRIES = 256
+QUERY_CACHE_TTL = 60 * 30
+
+
+@dataclass
+class FilterIndex:
+    """Row positions per category and vendor, so filtering is an index intersection."""
+
+    size: int
+    by_category: dict[str, np.ndarray]
+    by_vendor: dict[str, np.ndarray]
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> FilterIndex:
+        def positions(column: str) -> dict[str, np.ndarray]:
+            codes, labels = pd.factorize(frame[column], sort=True)
+            order = np.argsort(codes, kind="stable")
+            bounds = np.searchsorted(codes[order], np.arange(len(labels) + 1))
+            return {label: order[bounds[i] : bounds[i + 1]] for i, label in enumerate(labels)}
+
+        return cls(size=len(frame), by_category=positions("category"), by_vendor=positions("vendor"))
+
+    def select(self, categories: tuple[str, ...], vendors: tuple[str, ...]) -> np.ndarray:
+        selected = np.arange(self.size)
+        for values, index in ((categories, self.by_category), (vendors, self.by_vendor)):
+            if values:
+                matches = [index[value] for value in values if value in index]
+                union = np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.intp)
+                selected = np.intersect1d(selected, union, assume_unique=True)
+        return selected
+
+
+@dataclass
+class QueryLayer:
+    metrics: dict
+    # Ranked by revenue (see build_pareto), with revenue_share/cum_share/rank columns.
+    products: pd.DataFrame
+    product_index: FilterIndex
+    # Without the cube, ``cube`` is the store-level daily series and ``cube_index`` is None.
+    cube: pd.DataFrame
+    cube_index: FilterIndex | None
+    category_breakdown: pd.DataFrame
+    correlations: pd.DataFrame
+    product_affinity: pd.DataFrame
+    subcategory_affinity: pd.DataFrame
+    cohorts: pd.DataFrame
+    kpi_windows: WindowedKPIs | None
+    anomalies: pd.DataFrame
+
+
+@profiled_cache(st.cache_resource)
+def load_query_layer() -> QueryLayer:
+    """Shared, read-only data for every session; built once per server process."""
     metrics = json.loads((DATA_DIR / "metrics.json").read_text(encoding="utf-8"))
-    categories = pd.read_csv(DATA_DIR / "category_breakdown.csv")
     products = pd.read_csv(DATA_DIR / "products_aggregated.csv")
-    orders = pd.read_csv(DATA_DIR / "orders_enriched.csv", parse_dates=["created_at"])
-    orders["created_at"] = pd.to_datetime(orders["created_at"], errors="coerce")
-    orders.dropna(subset=["created_at"], inplace=True)
-    return metrics, categories, products, orders
+    pareto = build_pareto(products).reset_index(drop=True)
+    if CUBE_PATH.exists():
+        cube = pd.read_parquet(CUBE_PATH)
+        for column in ("category", "subcategory", "vendor"):
+            cube[column] = cube[column].astype("category")
+        cube_index = FilterIndex.from_frame(cube)
+        category_breakdown = pd.DataFrame()
+    else:
+        cube = pd.read_csv(SALES_BY_DAY_PATH)
+        cube_index = None
+        category_breakdown = pd.read_csv(CATEGORY_BREAKDOWN_PATH).rename(
+            columns={"total_revenue": "revenue", "total_quantity": "units"}
+        )
+    cube["date"] = pd.to_datetime(cube["date"])
+    cube["month"] = cube["date"].dt.to_period("M").dt.to_timestamp()
+    return QueryLayer(
+        metrics=metrics,
+        products=pareto,
+        product_index=FilterIndex.from_frame(pareto),
+        cube=cube,
+        cube_index=cube_index,
+        category_breakdown=category_breakdown,
+        correlations=build_correlation_matrix(metrics["correlations"]),
+        product_affinity=load_optional_csv(PRODUCT_AFFINITY_PATH),
+        subcategory_affinity=load_optional_csv(SUBCATEGORY_AFFINITY_PATH),
+        cohorts=load_optional_csv(COHORTS_PATH),
+        kpi_windows=load_kpi_windows(),
+        anomalies=load_anomalies(),
+    )
+
+
+def load_optional_csv(path: Path) -> pd.DataFrame:
+    return pd.read_csv(path) if path.exists() else pd.DataFrame()
+
+
+def load_kpi_windows() -> WindowedKPIs | None:
+    daily = load_optional_csv(KPI_DAILY_PATH)
+    if daily.empty:
+        return None
+    return WindowedKPIs(pd.to_datetime(daily["date"]), daily)
+
+
+def load_anomalies() -> pd.DataFrame:
+    if not ANOMALIES_PATH.exists():
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    payload = json.loads(ANOMALIES_PATH.read_text(encoding="utf-8"))
+    anomalies = pd.DataFrame(payload["anomalies"], columns=ANOMALY_COLUMNS)
+    anomalies["period"] = pd.to_datetime(anomalies["period"])
+    return anomalies
+
+
+def normalize_filter(values: list[str]) -> tuple[str, ...]:
+    return tuple(sorted(set(values)))
+
+
+@profiled_cache(st.cache_data(max_entries=QUERY_CACHE_ENTRIES, ttl=QUERY_CACHE_TTL, show_spinner=False))
+def query_top_products(categories: tuple[str, ...], vendors: tuple[str, ...], limit: int = 10) -> pd.DataFrame:
+    layer = load_query_layer()
+    # Products are stored in revenue order, so the first positions are the top sellers.
+    positions = layer.product_index.select(categories, vendors)[:limit]
+    return layer.products.iloc[positions]
+
+
+@profiled_cache(st.cache_data(max_entries=QUERY_CACHE_ENTRIES, ttl=QUERY_CACHE_TTL, show_spinner=False))
+def query_cube(
+    categories: tuple[str, ...], vendors: tuple[str, ...]
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    layer = load_query_layer()
+    if layer.cube_index is None:
+        # The committed CSVs have no vendor split, and the daily series not even a category one.
+        breakdown = layer.category_breakdown
+        if categories:
+            breakdown = breakdown.loc[breakdown["category"].isin(categories)]
+        daily = downsample(build_daily_series(layer.cube), "date", "revenue_mm", method="minmax")
+        return build_monthly_series(layer.cube), daily, build_category_breakdown(breakdown)
+    cube = layer.cube.iloc[layer.cube_index.select(categories, vendors)]
+    # Min/max buckets keep promotion spikes visible once the daily series exceeds the point budget.
+    daily = downsample(build_daily_series(cube), "date", "revenue_mm", method="minmax")
+    return build_monthly_series(cube), daily, build_category_breakdown(cube)
+
+
+@profiled_cache(st.cache_data(max_entries=QUERY_CACHE_ENTRIES, ttl=QUERY_CACHE_TTL, show_spinner=False))
+def query_pareto_points(top_n: int) -> pd.DataFrame:
+    ranked = load_query_layer().products[["rank", "title", "cum_share"]].head(top_n)
+    return downsample(ranked, "rank", "cum_share", POINT_BUDGET)
 
 
 def format_currency(value: float) -> str:
@@ -33,17 +186,34 @@ def format_percent(value: float) -> str:
     return f"{value * 100:.1f}%"
 
 
-def build_monthly_series(orders: pd.DataFrame) -> pd.DataFrame:
-    series = (
-        orders.assign(month=lambda df: df["created_at"].dt.to_period("M").dt.to_timestamp())
-        .groupby("month", as_index=False)["total_price"]
-        .sum()
-        .sort_values("month")
-    )
-    series["total_price_mm"] = series["total_price"] / 1_000_000
+def format_change(current: float, previous: float) -> str | None:
+    if not previous:
+        return None
+    return format_percent(current / previous - 1)
+
+
+def build_monthly_series(cube: pd.DataFrame) -> pd.DataFrame:
+    """Monthly revenue in COP millions: line revenue from the cube, order ``total_price`` from sales_by_day.csv."""
+    series = cube.groupby("month", as_index=False)["revenue"].sum().sort_values("month")
+    series["revenue_mm"] = series["revenue"] / 1_000_000
     return series
 
 
+def build_daily_series(cube: pd.DataFrame) -> pd.DataFrame:
+    series = cube.groupby("date", as_index=False)["revenue"].sum().sort_values("date")
+    series["revenue_mm"] = series["revenue"] / 1_000_000
+    return series[["date", "revenue_mm"]]
+
+
+def build_category_breakdown(cube: pd.DataFrame) -> pd.DataFrame:
+    return (
+        cube.groupby(["category", "subcategory"], observed=True)
+        .agg(total_revenue=("revenue", "sum"), total_quantity=("units", "sum"))
+        .reset_index()
+        .sort_values("total_revenue", ascending=False)
+    )
+
+
 def build_pareto(products: pd.DataFrame) -> pd.DataFrame:
     ranked = products.sort_values("total_revenue", ascending=False).copy()
     ranked["revenue_share"] = ranked["total_revenue"] / ranked["total_revenue"].sum()
@@ -52,11 +222,59 @@ def build_pareto(products: pd.DataFrame) -> pd.DataFrame:
     return ranked
 
 
-metrics, categories_df, products_df, orders_df = load_data()
-monthly_df = build_monthly_series(orders_df)
-pareto_df = build_pareto(products_df)
+def affinity_display(affinity: pd.DataFrame, label_columns: dict[str, str]) -> pd.DataFrame:
+    # Only pairs bought together more often than chance are worth suggesting.
+    display = affinity.loc[affinity["lift"] > 1, [*label_columns, "orders", "confidence", "lift"]].rename(
+        columns={**label_columns, "orders": "Órdenes juntas", "confidence": "Confianza", "lift": "Lift"}
+    )
+    display["Confianza"] = display["Confianza"].map(format_percent)
+    display["Lift"] = display["Lift"].round(2)
+    return display
+
+
+def select_anomalies(anomalies: pd.DataFrame, categories: tuple[str, ...], vendors: tuple[str, ...]) -> pd.DataFrame:
+    """Anomalies of the series behind the current selection; the whole store when nothing is filtered."""
+    if not categories and not vendors:
+        return anomalies.loc[anomalies["dimension"] == "store"]
+    matches = (anomalies["dimension"].eq("category") & anomalies["key"].isin(categories)) | (
+        anomalies["dimension"].eq("vendor") & anomalies["key"].isin(vendors)
+    )
+    return anomalies.loc[matches]
+
+
+def anomaly_display(anomalies: pd.DataFrame) -> pd.DataFrame:
+    display = anomalies.head(RECENT_ANOMALIES).replace(ANOMALY_LABELS)
+    display["zscore"] = display["zscore"].round(1)
+    return display.rename(
+        columns={
+            "period": "Período",
+            "granularity": "Granularidad",
+            "dimension": "Dimensión",
+            "key": "Serie",
+            "metric": "Métrica",
+            "direction": "Tipo",
+            "value": "Valor",
+            "expected": "Esperado",
+            "zscore": "Z robusto",
+        }
+    )[["Período", "Granularidad", "Dimensión", "Serie", "Métrica", "Tipo", "Valor", "Esperado", "Z robusto"]]
+
+
+def build_correlation_matrix(correlations: dict) -> pd.DataFrame:
+    return (
+        pd.DataFrame(correlations)
+        .reset_index(names="metric_a")
+        .melt(id_vars="metric_a", var_name="metric_b", value_name="correlation")
+    )
+
 
 st.set_page_config(page_title="Premium Nutrition · Dashboard", layout="wide")
+profiler = start_profiler()
+
+profiler.begin("carga de datos")
+layer = load_query_layer()
+metrics = layer.metrics
+pareto_df = layer.products
 
 st.title("Premium Nutrition · Dashboard comercial")
 st.caption(
@@ -78,23 +296,31 @@ colombianos.
 """
     )
     st.header("Filtros")
-    category_filter = st.multiselect(
-        "Filtrar por categoría", sorted(products_df["category"].dropna().unique().tolist())
-    )
+    category_filter = st.multiselect("Filtrar por categoría", list(layer.product_index.by_category))
     vendor_filter = st.multiselect(
         "Filtrar por marca",
-        sorted(products_df["vendor"].dropna().unique().tolist()),
+        list(layer.product_index.by_vendor),
         default=[],
     )
 
-filtered_products = products_df.copy()
-if category_filter:
-    filtered_products = filtered_products[filtered_products["category"].isin(category_filter)]
-if vendor_filter:
-    filtered_products = filtered_products[filtered_products["vendor"].isin(vendor_filter)]
+profiler.begin("consultas filtradas")
+filters = (normalize_filter(category_filter), normalize_filter(vendor_filter))
+top_products = query_top_products(*filters)
+monthly_df, daily_df, categories_df = query_cube(*filters)
+selected_anomalies = select_anomalies(layer.anomalies, *filters)
+# Anomalies are scored per store, category and vendor series, so they only belong on the chart when it
+# shows exactly one of them; the CSV fallback always charts the whole store.
+single_series = sum(map(len, filters)) <= 1
+if layer.cube_index is None:
+    charted_anomalies = select_anomalies(layer.anomalies, (), ())
+elif single_series:
+    charted_anomalies = selected_anomalies
+else:
+    charted_anomalies = selected_anomalies.iloc[:0]
 
 summary = metrics["summary"]
 
+profiler.begin("1. resumen ejecutivo")
 st.header("1. Resumen ejecutivo")
 col1, col2, col3, col4 = st.columns(4)
 col1.metric("Ingresos totales", format_currency(summary["total_revenue"]))
@@ -108,15 +334,111 @@ col6.metric("Órdenes con envío", format_percent(summary["orders_with_shipping"
 col7.metric("Ítems promedio por orden", f"{summary['average_line_items_per_order']:.2f}")
 col8.metric("Unidades promedio por orden", f"{summary['average_quantity_per_order']:.2f}")
 
+windows = layer.kpi_windows
+if windows is not None:
+    st.subheader("Indicadores por período")
+    as_of_col, window_col = st.columns(2)
+    as_of = as_of_col.date_input(
+        "Fecha de corte", value=windows.last.date(), min_value=windows.first.date(), max_value=windows.last.date()
+    )
+    window_label = window_col.selectbox("Ventana", list(KPI_WINDOWS), index=1)
+    current, previous = windows.compare(pd.Timestamp(as_of), KPI_WINDOWS[window_label])
+    st.caption(f"Comparación contra los {KPI_WINDOWS[window_label]} días anteriores a la ventana seleccionada.")
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric(
+        "Ingresos",
+        format_currency(current["total_revenue"]),
+        format_change(current["total_revenue"], previous["total_revenue"]),
+    )
+    col2.metric(
+        "Órdenes",
+        f"{current['total_orders']:,.0f}",
+        format_change(current["total_orders"], previous["total_orders"]),
+    )
+    col3.metric(
+        "Ticket promedio",
+        format_currency(current["average_order_value"]),
+        format_change(current["average_order_value"], previous["average_order_value"]),
+    )
+    col4.metric(
+        "Órdenes con descuento",
+        format_percent(current["share_orders_discount"]),
+        format_change(current["share_orders_discount"], previous["share_orders_discount"]),
+    )
+
+profiler.begin("2. dinámica de ingresos")
 st.header("2. Dinámica de ingresos")
-st.markdown("Evolución mensual de ventas (COP millones).")
-st.line_chart(data=monthly_df, x="month", y="total_price_mm")
+if layer.cube_index is None:
+    st.warning(
+        "No se encontró el cubo de ventas (`analysis_outputs/sales_cube.parquet`); se muestran los CSV exportados. "
+        "La serie de ingresos es la de toda la tienda (total de las órdenes, con envío e impuestos) y no sigue "
+        "los filtros; el desempeño por categoría solo sigue el filtro de categoría. "
+        "Ejecuta `python analyze_bulk_data.py` para generar el cubo."
+    )
+else:
+    st.markdown(
+        "Evolución de los ingresos por productos (COP millones) para la selección de categorías y marcas. "
+        "Suma el valor de las líneas de cada orden, sin envío ni impuestos, por lo que es menor que el "
+        "total de las órdenes del resumen ejecutivo."
+    )
+granularity = st.radio("Granularidad", ["Mensual", "Diaria"], horizontal=True)
+if granularity == "Mensual":
+    profiler.payload("ingresos mensuales", monthly_df[["month", "revenue_mm"]])
+    st.line_chart(data=monthly_df, x="month", y="revenue_mm", x_label="Mes", y_label="COP millones")
+else:
+    profiler.payload("ingresos diarios", daily_df)
+    daily_chart = (
+        alt.Chart(daily_df)
+        .mark_line()
+        .encode(x=alt.X("date:T", title="Fecha"), y=alt.Y("revenue_mm:Q", title="COP millones"))
+    )
+    day_anomalies = charted_anomalies.loc[
+        charted_anomalies["granularity"].eq("day") & charted_anomalies["metric"].eq("revenue")
+    ]
+    if not day_anomalies.empty:
+        # Anomalies are marked with rules rather than points, since the line may be downsampled.
+        daily_chart += (
+            alt.Chart(day_anomalies[["period", "key", "direction", "value", "expected"]])
+            .mark_rule(strokeDash=[4, 3])
+            .encode(
+                x="period:T",
+                color=alt.Color(
+                    "direction:N",
+                    title="Anomalía",
+                    scale=alt.Scale(domain=["spike", "drop"], range=["#2ca02c", "#d62728"]),
+                ),
+                tooltip=[
+                    alt.Tooltip("period:T", title="Fecha"),
+                    alt.Tooltip("key:N", title="Serie"),
+                    alt.Tooltip("value:Q", title="Ingresos", format=",.0f"),
+                    alt.Tooltip("expected:Q", title="Esperado", format=",.0f"),
+                ],
+            )
+        )
+    st.altair_chart(daily_chart, use_container_width=True)
+
+if not selected_anomalies.empty:
+    st.subheader("Alertas recientes")
+    st.caption(
+        "Días y horas cuyo valor se aleja de la mediana de las 28 observaciones anteriores "
+        "(z robusto > 3,5). Las horas se comparan con la misma hora de días previos."
+        + (
+            " Con varias categorías o marcas seleccionadas se listan las alertas de cada una por separado "
+            "(unión), no las de la serie combinada del gráfico, por eso no se marcan en él."
+            if not single_series
+            else ""
+        )
+    )
+    anomalies_display = anomaly_display(selected_anomalies)
+    profiler.payload("alertas", anomalies_display)
+    st.dataframe(anomalies_display, hide_index=True, use_container_width=True)
 
+profiler.begin("3. productos destacados")
 st.header("3. Productos destacados")
-if filtered_products.empty:
+if top_products.empty:
     st.info("No hay productos que coincidan con los filtros seleccionados.")
 else:
-    top_products = filtered_products.sort_values("total_revenue", ascending=False).head(10).copy()
+    top_products = top_products.copy()
     top_products["total_revenue_bn"] = top_products["total_revenue"] / 1_000_000_000
     top_products_display = top_products[
         ["title", "vendor", "category", "subcategory", "total_revenue_bn", "total_quantity", "order_count"]
@@ -131,14 +453,20 @@ else:
             "order_count": "Órdenes",
         }
     )
+    profiler.payload("top productos", top_products_display)
     st.dataframe(top_products_display, hide_index=True, use_container_width=True)
 
+profiler.begin("4. pareto")
 st.header("4. Pareto del portafolio")
 st.markdown(
     "El 1.3% del catálogo (27 SKU) explica el 80% del ingreso. Utiliza la selección para inspeccionar el corte."
 )
-pareto_cut = st.slider("Visualizar top N productos", min_value=10, max_value=200, value=50, step=10)
-pareto_chart_data = pareto_df.head(pareto_cut)
+# Small catalogs still need max_value > min_value and a default inside the range.
+pareto_max = max(20, len(pareto_df))
+pareto_cut = st.slider(
+    "Visualizar top N productos", min_value=10, max_value=pareto_max, value=min(50, pareto_max), step=10
+)
+pareto_chart_data = query_pareto_points(pareto_cut)
 pareto_chart = (
     alt.Chart(pareto_chart_data)
     .mark_line(point=True)
@@ -149,8 +477,10 @@ pareto_chart = (
     )
     .properties(height=300)
 )
+profiler.payload("pareto", pareto_chart_data)
 st.altair_chart(pareto_chart, use_container_width=True)
 
+profiler.begin("5. categorías")
 st.header("5. Desempeño por categoría")
 category_chart = (
     alt.Chart(categories_df)
@@ -168,13 +498,12 @@ category_chart = (
     )
     .properties(height=450)
 )
+profiler.payload("categorías", categories_df)
 st.altair_chart(category_chart, use_container_width=True)
 
+profiler.begin("6. correlaciones")
 st.header("6. Correlaciones operativas")
-corr_df = pd.DataFrame(metrics["correlations"])
-corr_long = corr_df.reset_index(names="metric_a").melt(
-    id_vars="metric_a", var_name="metric_b", value_name="correlation"
-)
+corr_long = layer.correlations
 heatmap = (
     alt.Chart(corr_long)
     .mark_rect()
@@ -194,9 +523,72 @@ heatmap = (
     )
     .properties(height=320)
 )
+profiler.payload("correlaciones", corr_long)
 st.altair_chart(heatmap, use_container_width=True)
 
-st.header("7. Recomendaciones para agentes")
+profiler.begin("7. venta cruzada")
+st.header("7. Venta cruzada")
+subcategory_affinity = layer.subcategory_affinity
+product_affinity = layer.product_affinity
+if subcategory_affinity.empty:
+    st.info("No hay tablas de afinidad. Ejecuta `python analyze_bulk_data.py` para generarlas.")
+else:
+    st.markdown(
+        "Subcategorías y productos que se compran juntos con más frecuencia de la esperada (lift > 1). "
+        "La confianza es la proporción de órdenes con el producto base que también incluyen la sugerencia."
+    )
+    subcategories = subcategory_affinity["antecedent_subcategory"].drop_duplicates().sort_values().tolist()
+    base_subcategory = st.selectbox("Subcategoría base", subcategories)
+    selected = subcategory_affinity.loc[subcategory_affinity["antecedent_subcategory"] == base_subcategory]
+    subcategory_display = affinity_display(
+        selected, {"consequent_category": "Categoría sugerida", "consequent_subcategory": "Subcategoría sugerida"}
+    )
+    profiler.payload("afinidad subcategorías", subcategory_display)
+    st.dataframe(subcategory_display, hide_index=True, use_container_width=True)
+
+    if not product_affinity.empty:
+        products = product_affinity["antecedent_title"].dropna().drop_duplicates().sort_values().tolist()
+        base_product = st.selectbox("Producto base", products)
+        selected = product_affinity.loc[product_affinity["antecedent_title"] == base_product]
+        product_display = affinity_display(selected, {"consequent_title": "Producto sugerido"})
+        profiler.payload("afinidad productos", product_display)
+        st.dataframe(product_display, hide_index=True, use_container_width=True)
+
+profiler.begin("8. cohortes")
+st.header("8. Retención por cohorte")
+cohorts_df = layer.cohorts
+if cohorts_df.empty:
+    st.info("No hay matriz de cohortes. Ejecuta `python analyze_bulk_data.py` para generarla.")
+else:
+    st.markdown(
+        "Clientes agrupados por el mes de su primera compra: porcentaje que vuelve a comprar en cada mes "
+        "posterior e ingreso acumulado por cliente de la cohorte."
+    )
+    cohort_metric = st.radio("Métrica", ["Retención", "Ingreso acumulado por cliente"], horizontal=True)
+    if cohort_metric == "Retención":
+        color = alt.Color("retention:Q", title="Retención", scale=alt.Scale(scheme="blues"))
+        value_tooltip = alt.Tooltip("retention:Q", title="Retención", format=".1%")
+    else:
+        color = alt.Color(
+            "cumulative_revenue_per_customer:Q", title="COP por cliente", scale=alt.Scale(scheme="greens")
+        )
+        value_tooltip = alt.Tooltip("cumulative_revenue_per_customer:Q", title="COP por cliente", format=",.0f")
+    cohort_chart = (
+        alt.Chart(cohorts_df)
+        .mark_rect()
+        .encode(
+            x=alt.X("months_since_first:O", title="Meses desde la primera compra"),
+            y=alt.Y("cohort:O", title="Cohorte"),
+            color=color,
+            tooltip=["cohort", "months_since_first", "customers", value_tooltip],
+        )
+        .properties(height=max(240, 18 * cohorts_df["cohort"].nunique()))
+    )
+    profiler.payload("cohortes", cohorts_df)
+    st.altair_chart(cohort_chart, use_container_width=True)
+
+profiler.begin("9. recomendaciones")
+st.header("9. Recomendaciones para agentes")
 st.markdown(
     """
 - **Liderazgo del portafolio:** Prioriza narrativas sobre Gold Standard Whey, creatinas y ISO 100; representan el núcleo de ingresos.
@@ -210,5 +602,7 @@ st.markdown(
 st.divider()
 st.caption(
     "Fuente: Shopify bulk export (2024). Para regenerar métricas: "
-    "`python scripts/generate_dashboard_metrics.py bulk_definitivo.json --output-dir dashboard`."
+    "`python bulk_jsonl.py bulk_definitivo.json` y luego `python analyze_bulk_data.py --source parquet`."
 )
+
+profiler.finish()
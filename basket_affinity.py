@@ -0,0 +1,127 @@
+"""Market-basket affinity (support, confidence, lift) from sparse order x item incidence matrices."""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+MIN_SUPPORT = 0.001
+MIN_PAIR_ORDERS = 5
+TOP_K = 10
+
+
+@dataclass
+class CooccurrenceCounts:
+    """Order counts per item and per ordered item pair.
+
+    Counts over disjoint sets of orders are additive (see ``merge_counts``), so
+    chunks holding whole orders can be counted separately and merged.
+    """
+
+    orders: int
+    items: pd.Series
+    pairs: pd.Series
+
+
+def _labels(uniques: pd.Index, positions: np.ndarray) -> list[np.ndarray]:
+    selected = uniques[positions]
+    if isinstance(selected, pd.MultiIndex):
+        return [selected.get_level_values(level).to_numpy() for level in range(selected.nlevels)]
+    return [selected.to_numpy()]
+
+
+def count_cooccurrences(order_ids: pd.Series, keys: pd.DataFrame, min_item_orders: int = 1) -> CooccurrenceCounts:
+    """Count co-purchases of the items identified by the ``keys`` columns.
+
+    Lines are scattered into a binary order x item CSR matrix and pairs come
+    from ``X.T @ X``. Items bought in fewer than ``min_item_orders`` orders are
+    dropped beforehand: a pair can never be more frequent than either item.
+    """
+    order_codes, order_uniques = pd.factorize(order_ids)
+    valid = (order_codes >= 0) & keys.notna().all(axis=1).to_numpy()
+    names = list(keys.columns)
+    key_index = pd.MultiIndex.from_frame(keys.loc[valid]) if len(names) > 1 else pd.Index(keys.loc[valid, names[0]])
+    item_codes, item_uniques = key_index.factorize()
+
+    incidence = sparse.csr_matrix(
+        (np.ones(len(item_codes), dtype=np.int32), (order_codes[valid], item_codes)),
+        shape=(len(order_uniques), len(item_uniques)),
+    )
+    incidence.data[:] = 1  # the constructor sums repeated lines of an item within an order
+
+    item_orders = np.asarray(incidence.sum(axis=0)).ravel()
+    kept = np.flatnonzero(item_orders >= min_item_orders)
+    incidence = incidence[:, kept]
+    # Orders left with a single item cannot contribute a pair.
+    incidence = incidence[np.diff(incidence.indptr) >= 2]
+
+    cooccurrence = (incidence.T @ incidence).tocoo()
+    off_diagonal = cooccurrence.row != cooccurrence.col
+    rows, cols = cooccurrence.row[off_diagonal], cooccurrence.col[off_diagonal]
+
+    pair_index = pd.MultiIndex.from_arrays(
+        _labels(item_uniques, kept[rows]) + _labels(item_uniques, kept[cols]),
+        names=[f"antecedent_{name}" for name in names] + [f"consequent_{name}" for name in names],
+    )
+    return CooccurrenceCounts(
+        orders=len(order_uniques),
+        items=pd.Series(item_orders[kept], index=item_uniques[kept].set_names(names), name="orders"),
+        pairs=pd.Series(cooccurrence.data[off_diagonal].astype(np.int64), index=pair_index, name="orders"),
+    )
+
+
+def merge_counts(left: CooccurrenceCounts | None, right: CooccurrenceCounts) -> CooccurrenceCounts:
+    if left is None:
+        return right
+    return CooccurrenceCounts(
+        orders=left.orders + right.orders,
+        items=left.items.add(right.items, fill_value=0).astype(np.int64),
+        pairs=left.pairs.add(right.pairs, fill_value=0).astype(np.int64),
+    )
+
+
+def score_affinity(
+    counts: CooccurrenceCounts,
+    min_support: float = MIN_SUPPORT,
+    min_pair_orders: int = MIN_PAIR_ORDERS,
+    top_k: int = TOP_K,
+) -> pd.DataFrame:
+    """Top ``top_k`` consequents per antecedent by lift, for pairs above the minimum support."""
+    threshold = max(min_pair_orders, math.ceil(min_support * counts.orders))
+    pairs = counts.pairs.loc[counts.pairs >= threshold]
+    width = pairs.index.nlevels // 2
+    columns = list(pairs.index.names)
+    if pairs.empty:
+        return pd.DataFrame(columns=columns + ["orders", "support", "confidence", "lift"])
+
+    antecedent = pairs.index.droplevel(list(range(width, 2 * width)))
+    consequent = pairs.index.droplevel(list(range(width)))
+    antecedent_orders = counts.items.reindex(antecedent.set_names(counts.items.index.names)).to_numpy()
+    consequent_orders = counts.items.reindex(consequent.set_names(counts.items.index.names)).to_numpy()
+
+    pair_orders = pairs.to_numpy()
+    confidence = pair_orders / antecedent_orders
+    lift = confidence / (consequent_orders / counts.orders)
+
+    # Rank consequents within each antecedent by lift, then confidence, without a groupby;
+    # the consequent label breaks ties so the table does not depend on the input order.
+    group = antecedent.factorize(sort=True)[0]
+    tie_breaker = consequent.factorize(sort=True)[0]
+    order = np.lexsort((tie_breaker, -confidence, -lift, group))
+    sorted_group = group[order]
+    starts = np.r_[True, sorted_group[1:] != sorted_group[:-1]]
+    position = np.arange(len(order))
+    rank = position - np.maximum.accumulate(np.where(starts, position, 0))
+    selected = order[rank < top_k]
+
+    table = pairs.iloc[selected].index.to_frame(index=False)
+    table["orders"] = pair_orders[selected]
+    table["support"] = pair_orders[selected] / counts.orders
+    table["confidence"] = confidence[selected]
+    table["lift"] = lift[selected]
+    return table
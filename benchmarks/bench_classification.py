@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Parity check and timing of the batch product classifier against ``classify_product``."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from analyze_bulk_data import classify_product, classify_products  # noqa: E402
+from benchmarks.synthetic import generate_bulk_export  # noqa: E402
+
+
+def classify_rowwise(items: pd.DataFrame) -> pd.DataFrame:
+    category, subcategory = zip(
+        *items.apply(
+            lambda row: classify_product(
+                row.get("variant.product.title"),
+                row.get("variant.product.productType"),
+                row.get("variant.title"),
+            ),
+            axis=1,
+        )
+    )
+    return pd.DataFrame({"category": category, "subcategory": subcategory}, index=items.index)
+
+
+EDGE_CASES = pd.DataFrame(
+    {
+        "variant.product.title": ["Combo Serious Mass", "Pack ISO 100 x2", "Kit Duo", "Shaker", None, "Barra", "Omega"],
+        "variant.product.productType": ["Combo", None, "", float("nan"), "Accesorio", "", None],
+        "variant.title": [None, "2x", "Default Title", "", None, "Chocolate", float("nan")],
+    }
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    args = parser.parse_args()
+
+    pd.testing.assert_frame_equal(classify_products(EDGE_CASES), classify_rowwise(EDGE_CASES), check_dtype=False)
+
+    for n_rows in args.rows:
+        _, items = generate_bulk_export(n_rows)
+
+        started = time.perf_counter()
+        expected = classify_rowwise(items)
+        rowwise_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = classify_products(items)
+        batch_seconds = time.perf_counter() - started
+
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        print(
+            f"rows={n_rows:>9,}  row-wise={rowwise_seconds:8.3f}s  batch={batch_seconds:8.3f}s  "
+            f"speedup={rowwise_seconds / batch_seconds:6.1f}x  parity=ok"
+        )
+
+
+if __name__ == "__main__":
+    main()
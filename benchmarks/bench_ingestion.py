@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Cold-load time and peak RSS of the CSV and Parquet ingestion paths of ``load_data``."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+
+def measure(source: str, data_dir: Path, since: str | None) -> dict:
+    import analyze_bulk_data
+    from analyze_bulk_data import peak_rss_mb
+
+    started = time.perf_counter()
+    orders, items = analyze_bulk_data.load_data(source, since=since, data_dir=data_dir)
+    elapsed = time.perf_counter() - started
+    return {"seconds": elapsed, "peak_rss_mb": peak_rss_mb(), "orders": len(orders), "items": len(items)}
+
+
+def run_isolated(source: str, data_dir: Path, since: str | None) -> dict:
+    command = [sys.executable, __file__, "--worker", source, "--data-dir", str(data_dir)]
+    if since:
+        command += ["--since", since]
+    completed = subprocess.run(command, check=True, capture_output=True, text=True, cwd=ROOT_DIR)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Synthetic line items to generate.")
+    parser.add_argument("--data-dir", type=Path, default=None, help="Benchmark an existing export instead.")
+    parser.add_argument("--since", default=None, help="Also apply a createdAt >= since predicate.")
+    parser.add_argument("--worker", choices=("csv", "parquet"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker, args.data_dir, args.since)))
+        return
+
+    from benchmarks.synthetic import generate_bulk_export, write_bulk_csvs
+    from bulk_parquet import PARQUET_DIR, convert_bulk_csvs
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir
+        if data_dir is None:
+            data_dir = Path(tmp)
+            write_bulk_csvs(data_dir, *generate_bulk_export(args.rows))
+        parquet_dir = data_dir / PARQUET_DIR.name
+        if not parquet_dir.exists():
+            started = time.perf_counter()
+            convert_bulk_csvs(data_dir, parquet_dir)
+            print(f"conversion: {time.perf_counter() - started:.2f}s")
+
+        for source in ("csv", "parquet"):
+            result = run_isolated(source, data_dir, args.since)
+            print(
+                f"{source:<8} load={result['seconds']:7.2f}s  peak_rss={result['peak_rss_mb']:8.1f} MiB  "
+                f"orders={result['orders']:,}  items={result['items']:,}"
+            )
+
+
+if __name__ == "__main__":
+    main()
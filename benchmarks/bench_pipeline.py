@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""Per-stage time and memory of the full pipeline on synthetic exports, tracked in a JSON history.
+
+Each size runs in a fresh interpreter so peak RSS is not inherited from earlier
+runs. Every run is appended to the history file and compared with the latest
+earlier run recorded with the same settings; stages that got slower (or runs
+whose peak RSS grew) by more than ``--tolerance`` are reported as regressions.
+Everything is generated locally, so the benchmark runs offline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+HISTORY_PATH = ROOT_DIR / "benchmarks" / "pipeline_history.json"
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+# Differences below this many seconds are treated as noise whatever the ratio.
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def measure(data_dir: Path, workers: int, trace_memory: bool) -> dict:
+    import analyze_bulk_data
+    from analyze_bulk_data import export_outputs, peak_rss_mb, run_full
+
+    started = time.perf_counter()
+    outputs, timings = run_full(data_dir=data_dir, workers=workers, trace_memory=trace_memory)
+    stages = {timing.name: {"seconds": timing.seconds, "peak_mb": timing.peak_mb} for timing in timings}
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        analyze_bulk_data.OUTPUT_DIR = Path(output_dir)
+        if trace_memory:
+            tracemalloc.start()
+        export_started = time.perf_counter()
+        export_outputs(*outputs)
+        stages["export"] = {
+            "seconds": time.perf_counter() - export_started,
+            "peak_mb": tracemalloc.get_traced_memory()[1] / 2**20 if trace_memory else None,
+        }
+        tracemalloc.stop()
+
+    kpis = outputs[0]
+    return {
+        "orders": kpis.total_orders,
+        "total_seconds": time.perf_counter() - started,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": stages,
+    }
+
+
+def run_isolated(data_dir: Path, workers: int, trace_memory: bool) -> dict:
+    command = [sys.executable, __file__, "--worker", str(data_dir), "--workers", str(workers)]
+    if trace_memory:
+        command.append("--trace-memory")
+    completed = subprocess.run(command, check=True, capture_output=True, text=True, cwd=ROOT_DIR)
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def git_commit() -> str | None:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT_DIR, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def load_history(path: Path) -> list[dict]:
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else []
+
+
+def find_baseline(history: list[dict], settings: dict) -> dict | None:
+    for run in reversed(history):
+        if run["settings"] == settings:
+            return run
+    return None
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Lines describing every stage or peak RSS that regressed beyond ``tolerance``."""
+    regressions = []
+    for rows, result in current["results"].items():
+        previous = baseline["results"].get(rows)
+        if previous is None:
+            continue
+        measured = {name: stage["seconds"] for name, stage in result["stages"].items()}
+        measured["total"] = result["total_seconds"]
+        reference = {name: stage["seconds"] for name, stage in previous["stages"].items()}
+        reference["total"] = previous["total_seconds"]
+        for name, seconds in measured.items():
+            before = reference.get(name)
+            if before is None:
+                continue
+            if seconds > before * (1 + tolerance) and seconds - before > MIN_REGRESSION_SECONDS:
+                regressions.append(f"rows={rows:>10}  {name:<18} {before:8.3f}s -> {seconds:8.3f}s")
+        if result["peak_rss_mb"] > previous["peak_rss_mb"] * (1 + tolerance):
+            before, after = previous["peak_rss_mb"], result["peak_rss_mb"]
+            regressions.append(f"rows={rows:>10}  {'peak_rss':<18} {before:7.1f}MiB -> {after:7.1f}MiB")
+    return regressions
+
+
+def print_result(n_rows: int, result: dict) -> None:
+    print(
+        f"rows={n_rows:,}  orders={result['orders']:,}  total={result['total_seconds']:.2f}s  "
+        f"peak_rss={result['peak_rss_mb']:.1f} MiB"
+    )
+    for name, stage in result["stages"].items():
+        peak = f"{stage['peak_mb']:10.1f} MiB" if stage["peak_mb"] is not None else ""
+        print(f"  {name:<20}{stage['seconds']:9.3f}s{peak}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="Synthetic line items per run.")
+    parser.add_argument("--workers", type=int, default=1, help="Stage scheduler threads (see analyze_bulk_data).")
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Also record each stage's peak allocations with tracemalloc (slower; forces a single worker).",
+    )
+    parser.add_argument("--history", type=Path, default=HISTORY_PATH, help="JSON file the runs are appended to.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%).")
+    parser.add_argument("--no-save", action="store_true", help="Compare with the baseline without recording the run.")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 on any regression.")
+    parser.add_argument("--worker", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    workers = 1 if args.trace_memory else args.workers
+
+    if args.worker:
+        print(json.dumps(measure(args.worker, workers, args.trace_memory)))
+        return
+
+    from benchmarks.synthetic import generate_bulk_export, write_bulk_csvs
+
+    results = {}
+    for n_rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_bulk_csvs(Path(tmp), *generate_bulk_export(n_rows))
+            results[str(n_rows)] = run_isolated(Path(tmp), workers, args.trace_memory)
+        print_result(n_rows, results[str(n_rows)])
+
+    import numpy
+    import pandas
+
+    settings = {"workers": workers, "trace_memory": args.trace_memory, "cpus": os.cpu_count()}
+    run = {
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pandas.__version__,
+        "numpy": numpy.__version__,
+        "machine": platform.machine(),
+        "settings": settings,
+        "results": results,
+    }
+
+    history = load_history(args.history)
+    baseline = find_baseline(history, settings)
+    regressions = []
+    if baseline is None:
+        print("No earlier run with these settings; this run becomes the baseline.")
+    else:
+        regressions = compare(run, baseline, args.tolerance)
+        label = f"{baseline['recorded_at']} ({baseline.get('commit') or 'unknown commit'})"
+        if regressions:
+            print(f"Regressions against {label}:")
+            print("\n".join(f"  {line}" for line in regressions))
+        else:
+            print(f"No regressions against {label} (tolerance {args.tolerance:.0%}).")
+
+    if not args.no_save:
+        args.history.write_text(json.dumps([*history, run], indent=2), encoding="utf-8")
+        print(f"Run appended to {args.history}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
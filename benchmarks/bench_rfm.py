@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""Parity check and timing of the vectorized RFM scoring against the pd.cut/apply implementation."""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from analyze_bulk_data import OUTPUT_DIR, rfm_reference_date, score_rfm  # noqa: E402
+
+
+def score_rfm_legacy(rfm: pd.DataFrame, reference_date: pd.Timestamp) -> pd.DataFrame:
+    rfm = rfm.copy()
+    rfm["recency_days"] = (reference_date - rfm["last_purchase"]).dt.days
+
+    bins = np.linspace(0, 1, 6)
+
+    recency_pct = rfm["recency_days"].rank(method="first", pct=True)
+    frequency_pct = rfm["frequency"].rank(method="first", pct=True)
+    monetary_pct = rfm["monetary"].rank(method="first", pct=True)
+
+    rfm["recency_score"] = pd.cut(recency_pct, bins=bins, labels=[5, 4, 3, 2, 1], include_lowest=True).astype(int)
+    rfm["frequency_score"] = pd.cut(frequency_pct, bins=bins, labels=[1, 2, 3, 4, 5], include_lowest=True).astype(int)
+    rfm["monetary_score"] = pd.cut(monetary_pct, bins=bins, labels=[1, 2, 3, 4, 5], include_lowest=True).astype(int)
+    rfm["rfm_score"] = rfm["recency_score"] + rfm["frequency_score"] + rfm["monetary_score"]
+
+    def segment(row: pd.Series) -> str:
+        if row["recency_score"] >= 4 and row["frequency_score"] >= 4:
+            return "Leal"
+        if row["recency_score"] >= 4 and row["frequency_score"] <= 2:
+            return "Nuevo/Potencial"
+        if row["recency_score"] <= 2 and row["frequency_score"] >= 4:
+            return "En Riesgo"
+        if row["recency_score"] <= 2 and row["frequency_score"] <= 2:
+            return "Churn"
+        return "Activo"
+
+    rfm["segment"] = rfm.apply(segment, axis=1)
+    return rfm
+
+
+def synthetic_customers(n_customers: int, seed: int = 11) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp("2025-10-06", tz="America/Bogota")
+    return pd.DataFrame(
+        {
+            "customer.id": [f"gid://shopify/Customer/{i}" for i in range(n_customers)],
+            "last_purchase": end - pd.to_timedelta(rng.integers(0, 400 * 86_400, n_customers), unit="s"),
+            "frequency": rng.geometric(0.55, n_customers),
+            "monetary": np.round(rng.lognormal(12.6, 0.7, n_customers), -2),
+        }
+    )
+
+
+def check_against_export() -> None:
+    path = OUTPUT_DIR / "rfm_segments.csv"
+    if not path.exists():
+        return
+    exported = pd.read_csv(path)
+    exported["last_purchase"] = pd.to_datetime(exported["last_purchase"])
+    inputs = exported[["customer.id", "last_purchase", "frequency", "monetary"]]
+    scored = score_rfm(inputs, rfm_reference_date(inputs["last_purchase"]))
+    pd.testing.assert_frame_equal(scored[exported.columns], exported, check_dtype=False)
+    print(f"{path.name}: {len(exported):,} customers reproduced exactly")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--customers", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    check_against_export()
+    for n_customers in args.customers:
+        customers = synthetic_customers(n_customers)
+        reference_date = rfm_reference_date(customers["last_purchase"])
+
+        started = time.perf_counter()
+        expected = score_rfm_legacy(customers, reference_date)
+        legacy_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        actual = score_rfm(customers, reference_date)
+        vectorized_seconds = time.perf_counter() - started
+
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        print(
+            f"customers={n_customers:>10,}  legacy={legacy_seconds:8.3f}s  vectorized={vectorized_seconds:8.3f}s  "
+            f"speedup={legacy_seconds / vectorized_seconds:6.1f}x  parity=ok"
+        )
+
+
+if __name__ == "__main__":
+    main()
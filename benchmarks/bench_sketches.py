@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Accuracy of the KLL and HyperLogLog sketches against exact quantiles and distinct counts."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR))
+
+from analyze_bulk_data import OrderSketches, build_order_sketches, enrich_orders  # noqa: E402
+from benchmarks.synthetic import generate_bulk_export  # noqa: E402
+from sketches import HyperLogLog  # noqa: E402
+
+QUANTILES = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+# Documented bounds in sketches.py: ~1.7% normalized rank error (k=200) and 0.81% HLL standard error.
+# Distinct counts are checked against three standard errors.
+MAX_RANK_ERROR = 0.017
+MAX_DISTINCT_ERROR = 3 * 0.0081
+
+
+def rank_errors(values: np.ndarray, estimates: np.ndarray) -> np.ndarray:
+    """Distance between each requested rank and the rank interval the estimate actually occupies."""
+    ordered = np.sort(values)
+    below = np.searchsorted(ordered, estimates, side="left") / len(ordered)
+    at_or_below = np.searchsorted(ordered, estimates, side="right") / len(ordered)
+    targets = np.asarray(QUANTILES)
+    return np.where(targets < below, below - targets, np.where(targets > at_or_below, targets - at_or_below, 0.0))
+
+
+def check(n_items: int, chunks: int) -> None:
+    orders, items = generate_bulk_export(n_items)
+    orders, _ = enrich_orders(orders, items)
+
+    started = time.perf_counter()
+    # Build one sketch per chunk and merge them, then round-trip through JSON,
+    # which is how sketches from separate runs or days are combined.
+    merged = None
+    for part in np.array_split(np.arange(len(orders)), chunks):
+        sketch = build_order_sketches(orders.iloc[part])
+        merged = sketch if merged is None else merged.merge(sketch)
+    merged = OrderSketches.from_dict(json.loads(json.dumps(merged.to_dict())))
+    elapsed = time.perf_counter() - started
+
+    worst = 0.0
+    for name, column in (("order_value", "total_price"), ("lines", "lines"), ("units", "units")):
+        values = orders[column].to_numpy(dtype=float)
+        errors = rank_errors(values, getattr(merged, name).quantiles(QUANTILES))
+        worst = max(worst, errors.max())
+        exact = np.quantile(values, QUANTILES)
+        approx = getattr(merged, name).quantiles(QUANTILES)
+        print(f"  {name:<12} max rank error {errors.max():.4f}  median exact {exact[3]:,.1f} sketch {approx[3]:,.1f}")
+
+    exact_customers = orders["customer.id"].nunique(dropna=True)
+    estimate = merged.customers.estimate()
+    distinct_error = abs(estimate / exact_customers - 1)
+    print(f"  customers    exact {exact_customers:,} estimate {estimate:,.0f} (error {distinct_error:.4f})")
+    print(f"  {len(orders):,} orders in {chunks} chunks sketched and merged in {elapsed:.3f}s")
+
+    assert worst <= MAX_RANK_ERROR, f"quantile rank error {worst:.4f} above {MAX_RANK_ERROR}"
+    assert distinct_error <= MAX_DISTINCT_ERROR, f"distinct count error {distinct_error:.4f} above {MAX_DISTINCT_ERROR}"
+
+
+def check_distinct(n_distinct: int, chunks: int) -> None:
+    # Synthetic exports concentrate orders on few customers, so high cardinalities are checked directly.
+    ids = pd.Series([f"gid://shopify/Customer/{i}" for i in range(n_distinct)])
+    stream = ids.sample(frac=1.5, replace=True, random_state=3).to_numpy()
+    merged = HyperLogLog()
+    for part in np.array_split(stream, chunks):
+        merged.merge(HyperLogLog().update(part))
+    exact = pd.Series(stream).nunique()
+    error = abs(merged.estimate() / exact - 1)
+    print(f"  {exact:,} distinct ids: estimate {merged.estimate():,.0f} (error {error:.4f})")
+    assert error <= MAX_DISTINCT_ERROR, f"distinct count error {error:.4f} above {MAX_DISTINCT_ERROR}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--chunks", type=int, default=16, help="Sketches built separately and merged.")
+    args = parser.parse_args()
+
+    for n_items in args.items:
+        print(f"{n_items:,} synthetic line items")
+        check(n_items, args.chunks)
+    print("HyperLogLog at high cardinality")
+    for n_distinct in (10_000, 100_000, 1_000_000):
+        check_distinct(n_distinct, args.chunks)
+    print("All sketch estimates within their documented bounds.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Synthetic Shopify-shaped bulk exports for offline benchmarks."""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent
+CATALOG_PATH = BASE_DIR.parent / "products_aggregated.csv"
+
+VARIANT_TITLES = (
+    "Chocolate / 5 lb",
+    "Vainilla / 2 lb",
+    "Fresa / 5 lb",
+    "Sin sabor / 300 g",
+    "Cookies & Cream / 2 lb",
+    "Default Title",
+    None,
+)
+
+
+def load_catalog() -> pd.DataFrame:
+    catalog = pd.read_csv(CATALOG_PATH, usecols=["product_id", "title", "vendor", "product_type"])
+    return catalog.drop_duplicates("product_id").reset_index(drop=True)
+
+
+def generate_bulk_export(
+    n_items: int,
+    lines_per_order: float = 3.8,
+    n_customers: int | None = None,
+    start: str = "2024-09-10",
+    days: int = 400,
+    seed: int = 7,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Return (orders, items) frames with the columns produced by ``load_data``."""
+    rng = np.random.default_rng(seed)
+    catalog = load_catalog()
+
+    n_orders = max(1, int(n_items / lines_per_order))
+    n_customers = n_customers or max(1, int(n_orders * 0.58))
+
+    order_ids = np.array([f"gid://shopify/Order/{5_000_000 + i}" for i in range(n_orders)], dtype=object)
+    customer_pool = np.array([f"gid://shopify/Customer/{7_000_000 + i}" for i in range(n_customers)], dtype=object)
+    customers = customer_pool[rng.zipf(1.6, n_orders) % n_customers]
+    customers[rng.random(n_orders) < 0.02] = None
+
+    start_ts = pd.Timestamp(start, tz="UTC")
+    offsets = np.sort(rng.integers(0, days * 86_400, n_orders))
+    created_at = start_ts + pd.to_timedelta(offsets, unit="s")
+    updated_at = created_at + pd.to_timedelta(rng.integers(0, 3 * 86_400, n_orders), unit="s")
+
+    weights = 1.0 / np.arange(1, len(catalog) + 1) ** 1.1
+    weights /= weights.sum()
+    product_index = rng.choice(len(catalog), size=n_items, p=weights)
+    parent_index = np.sort(rng.integers(0, n_orders, n_items))
+    quantity = rng.integers(1, 4, n_items)
+    original_price = rng.choice([89_900.0, 149_900.0, 249_900.0, 319_900.0, 459_900.0], size=n_items)
+    discounted_price = np.where(rng.random(n_items) < 0.9, np.round(original_price * 0.8, -2), 0.0)
+    variant_titles = np.array(VARIANT_TITLES, dtype=object)[rng.integers(0, len(VARIANT_TITLES), n_items)]
+
+    items = pd.DataFrame(
+        {
+            "id": [f"gid://shopify/LineItem/{9_000_000 + i}" for i in range(n_items)],
+            "__parentId": order_ids[parent_index],
+            "quantity": quantity,
+            "discountedUnitPriceSet.shopMoney.amount": discounted_price,
+            "originalUnitPriceSet.shopMoney.amount": original_price,
+            "variant.title": variant_titles,
+            "variant.product.id": catalog["product_id"].to_numpy()[product_index],
+            "variant.product.title": catalog["title"].to_numpy()[product_index],
+            "variant.product.productType": catalog["product_type"].to_numpy()[product_index],
+            "variant.product.vendor": catalog["vendor"].to_numpy()[product_index],
+        }
+    )
+
+    unit_price = np.where(discounted_price > 0, discounted_price, original_price)
+    line_total = np.bincount(parent_index, weights=unit_price * quantity, minlength=n_orders)
+    list_total = np.bincount(parent_index, weights=original_price * quantity, minlength=n_orders)
+    shipping = np.where(rng.random(n_orders) < 0.15, 12_000.0, 0.0)
+
+    orders = pd.DataFrame(
+        {
+            "id": order_ids,
+            "createdAt": created_at,
+            "updatedAt": updated_at,
+            "customer.id": customers,
+            "totalPriceSet.shopMoney.amount": line_total + shipping,
+            "subtotalPriceSet.shopMoney.amount": line_total,
+            "totalDiscountsSet.shopMoney.amount": list_total - line_total,
+            "totalShippingPriceSet.shopMoney.amount": shipping,
+            "totalTaxSet.shopMoney.amount": 0.0,
+        }
+    )
+    return orders, items
+
+
+def write_bulk_csvs(directory: Path, orders: pd.DataFrame, items: pd.DataFrame) -> tuple[Path, Path]:
+    from analyze_bulk_data import LINE_ITEMS_FILENAME, ORDERS_FILENAME
+
+    directory.mkdir(parents=True, exist_ok=True)
+    orders_path = directory / ORDERS_FILENAME
+    items_path = directory / LINE_ITEMS_FILENAME
+    orders.to_csv(orders_path, index=False)
+    items.to_csv(items_path, index=False)
+    return orders_path, items_path
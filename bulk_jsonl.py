@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Stream a Shopify bulk-operation JSONL export (bulk_definitivo.json) into the pipeline's datasets."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from analyze_bulk_data import DATA_DIR, LINE_ITEM_COLUMNS, LINE_ITEMS_FILENAME, ORDER_COLUMNS, ORDERS_FILENAME
+from bulk_parquet import (
+    LINE_ITEMS_DATASET,
+    LINE_ITEMS_SCHEMA,
+    ORDERS_DATASET,
+    ORDERS_SCHEMA,
+    PARQUET_DIR,
+    PARTITION_COLUMN,
+    cast_frame,
+    write_partitioned,
+)
+
+
+BULK_FILENAME = "bulk_definitivo.json"
+ORDER_GID_PREFIX = "gid://shopify/Order/"
+LINE_ITEM_GID_PREFIX = "gid://shopify/LineItem/"
+
+
+def flatten_record(record: dict, prefix: str = "") -> dict:
+    """Flatten nested objects into dotted keys, e.g. ``totalPriceSet.shopMoney.amount``."""
+    flat = {}
+    for key, value in record.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+def iter_bulk_records(path: Path):
+    """Yield ("order" | "line_item", flattened record) pairs, one JSONL line at a time.
+
+    Shopify writes every child right after its parent and links it through
+    ``__parentId``; records of other connection types are skipped.
+    """
+    with path.open("r", encoding="utf-8") as handle:
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record_id = record.get("id") or ""
+            if "__parentId" not in record and record_id.startswith(ORDER_GID_PREFIX):
+                yield "order", flatten_record(record)
+            elif record.get("__parentId", "").startswith(ORDER_GID_PREFIX) and record_id.startswith(
+                LINE_ITEM_GID_PREFIX
+            ):
+                yield "line_item", flatten_record(record)
+
+
+def _utc_month(created_at: str | None) -> str:
+    if not created_at:
+        return "unknown"
+    if created_at.endswith("Z"):
+        return created_at[:7]
+    return pd.Timestamp(created_at).tz_convert("UTC").strftime("%Y-%m")
+
+
+class _BatchWriter:
+    def __init__(self, columns: list[str], flush: callable, batch_size: int) -> None:
+        self.columns = columns
+        self.flush_batch = flush
+        self.batch_size = batch_size
+        self.rows: list[dict] = []
+        self.offset = 0
+
+    def append(self, row: dict) -> None:
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.rows:
+            return
+        index = pd.RangeIndex(self.offset, self.offset + len(self.rows))
+        frame = pd.DataFrame.from_records(self.rows, columns=self.columns, index=index)
+        self.flush_batch(frame)
+        self.offset += len(self.rows)
+        self.rows = []
+
+
+def convert_bulk_jsonl(
+    source: Path,
+    output_dir: Path,
+    output_format: str = "parquet",
+    batch_size: int = 100_000,
+) -> dict[str, int]:
+    """Convert the JSONL export in a single pass, holding at most one batch per table in memory."""
+    # Line items are partitioned by the month of their parent order, which always
+    # precedes them in a bulk export.
+    order_months: dict[str, str] = {}
+
+    if output_format == "parquet":
+        orders_root = output_dir / ORDERS_DATASET
+        items_root = output_dir / LINE_ITEMS_DATASET
+        for root in (orders_root, items_root):
+            if root.exists():
+                shutil.rmtree(root)
+
+        def flush_orders(frame: pd.DataFrame) -> None:
+            typed = cast_frame(frame, ORDERS_SCHEMA)
+            typed[PARTITION_COLUMN] = typed["createdAt"].dt.strftime("%Y-%m").fillna("unknown")
+            write_partitioned(typed, ORDERS_SCHEMA, orders_root)
+
+        def flush_items(frame: pd.DataFrame) -> None:
+            typed = cast_frame(frame, LINE_ITEMS_SCHEMA)
+            typed[PARTITION_COLUMN] = typed["__parentId"].map(order_months).fillna("unknown")
+            write_partitioned(typed, LINE_ITEMS_SCHEMA, items_root)
+
+    else:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        orders_path = output_dir / ORDERS_FILENAME
+        items_path = output_dir / LINE_ITEMS_FILENAME
+        for path in (orders_path, items_path):
+            path.unlink(missing_ok=True)
+
+        def append_csv(path: Path):
+            def flush(frame: pd.DataFrame) -> None:
+                frame.to_csv(path, mode="a", header=not path.exists(), index=False)
+
+            return flush
+
+        flush_orders = append_csv(orders_path)
+        flush_items = append_csv(items_path)
+
+    orders = _BatchWriter(ORDER_COLUMNS, flush_orders, batch_size)
+    items = _BatchWriter(LINE_ITEM_COLUMNS, flush_items, batch_size)
+    for kind, record in iter_bulk_records(source):
+        if kind == "order":
+            if output_format == "parquet":
+                order_months[record["id"]] = _utc_month(record.get("createdAt"))
+            orders.append(record)
+        else:
+            items.append(record)
+    orders.flush()
+    items.flush()
+    return {"orders": orders.offset, "line_items": items.offset}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", type=Path, nargs="?", default=DATA_DIR / BULK_FILENAME, help="Bulk JSONL export.")
+    parser.add_argument("--format", choices=("parquet", "csv"), default="parquet", help="Output layout.")
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=None,
+        help=f"Destination directory (default: {PARQUET_DIR} for parquet, {DATA_DIR} for csv).",
+    )
+    parser.add_argument("--batch-size", type=int, default=100_000, help="Records buffered per table before writing.")
+    args = parser.parse_args()
+
+    output_dir = args.output_dir or (PARQUET_DIR if args.format == "parquet" else DATA_DIR)
+    counts = convert_bulk_jsonl(args.source, output_dir, args.format, args.batch_size)
+    print(f"Wrote {counts['orders']:,} orders and {counts['line_items']:,} line items to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
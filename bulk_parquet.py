@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Convert the Shopify bulk CSV exports into typed, month-partitioned Parquet datasets."""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from analyze_bulk_data import DATA_DIR, LINE_ITEMS_FILENAME, ORDERS_FILENAME
+
+
+PARQUET_DIR = DATA_DIR / "parquet"
+ORDERS_DATASET = "orders"
+LINE_ITEMS_DATASET = "line_items"
+PARTITION_COLUMN = "created_month"
+
+MONEY = pa.float64()
+TIMESTAMP = pa.timestamp("us", tz="UTC")
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+ORDERS_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("createdAt", TIMESTAMP),
+        ("updatedAt", TIMESTAMP),
+        ("customer.id", pa.string()),
+        ("totalPriceSet.shopMoney.amount", MONEY),
+        ("subtotalPriceSet.shopMoney.amount", MONEY),
+        ("totalDiscountsSet.shopMoney.amount", MONEY),
+        ("totalShippingPriceSet.shopMoney.amount", MONEY),
+        ("totalTaxSet.shopMoney.amount", MONEY),
+    ]
+)
+LINE_ITEMS_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("__parentId", pa.string()),
+        ("quantity", pa.int32()),
+        ("discountedUnitPriceSet.shopMoney.amount", MONEY),
+        ("originalUnitPriceSet.shopMoney.amount", MONEY),
+        ("variant.title", pa.string()),
+        ("variant.product.id", pa.string()),
+        ("variant.product.title", pa.string()),
+        ("variant.product.productType", CATEGORY),
+        ("variant.product.vendor", CATEGORY),
+    ]
+)
+
+
+def cast_frame(frame: pd.DataFrame, schema: pa.Schema) -> pd.DataFrame:
+    typed = {}
+    for column in schema:
+        values = frame[column.name] if column.name in frame.columns else pd.Series(None, index=frame.index)
+        if pa.types.is_timestamp(column.type):
+            typed[column.name] = pd.to_datetime(values, utc=True, errors="coerce")
+        elif pa.types.is_floating(column.type):
+            typed[column.name] = pd.to_numeric(values, errors="coerce").astype("float64")
+        elif pa.types.is_integer(column.type):
+            typed[column.name] = pd.to_numeric(values, errors="coerce").fillna(0).astype("int32")
+        elif pa.types.is_dictionary(column.type):
+            typed[column.name] = values.astype("category")
+        else:
+            typed[column.name] = values.astype(object).where(values.notna(), None)
+    return pd.DataFrame(typed, index=frame.index)
+
+
+def write_partitioned(frame: pd.DataFrame, schema: pa.Schema, root: Path) -> None:
+    partitioned_schema = schema.append(pa.field(PARTITION_COLUMN, pa.string()))
+    table = pa.Table.from_pandas(frame, schema=partitioned_schema, preserve_index=False)
+    pq.write_to_dataset(
+        table,
+        root_path=root,
+        partition_cols=[PARTITION_COLUMN],
+        # Zero-padded so the files of a partition sort, and are scanned, in the order of the CSV rows.
+        basename_template=f"part-{frame.index[0]:012d}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def convert_bulk_csvs(data_dir: Path = DATA_DIR, parquet_dir: Path = PARQUET_DIR, chunksize: int = 250_000) -> None:
+    """One-time conversion of both bulk CSVs, reading them in chunks to bound memory."""
+    orders_root = parquet_dir / ORDERS_DATASET
+    items_root = parquet_dir / LINE_ITEMS_DATASET
+    for root in (orders_root, items_root):
+        if root.exists():
+            shutil.rmtree(root)
+
+    read_options = {"keep_default_na": False, "na_values": ["", "null", None], "chunksize": chunksize}
+
+    # Line items carry no timestamp, so they are partitioned by the month of their parent order.
+    order_months: dict[str, str] = {}
+    for chunk in pd.read_csv(data_dir / ORDERS_FILENAME, **read_options):
+        typed = cast_frame(chunk, ORDERS_SCHEMA)
+        typed[PARTITION_COLUMN] = typed["createdAt"].dt.strftime("%Y-%m").fillna("unknown")
+        order_months.update(zip(typed["id"], typed[PARTITION_COLUMN]))
+        write_partitioned(typed, ORDERS_SCHEMA, orders_root)
+
+    for chunk in pd.read_csv(data_dir / LINE_ITEMS_FILENAME, **read_options):
+        typed = cast_frame(chunk, LINE_ITEMS_SCHEMA)
+        typed[PARTITION_COLUMN] = typed["__parentId"].map(order_months).fillna("unknown")
+        write_partitioned(typed, LINE_ITEMS_SCHEMA, items_root)
+
+
+def _month_filter(since: pd.Timestamp | None) -> list[tuple]:
+    if since is None:
+        return []
+    return [(PARTITION_COLUMN, ">=", since.strftime("%Y-%m"))]
+
+
+def read_orders(
+    parquet_dir: Path = PARQUET_DIR,
+    columns: list[str] | None = None,
+    since: pd.Timestamp | None = None,
+) -> pd.DataFrame:
+    filters = _month_filter(since)
+    if since is not None:
+        filters.append(("createdAt", ">=", since))
+    orders = pd.read_parquet(parquet_dir / ORDERS_DATASET, columns=columns, filters=filters or None)
+    return orders.drop(columns=[PARTITION_COLUMN], errors="ignore")
+
+
+def read_line_items(
+    parquet_dir: Path = PARQUET_DIR,
+    columns: list[str] | None = None,
+    since: pd.Timestamp | None = None,
+    order_ids: pd.Series | None = None,
+) -> pd.DataFrame:
+    items = pd.read_parquet(parquet_dir / LINE_ITEMS_DATASET, columns=columns, filters=_month_filter(since) or None)
+    if order_ids is not None:
+        items = items.loc[items["__parentId"].isin(order_ids)].reset_index(drop=True)
+    return items.drop(columns=[PARTITION_COLUMN], errors="ignore")
+
+
+def iter_line_item_batches(
+    parquet_dir: Path = PARQUET_DIR,
+    columns: list[str] | None = None,
+    batch_size: int = 200_000,
+    since: pd.Timestamp | None = None,
+):
+    dataset = ds.dataset(parquet_dir / LINE_ITEMS_DATASET, format="parquet", partitioning="hive")
+    month_filter = None
+    if since is not None:
+        month_filter = ds.field(PARTITION_COLUMN) >= since.strftime("%Y-%m")
+    for batch in dataset.to_batches(columns=columns, filter=month_filter, batch_size=batch_size):
+        yield batch.to_pandas()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR, help="Directory with the bulk CSV exports.")
+    parser.add_argument("--output-dir", type=Path, default=PARQUET_DIR, help="Destination of the Parquet datasets.")
+    parser.add_argument("--chunksize", type=int, default=250_000, help="CSV rows converted per batch.")
+    args = parser.parse_args()
+
+    convert_bulk_csvs(args.data_dir, args.output_dir, args.chunksize)
+    print(f"Parquet datasets written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
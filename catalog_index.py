@@ -0,0 +1,233 @@
+"""Multi-pattern index of catalog product names, brands and classification keywords.
+
+An Aho-Corasick automaton over every pattern finds all of them in one
+left-to-right pass, so scanning a response costs O(length + matches) however
+large the catalog is. Patterns are matched on ``normalize_text`` output
+(accent-folded, lower case); product and brand names must sit on word
+boundaries. Classification keywords of ``KEYWORD_PREFIX_LENGTH`` characters or
+more only need to start a word ("hipercal" in "hipercalórica"); shorter ones
+must be whole words, so "cla" does not fire on "claro".
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterable
+
+import pandas as pd
+
+
+HERO_REVENUE_SHARE = 0.8  # hero products: the top sellers that make up this share of revenue
+MIN_ALIAS_WORDS = 2
+MIN_VENDOR_LENGTH = 3
+KEYWORD_PREFIX_LENGTH = 6
+COMBO_CATEGORY = "Combos y Packs"
+COMBO_DEFAULT_SUBCATEGORY = "Pack de Ahorro"
+DEFAULT_CATEGORY = "Otros"
+
+_COMBINING_MARKS = re.compile("[\u0300-\u036f]")
+_SEPARATORS = re.compile(r"[^\w%+]+")
+
+
+def normalize_text(text: str) -> str:
+    """Accent-folded, lower-case text with punctuation runs collapsed to single spaces."""
+    folded = _COMBINING_MARKS.sub("", unicodedata.normalize("NFKD", text)).lower()
+    return _SEPARATORS.sub(" ", folded).strip()
+
+
+class Automaton:
+    """Aho-Corasick automaton returning every (start, pattern) occurrence in a text."""
+
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self.patterns = list(patterns)
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail = [0]
+        self._outputs: list[tuple[int, ...]] = [()]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                child = self._goto[state].get(char)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append(())
+                    self._goto[state][char] = child
+                state = child
+            self._outputs[state] += (index,)
+
+        # Breadth-first, so a state's failure link is final before its children need it.
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._outputs[child] += self._outputs[self._fail[child]]
+
+    def find(self, text: str) -> list[tuple[int, int]]:
+        """(start, pattern index) of every occurrence, in order of their end position."""
+        goto, fail, outputs, patterns = self._goto, self._fail, self._outputs, self.patterns
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in outputs[state]:
+                matches.append((position - len(patterns[index]) + 1, index))
+        return matches
+
+
+class KeywordClassifier:
+    """``analyze_bulk_data.classify_product`` rules evaluated from one automaton pass per text.
+
+    Keywords are matched as raw substrings of the lower-cased haystack, exactly
+    like the rules' ``keyword in haystack`` checks.
+    """
+
+    def __init__(
+        self,
+        rules: list[tuple[str, str, tuple[str, ...]]],
+        combo_keywords: tuple[str, ...],
+        combo_rules: list[tuple[str, tuple[str, ...]]],
+    ) -> None:
+        keywords = {keyword for _, _, words in rules for keyword in words}
+        keywords.update(combo_keywords)
+        keywords.update(keyword for _, words in combo_rules for keyword in words)
+        self._automaton = Automaton(sorted(keywords))
+        position = {keyword: index for index, keyword in enumerate(self._automaton.patterns)}
+        self._combo = frozenset(position[keyword] for keyword in combo_keywords)
+        self._combo_rules = [
+            (subcategory, frozenset(position[keyword] for keyword in words)) for subcategory, words in combo_rules
+        ]
+        self._rules = [
+            (category, subcategory, frozenset(position[keyword] for keyword in words))
+            for category, subcategory, words in rules
+        ]
+
+    def classify(self, haystack: str) -> tuple[str, str | None]:
+        """(category, subcategory); the subcategory is None when no rule matched."""
+        found = {index for _, index in self._automaton.find(haystack)}
+        if found & self._combo:
+            for subcategory, keywords in self._combo_rules:
+                if found & keywords:
+                    return COMBO_CATEGORY, subcategory
+            return COMBO_CATEGORY, COMBO_DEFAULT_SUBCATEGORY
+        for category, subcategory, keywords in self._rules:
+            if found & keywords:
+                return category, subcategory
+        return DEFAULT_CATEGORY, None
+
+
+@dataclass
+class Mentions:
+    product_ids: list[str] = field(default_factory=list)
+    titles: list[str] = field(default_factory=list)
+    vendors: list[str] = field(default_factory=list)
+    categories: list[str] = field(default_factory=list)
+    hero_products: int = 0
+
+
+@dataclass
+class CatalogIndex:
+    products: pd.DataFrame
+    automaton: Automaton
+    targets: list[tuple[str, object]]
+
+    def __post_init__(self) -> None:
+        self._rows = list(self.products[["product_id", "title", "category", "hero"]].itertuples(index=False))
+
+    @classmethod
+    def build(
+        cls,
+        catalog: pd.DataFrame,
+        rules: list[tuple[str, str, tuple[str, ...]]],
+        hero_share: float = HERO_REVENUE_SHARE,
+    ) -> CatalogIndex:
+        """Index ``products_aggregated.csv`` rows and the keywords of ``rules``.
+
+        Variants sharing a title collapse into one product, identified by the
+        best-selling ``product_id``; hero products are the best sellers whose
+        cumulative revenue share reaches ``hero_share``.
+        """
+        ranked = catalog.dropna(subset=["title"]).sort_values("total_revenue", ascending=False)
+        products = ranked.groupby("title", sort=False).agg(
+            product_id=("product_id", "first"),
+            vendor=("vendor", "first"),
+            category=("category", "first"),
+            subcategory=("subcategory", "first"),
+            revenue_share=("revenue_share", "sum"),
+        )
+        products = products.sort_values("revenue_share", ascending=False).reset_index()
+        products["hero"] = (products["revenue_share"].cumsum() - products["revenue_share"]) < hero_share
+
+        vendor_names = sorted(
+            {normalize_text(vendor) for vendor in catalog["vendor"].dropna()} - {""}, key=len, reverse=True
+        )
+        patterns: dict[str, tuple[str, object]] = {}
+        for row, title in enumerate(products["title"]):
+            name = normalize_text(title)
+            # "Gold Standard 100% Whey Optimum Nutrition" is usually written without its brand.
+            aliases = [name] + [name[: -len(vendor)].strip() for vendor in vendor_names if name.endswith(" " + vendor)]
+            for alias in aliases:
+                if len(alias.split()) >= MIN_ALIAS_WORDS:
+                    patterns.setdefault(alias, ("product", row))
+        for vendor in vendor_names:
+            if len(vendor) >= MIN_VENDOR_LENGTH:
+                patterns.setdefault(vendor, ("vendor", vendor))
+        for category, _, keywords in rules:
+            for keyword in keywords:
+                patterns.setdefault(normalize_text(keyword), ("keyword", category))
+
+        return cls(products, Automaton(patterns), list(patterns.values()))
+
+    def scan(self, text: str) -> Mentions:
+        """Products, brands and categories named in ``text``; overlapping product names keep the longest."""
+        text = normalize_text(text)
+        spans = []
+        mentions = Mentions()
+        for start, index in self.automaton.find(text):
+            length = len(self.automaton.patterns[index])
+            if start > 0 and text[start - 1] != " ":
+                continue
+            kind, target = self.targets[index]
+            whole_word = start + length == len(text) or text[start + length] == " "
+            if kind == "keyword":
+                if (whole_word or length >= KEYWORD_PREFIX_LENGTH) and target not in mentions.categories:
+                    mentions.categories.append(target)
+            elif whole_word:
+                spans.append((start, -(start + length), kind, target))
+
+        covered = -1
+        for start, negative_end, kind, target in sorted(spans, key=lambda span: span[:2]):
+            if start < covered:
+                continue
+            covered = -negative_end
+            if kind == "vendor":
+                if target not in mentions.vendors:
+                    mentions.vendors.append(target)
+                continue
+            product_id, title, category, hero = self._rows[target]
+            if product_id in mentions.product_ids:
+                continue
+            mentions.product_ids.append(product_id)
+            mentions.titles.append(title)
+            mentions.hero_products += bool(hero)
+            if category not in mentions.categories:
+                mentions.categories.append(category)
+        return mentions
+
+    def scan_many(self, texts: Iterable[str]) -> pd.DataFrame:
+        return pd.DataFrame([vars(self.scan(text)) for text in texts], columns=list(vars(Mentions())))
+
+    def hero_coverage(self, mentioned_product_ids: Iterable[str]) -> float:
+        """Share of hero products named at least once."""
+        heroes = set(self.products.loc[self.products["hero"], "product_id"])
+        return len(heroes & set(mentioned_product_ids)) / len(heroes) if heroes else 0.0
@@ -0,0 +1,75 @@
+"""Point-budgeted chart data for the dashboard: projection and downsampling before data reaches the browser."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+# Above this many marks per series the browser pays for points it cannot draw apart.
+POINT_BUDGET = 400
+
+
+def _as_numeric(values: pd.Series) -> np.ndarray:
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy("datetime64[ns]").astype(np.int64).astype(float)
+    return values.to_numpy(dtype=float)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Positions kept by Largest-Triangle-Three-Buckets; first and last points are always kept."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        # The next bucket is summarised by its centroid; the last bucket looks at the final point.
+        next_start, next_stop = stop, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous])
+            - (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax_indices(y: np.ndarray, buckets: int) -> np.ndarray:
+    """Positions of the minimum and maximum of each bucket, which keeps spikes that LTTB may smooth out."""
+    n = len(y)
+    if 2 * buckets >= n:
+        return np.arange(n)
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    picks = [0, n - 1]
+    for start, stop in zip(edges[:-1], edges[1:]):
+        window = y[start:stop]
+        picks.extend((start + int(np.argmin(window)), start + int(np.argmax(window))))
+    return np.unique(picks)
+
+
+def downsample(
+    frame: pd.DataFrame,
+    x: str,
+    y: str,
+    max_points: int = POINT_BUDGET,
+    method: str = "lttb",
+) -> pd.DataFrame:
+    """Return at most ``max_points`` rows of ``frame`` (sorted by ``x``) that preserve the shape of ``y``."""
+    if len(frame) <= max_points:
+        return frame
+    values = frame[y].to_numpy(dtype=float)
+    if method == "lttb":
+        positions = lttb_indices(_as_numeric(frame[x]), values, max_points)
+    elif method == "minmax":
+        positions = minmax_indices(values, max(1, (max_points - 2) // 2))
+    else:
+        raise ValueError(f"Unknown downsampling method {method!r}")
+    return frame.iloc[positions]
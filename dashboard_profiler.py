@@ -0,0 +1,183 @@
+"""Opt-in render instrumentation for the Streamlit dashboard (DASHBOARD_PROFILE=1 or ?profile=1)."""
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+
+PROFILE_ENV_VAR = "DASHBOARD_PROFILE"
+PROFILE_QUERY_PARAM = "profile"
+PROFILE_LOG_ENV_VAR = "DASHBOARD_PROFILE_LOG"
+RELEASE_ENV_VAR = "DASHBOARD_RELEASE"
+DEFAULT_LOG_PATH = Path(__file__).resolve().parent / "analysis_outputs" / "dashboard_profile.jsonl"
+
+# Cached functions run in the thread of the session that missed the cache, so
+# the active profiler is tracked per script thread.
+_active = threading.local()
+
+
+@dataclass
+class SectionTiming:
+    name: str
+    seconds: float
+
+
+@dataclass
+class CacheStats:
+    calls: int = 0
+    misses: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class Payload:
+    name: str
+    rows: int
+    columns: int
+    arrow_bytes: int
+
+
+@dataclass
+class RenderProfiler:
+    enabled: bool = False
+    sections: list[SectionTiming] = field(default_factory=list)
+    caches: dict[str, CacheStats] = field(default_factory=dict)
+    payloads: list[Payload] = field(default_factory=list)
+    _origin: float = field(default_factory=time.perf_counter)
+    _current: tuple[str, float] | None = None
+
+    def begin(self, name: str) -> None:
+        """Close the running section, if any, and start timing ``name``."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self._close(now)
+        self._current = (name, now)
+
+    def _close(self, now: float) -> None:
+        if self._current is not None:
+            name, started = self._current
+            self.sections.append(SectionTiming(name, now - started))
+            self._current = None
+
+    def record_call(self, name: str, seconds: float) -> None:
+        stats = self.caches.setdefault(name, CacheStats())
+        stats.calls += 1
+        stats.seconds += seconds
+
+    def record_miss(self, name: str) -> None:
+        self.caches.setdefault(name, CacheStats()).misses += 1
+
+    def payload(self, name: str, frame: pd.DataFrame) -> None:
+        """Record the size of a DataFrame handed to an element, measured as the Arrow table Streamlit ships."""
+        if not self.enabled:
+            return
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        self.payloads.append(Payload(name, frame.shape[0], frame.shape[1], table.nbytes))
+
+    def finish(self, log_path: Path | None = None) -> None:
+        """Close the last section, render the collapsible panel and append the run to the JSONL log."""
+        if not self.enabled:
+            return
+        self._close(time.perf_counter())
+        total = time.perf_counter() - self._origin
+        self.render(total)
+        append_log(self.to_record(total), log_path or Path(os.environ.get(PROFILE_LOG_ENV_VAR, DEFAULT_LOG_PATH)))
+
+    def to_record(self, total_seconds: float) -> dict[str, Any]:
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "release": os.environ.get(RELEASE_ENV_VAR),
+            "total_seconds": round(total_seconds, 6),
+            "sections": [asdict(section) for section in self.sections],
+            "caches": {name: asdict(stats) for name, stats in self.caches.items()},
+            "payloads": [asdict(payload) for payload in self.payloads],
+        }
+
+    def render(self, total_seconds: float) -> None:
+        with st.expander(f"Rendimiento del render · {total_seconds * 1000:.0f} ms", expanded=False):
+            sections = pd.DataFrame([asdict(section) for section in self.sections])
+            if not sections.empty:
+                sections["ms"] = sections.pop("seconds") * 1000
+                st.markdown("**Secciones**")
+                st.dataframe(sections, hide_index=True, use_container_width=True)
+            if self.caches:
+                caches = pd.DataFrame.from_dict({name: asdict(stats) for name, stats in self.caches.items()}, "index")
+                caches["hits"] = caches["calls"] - caches["misses"]
+                caches["ms"] = caches.pop("seconds") * 1000
+                st.markdown("**Cachés**")
+                st.dataframe(caches.rename_axis("función").reset_index(), hide_index=True, use_container_width=True)
+            if self.payloads:
+                payloads = pd.DataFrame([asdict(payload) for payload in self.payloads])
+                payloads["kb"] = payloads.pop("arrow_bytes") / 1024
+                st.markdown("**Datos enviados al navegador**")
+                st.dataframe(payloads, hide_index=True, use_container_width=True)
+
+
+def profiling_requested() -> bool:
+    return os.environ.get(PROFILE_ENV_VAR) == "1" or st.query_params.get(PROFILE_QUERY_PARAM) == "1"
+
+
+def start_profiler() -> RenderProfiler:
+    """Create the profiler for the current rerun and make it visible to cached functions."""
+    profiler = RenderProfiler(enabled=profiling_requested())
+    _active.profiler = profiler
+    return profiler
+
+
+def _current() -> RenderProfiler | None:
+    profiler = getattr(_active, "profiler", None)
+    return profiler if profiler is not None and profiler.enabled else None
+
+
+def profiled_cache(cache_decorator: Callable[[Callable], Callable]) -> Callable[[Callable], Callable]:
+    """Apply a Streamlit cache decorator and count calls and misses of the cached function.
+
+    The function body only runs on a cache miss, so a miss is counted from
+    inside it while every call is counted (and timed) around the cache lookup.
+    """
+
+    def decorate(func: Callable) -> Callable:
+        name = func.__name__
+
+        @functools.wraps(func)
+        def on_miss(*args, **kwargs):
+            profiler = _current()
+            if profiler is not None:
+                profiler.record_miss(name)
+            return func(*args, **kwargs)
+
+        cached = cache_decorator(on_miss)
+
+        @functools.wraps(func)
+        def call(*args, **kwargs):
+            profiler = _current()
+            if profiler is None:
+                return cached(*args, **kwargs)
+            started = time.perf_counter()
+            value = cached(*args, **kwargs)
+            profiler.record_call(name, time.perf_counter() - started)
+            return value
+
+        call.clear = cached.clear
+        return call
+
+    return decorate
+
+
+def append_log(record: dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as handle:
+        handle.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -0,0 +1,192 @@
+"""Batched weekday-seasonal demand forecasts for many daily series at once.
+
+Every series is a row of a (series x days) matrix. Holt-Winters smoothing with
+a damped trend and a 7-day season is run for all series and a small grid of
+smoothing parameters in the same vectorised recursion (the only Python loop
+is over days), and each series keeps the parameters with the lowest one-step
+error. A weekday baseline (mean of the same weekday over the last weeks) is
+backtested alongside, and the better of the two is used per series.
+"""
+
+from __future__ import annotations
+
+import itertools
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+SEASON = 7
+HORIZON = 28
+BASELINE_WEEKS = 4
+DAMPING = 0.9
+MIN_HISTORY_DAYS = 2 * SEASON
+INTERVAL_Z = 1.2816  # two-sided 80% normal interval
+PARAMETER_GRID = np.array(
+    list(itertools.product((0.05, 0.1, 0.2, 0.35, 0.5), (0.0, 0.05), (0.05, 0.15, 0.3))),
+    dtype=float,
+)
+
+
+def holt_winters(y: np.ndarray, horizon: int = HORIZON) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fit every row of ``y`` and return (forecasts [S, horizon], residual std [S], parameters [S, 3])."""
+    n_series, n_days = y.shape
+    n_grid = len(PARAMETER_GRID)
+    values = np.repeat(y, n_grid, axis=0)
+    alpha, beta, gamma = (np.tile(PARAMETER_GRID[:, column], n_series) for column in range(3))
+
+    level = values[:, :SEASON].mean(axis=1)
+    trend = np.zeros(len(values))
+    season = values[:, :SEASON] - level[:, None]
+    sse = np.zeros(len(values))
+    for day in range(SEASON, n_days):
+        slot = day % SEASON
+        observed = values[:, day]
+        error = observed - (level + DAMPING * trend + season[:, slot])
+        sse += error * error
+        new_level = alpha * (observed - season[:, slot]) + (1 - alpha) * (level + DAMPING * trend)
+        trend = beta * (new_level - level) + (1 - beta) * DAMPING * trend
+        season[:, slot] = gamma * (observed - new_level) + (1 - gamma) * season[:, slot]
+        level = new_level
+
+    best = sse.reshape(n_series, n_grid).argmin(axis=1) + np.arange(n_series) * n_grid
+    steps = np.arange(1, horizon + 1)
+    damped_steps = np.cumsum(DAMPING**steps)
+    slots = (n_days + steps - 1) % SEASON
+    forecast = level[best, None] + damped_steps[None, :] * trend[best, None] + season[best][:, slots]
+    sigma = np.sqrt(sse[best] / max(1, n_days - SEASON))
+    return np.clip(forecast, 0, None), sigma, PARAMETER_GRID[best % n_grid]
+
+
+def weekday_baseline(y: np.ndarray, horizon: int = HORIZON) -> np.ndarray:
+    """Mean of the same weekday over the last ``BASELINE_WEEKS`` weeks."""
+    n_days = y.shape[1]
+    window = y[:, -min(n_days, BASELINE_WEEKS * SEASON) :]
+    first_slot = (n_days - window.shape[1]) % SEASON
+    slot_of_day = (first_slot + np.arange(window.shape[1])) % SEASON
+    by_slot = np.stack([window[:, slot_of_day == slot].mean(axis=1) for slot in range(SEASON)], axis=1)
+    return by_slot[:, (n_days + np.arange(horizon)) % SEASON]
+
+
+def baseline_sigma(y: np.ndarray) -> np.ndarray:
+    """Residual std of the weekday baseline, replayed over the history one day at a time."""
+    n_series, n_days = y.shape
+    totals = np.zeros((n_series, n_days - SEASON))
+    counts = np.zeros(n_days - SEASON)
+    for weeks in range(1, BASELINE_WEEKS + 1):
+        lag = weeks * SEASON
+        if lag >= n_days:
+            break
+        # Day d (from SEASON on) is predicted from the same weekday up to BASELINE_WEEKS weeks earlier.
+        totals[:, lag - SEASON :] += y[:, : n_days - lag]
+        counts[lag - SEASON :] += 1
+    errors = y[:, SEASON:] - totals / counts
+    return np.sqrt((errors * errors).mean(axis=1))
+
+
+def _wape(actual: np.ndarray, predicted: np.ndarray) -> np.ndarray:
+    total = actual.sum(axis=1)
+    errors = np.abs(actual - predicted).sum(axis=1)
+    return np.divide(errors, total, out=np.full(len(total), np.nan), where=total > 0)
+
+
+def _fit_block(y: np.ndarray, horizon: int) -> dict[str, np.ndarray]:
+    n_series, n_days = y.shape
+    backtest = n_days >= MIN_HISTORY_DAYS + horizon
+    if backtest:
+        history, actual = y[:, :-horizon], y[:, -horizon:]
+        model_wape = _wape(actual, holt_winters(history, horizon)[0])
+        baseline_wape = _wape(actual, weekday_baseline(history, horizon))
+    else:
+        model_wape = baseline_wape = np.full(n_series, np.nan)
+
+    forecast, sigma, parameters = holt_winters(y, horizon)
+    baseline = weekday_baseline(y, horizon)
+    use_baseline = baseline_wape < model_wape
+    return {
+        "forecast": np.where(use_baseline[:, None], baseline, forecast),
+        "sigma": sigma,
+        "baseline_sigma": baseline_sigma(y),
+        "parameters": parameters,
+        "model_wape": model_wape,
+        "baseline_wape": baseline_wape,
+        "use_baseline": use_baseline,
+    }
+
+
+def forecast_matrix(y: np.ndarray, horizon: int = HORIZON, workers: int = 1) -> dict[str, np.ndarray]:
+    """Fit all rows of ``y``; with ``workers`` > 1 row blocks are fitted in separate processes."""
+    if y.shape[1] < MIN_HISTORY_DAYS:
+        raise ValueError(f"At least {MIN_HISTORY_DAYS} days of history are needed to forecast, got {y.shape[1]}")
+    blocks = max(1, min(workers, math.ceil(len(y) / 64)))
+    if blocks == 1:
+        return _fit_block(y, horizon)
+    parts = np.array_split(y, blocks)
+    # The pipeline calls this from a stage thread; forking a threaded process can deadlock the child.
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ProcessPoolExecutor(max_workers=blocks, mp_context=multiprocessing.get_context(start_method)) as executor:
+        results = list(executor.map(_fit_block, parts, [horizon] * blocks))
+    return {key: np.concatenate([result[key] for result in results]) for key in results[0]}
+
+
+def series_matrix(frame: pd.DataFrame, key: str, value: str = "units") -> tuple[np.ndarray, pd.Index, pd.DatetimeIndex]:
+    """Scatter long (date, key, value) rows into a dense (series x days) matrix with zeros on missing days."""
+    frame = frame.dropna(subset=[key])
+    dates = pd.to_datetime(frame["date"])
+    start = dates.min()
+    calendar = pd.date_range(start, dates.max(), freq="D")
+    day = ((dates - start) // pd.Timedelta(days=1)).to_numpy()
+    codes, keys = pd.factorize(frame[key])
+    matrix = np.zeros((len(keys), len(calendar)))
+    np.add.at(matrix, (codes, day), frame[value].to_numpy(dtype=float))
+    return matrix, pd.Index(keys, name=key), calendar
+
+
+def forecast_series(
+    frame: pd.DataFrame,
+    key: str,
+    labels: pd.Series | None = None,
+    horizon: int = HORIZON,
+    workers: int = 1,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Forecast every ``key`` series of a long daily frame; returns (forecast rows, backtest rows)."""
+    matrix, keys, calendar = series_matrix(frame, key)
+    fitted = forecast_matrix(matrix, horizon, workers)
+
+    # One-step residual spread widened with the horizon as for simple exponential smoothing. The
+    # weekday baseline does not update within the horizon, so its own residual spread stays flat.
+    steps = np.arange(1, horizon + 1)
+    alpha = fitted["parameters"][:, :1]
+    model_spread = fitted["sigma"][:, None] * np.sqrt(1 + (steps[None, :] - 1) * alpha**2)
+    spread = INTERVAL_Z * np.where(fitted["use_baseline"][:, None], fitted["baseline_sigma"][:, None], model_spread)
+    label_values = labels.reindex(keys).to_numpy() if labels is not None else keys.to_numpy()
+    model = np.where(fitted["use_baseline"], "weekday_baseline", "holt_winters")
+
+    forecast = pd.DataFrame(
+        {
+            "series_id": np.repeat(keys.to_numpy(), horizon),
+            "label": np.repeat(label_values, horizon),
+            "date": np.tile(calendar[-1] + pd.to_timedelta(steps, unit="D"), len(keys)),
+            "forecast": fitted["forecast"].ravel(),
+            "lower": np.clip(fitted["forecast"] - spread, 0, None).ravel(),
+            "upper": (fitted["forecast"] + spread).ravel(),
+            "model": np.repeat(model, horizon),
+        }
+    )
+    backtest = pd.DataFrame(
+        {
+            "series_id": keys.to_numpy(),
+            "label": label_values,
+            "units_last_horizon": matrix[:, -horizon:].sum(axis=1),
+            "wape_holt_winters": fitted["model_wape"],
+            "wape_weekday_baseline": fitted["baseline_wape"],
+            "model": model,
+            "alpha": fitted["parameters"][:, 0],
+            "beta": fitted["parameters"][:, 1],
+            "gamma": fitted["parameters"][:, 2],
+        }
+    )
+    return forecast, backtest
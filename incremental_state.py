@@ -0,0 +1,529 @@
+"""Persisted, mergeable partial aggregates for incremental runs of analyze_bulk_data.
+
+A run folds only the new or edited orders into the partials: daily, hourly and
+daily-KPI sums, order value/lines/units counts (for exact medians and
+quartiles), product, category and cube sums, the per-customer RFM inputs and
+the anomaly scores from the earliest touched day on. KPIs, basket shape, time
+series, rankings, RFM and the cube are then read from those partials, except
+the trailing revenue windows, which scan the order ledger's timestamps.
+
+Cohorts, affinity, forecasts and the similarity index are still recomputed
+from the order and line ledgers on every run, and ``save_state`` rewrites every
+frame, so those parts cost O(history).
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import analyze_bulk_data as pipeline
+from anomalies import COLUMNS as ANOMALY_COLUMNS
+from kpi_windows import MEASURES, kpis_from_sums
+from stage_scheduler import Stage, StageTiming, run_stages
+
+
+STATE_VERSION = 5
+MANIFEST_FILENAME = "state.json"
+SKETCHES_FILENAME = "order_sketches.json"
+# Edited orders leave their previous values in the sketches; rebuild them once such stale
+# orders could shift a quantile by about as much as the KLL rank error itself.
+STALE_SKETCH_SHARE = 0.01
+
+ORDER_LEDGER_COLUMNS = [
+    "id",
+    "updatedAt",
+    "customer.id",
+    "created_at_bogota",
+    "created_date",
+    "created_hour",
+    "total_price",
+    "subtotal_amount",
+    "discount_amount",
+    "shipping_amount",
+    "tax_amount",
+    "lines",
+    "units",
+    "line_revenue",
+]
+SKETCH_COLUMNS = ["total_price", "lines", "units", "customer.id"]
+BASKET_COUNTS = ["orders_single_line", "orders_multi_line"]
+PRODUCT_ATTRIBUTES = ["product_title", "vendor", "product_type", "category", "subcategory"]
+
+# name -> (group keys, summed columns, count column used to drop empty groups)
+PARTIALS = {
+    "daily": (["date"], ["revenue", "orders_count", "units"], "orders_count"),
+    "hourly": (["hour"], ["revenue", "orders_count"], "orders_count"),
+    "kpi_daily": (["date"], MEASURES + BASKET_COUNTS, "total_orders"),
+    # Orders per distinct value, so medians and quartiles stay exact and retractable.
+    "order_values": (["total_price"], ["orders"], "orders"),
+    "lines_per_order": (["lines"], ["orders"], "orders"),
+    "units_per_order": (["units"], ["orders"], "orders"),
+    "products": (["variant.product.id"], ["units", "revenue", "lines"], "lines"),
+    "categories": (["category", "subcategory"], ["units", "revenue", "lines"], "lines"),
+    "cube": (pipeline.CUBE_DIMENSIONS, ["revenue", "units", "lines", "orders"], "lines"),
+}
+LINE_LEDGER_KEYS = ["__parentId", "variant.product.id", "category", "subcategory", "variant.product.vendor"]
+
+
+def _empty_frame(columns: list[str]) -> pd.DataFrame:
+    return pd.DataFrame({column: pd.Series(dtype=object) for column in columns})
+
+
+@dataclass
+class PipelineState:
+    watermark: pd.Timestamp | None = None
+    orders: pd.DataFrame = field(default_factory=lambda: _empty_frame(ORDER_LEDGER_COLUMNS))
+    order_lines: pd.DataFrame = field(
+        default_factory=lambda: _empty_frame(LINE_LEDGER_KEYS + ["units", "revenue", "lines"])
+    )
+    product_attributes: pd.DataFrame = field(
+        default_factory=lambda: _empty_frame(PRODUCT_ATTRIBUTES).rename_axis("variant.product.id")
+    )
+    customers: pd.DataFrame = field(
+        default_factory=lambda: _empty_frame(["customer.id", "last_purchase", "frequency", "monetary"])
+    )
+    partials: dict[str, pd.DataFrame] = field(
+        default_factory=lambda: {name: _empty_frame(keys + values) for name, (keys, values, _) in PARTIALS.items()}
+    )
+    anomalies: pd.DataFrame = field(default_factory=lambda: _empty_frame(ANOMALY_COLUMNS))
+    order_sketches: pipeline.OrderSketches = field(default_factory=pipeline.new_order_sketches)
+    stale_sketch_orders: int = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return self.watermark is None
+
+
+def load_state(directory: Path) -> PipelineState:
+    manifest_path = directory / MANIFEST_FILENAME
+    if not manifest_path.exists():
+        return PipelineState()
+
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    if manifest.get("version") != STATE_VERSION:
+        raise ValueError(
+            f"Incompatible state version {manifest.get('version')} in {directory}; rebuild it with --reset-state."
+        )
+    return PipelineState(
+        watermark=pd.Timestamp(manifest["watermark"]) if manifest.get("watermark") else None,
+        orders=pd.read_pickle(directory / "orders.pkl"),
+        order_lines=pd.read_pickle(directory / "order_lines.pkl"),
+        product_attributes=pd.read_pickle(directory / "product_attributes.pkl"),
+        customers=pd.read_pickle(directory / "customers.pkl"),
+        partials={name: pd.read_pickle(directory / f"{name}.pkl") for name in PARTIALS},
+        anomalies=pd.read_pickle(directory / "anomalies.pkl"),
+        order_sketches=pipeline.OrderSketches.from_dict(
+            json.loads((directory / SKETCHES_FILENAME).read_text(encoding="utf-8"))
+        ),
+        stale_sketch_orders=manifest["stale_sketch_orders"],
+    )
+
+
+def save_state(state: PipelineState, directory: Path) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    state.orders.to_pickle(directory / "orders.pkl")
+    state.order_lines.to_pickle(directory / "order_lines.pkl")
+    state.product_attributes.to_pickle(directory / "product_attributes.pkl")
+    state.customers.to_pickle(directory / "customers.pkl")
+    for name, frame in state.partials.items():
+        frame.to_pickle(directory / f"{name}.pkl")
+    state.anomalies.to_pickle(directory / "anomalies.pkl")
+    (directory / SKETCHES_FILENAME).write_text(json.dumps(state.order_sketches.to_dict()), encoding="utf-8")
+
+    # The manifest is written last so an interrupted save keeps the previous watermark.
+    manifest = {
+        "version": STATE_VERSION,
+        "watermark": state.watermark.isoformat() if state.watermark is not None else None,
+        "orders": len(state.orders),
+        "stale_sketch_orders": state.stale_sketch_orders,
+    }
+    (directory / MANIFEST_FILENAME).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+
+def select_delta(
+    orders: pd.DataFrame, items: pd.DataFrame, watermark: pd.Timestamp | None
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    if watermark is None:
+        return orders, items
+    updated_at = pd.to_datetime(orders["updatedAt"], utc=True)
+    # Orders stamped at the watermark itself may have landed after the previous export; taking
+    # them again is safe because already ledgered orders are retracted before being re-applied.
+    delta_orders = orders.loc[updated_at >= watermark]
+    delta_items = items.loc[items["__parentId"].isin(delta_orders["id"])]
+    return delta_orders, delta_items
+
+
+def _concat(base: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    # Skip the empty initial state so it does not degrade the column dtypes to object.
+    if base.empty:
+        return new.reset_index(drop=True)
+    if new.empty:
+        return base.reset_index(drop=True)
+    return pd.concat([base, new], ignore_index=True)
+
+
+def _merge_partial(base: pd.DataFrame, delta: pd.DataFrame, name: str, sign: int) -> pd.DataFrame:
+    keys, values, count_column = PARTIALS[name]
+    if delta.empty:
+        return base
+    delta = delta[keys + values].copy()
+    delta[values] = delta[values] * sign
+    merged = _concat(base[keys + values], delta).groupby(keys, dropna=False)[values].sum()
+    return merged.loc[merged[count_column] > 0].reset_index()
+
+
+def _value_counts(values: pd.Series) -> pd.DataFrame:
+    return values.value_counts(sort=False).rename("orders").reset_index()
+
+
+def _order_partials(orders: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    daily, hourly = pipeline.build_time_series(orders)
+    basket = pd.DataFrame(
+        {
+            "date": orders["created_date"],
+            "orders_single_line": (orders["lines"] == 1).astype(float),
+            "orders_multi_line": (orders["lines"] >= 2).astype(float),
+        }
+    )
+    kpi_daily = pipeline.build_kpi_daily(orders).merge(basket.groupby("date").sum().reset_index(), on="date")
+    return {
+        "daily": daily,
+        "hourly": hourly,
+        "kpi_daily": kpi_daily,
+        "order_values": _value_counts(orders["total_price"]),
+        "lines_per_order": _value_counts(orders["lines"]),
+        "units_per_order": _value_counts(orders["units"]),
+    }
+
+
+def _line_partials(order_lines: pd.DataFrame, orders: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    _, values, _ = PARTIALS["products"]
+    cube_lines = pd.DataFrame(
+        {
+            "date": order_lines["__parentId"].map(orders.set_index("id")["created_date"]),
+            "category": order_lines["category"],
+            "subcategory": order_lines["subcategory"],
+            "vendor": order_lines["variant.product.vendor"],
+            "order_id": order_lines["__parentId"],
+            "revenue": order_lines["revenue"],
+            "units": order_lines["units"],
+            "lines": order_lines["lines"],
+        }
+    ).dropna(subset=["date"])
+    return {
+        "products": order_lines.groupby("variant.product.id")[values].sum().reset_index(),
+        "categories": order_lines.groupby(["category", "subcategory"])[values].sum().reset_index(),
+        "cube": pipeline.aggregate_cube(cube_lines).reset_index(),
+    }
+
+
+def _summarize_order_lines(items: pd.DataFrame) -> pd.DataFrame:
+    items = items.assign(**{"variant.product.vendor": items["variant.product.vendor"].astype(object)})
+    return (
+        items.groupby(LINE_LEDGER_KEYS, dropna=False, sort=False)
+        .agg(units=("quantity", "sum"), revenue=("line_revenue", "sum"), lines=("id", "count"))
+        .reset_index()
+    )
+
+
+def _changed_sketch_values(previous: pd.DataFrame, current: pd.DataFrame) -> pd.Series:
+    """Whether each previously ledgered order now has different sketched values."""
+    previous = previous.set_index("id")[SKETCH_COLUMNS]
+    current = current.set_index("id")[SKETCH_COLUMNS].reindex(previous.index)
+    same = (previous == current) | (previous.isna() & current.isna())
+    return ~same.all(axis=1)
+
+
+def _fold_sketches(
+    state: PipelineState, retracted_orders: pd.DataFrame, orders: pd.DataFrame, ledger: pd.DataFrame
+) -> tuple[pipeline.OrderSketches, int]:
+    """Merge the sketches of new orders and of edits that changed a sketched value into the stored ones."""
+    changed = _changed_sketch_values(retracted_orders, orders)
+    stale = state.stale_sketch_orders + int(changed.sum())
+    if stale > STALE_SKETCH_SHARE * len(ledger):
+        return pipeline.build_order_sketches(ledger), 0
+    added = orders.loc[~orders["id"].isin(retracted_orders["id"]) | orders["id"].isin(changed.index[changed])]
+    return pipeline.build_order_sketches(added).merge(state.order_sketches), stale
+
+
+def apply_delta(state: PipelineState, orders_raw: pd.DataFrame, items_raw: pd.DataFrame) -> PipelineState:
+    """Fold a batch of new or edited orders into ``state``.
+
+    Orders already present in the ledger are retracted first, so an edited order
+    replaces its previous contribution instead of being counted twice. The order
+    sketches cannot retract a value, so only new orders and edits that changed a
+    sketched value are added to them (see ``STALE_SKETCH_SHARE``).
+    """
+    if orders_raw.empty:
+        return state
+
+    orders = pipeline.enrich_order_columns(orders_raw.copy())
+    items = pipeline.enrich_items(items_raw.copy())
+    orders = pipeline.attach_line_summary(orders, pipeline.summarize_order_lines(items))
+    orders["updatedAt"] = pd.to_datetime(orders["updatedAt"], utc=True)
+    orders = orders[ORDER_LEDGER_COLUMNS]
+    order_lines = _summarize_order_lines(items)
+
+    edited = state.orders["id"].isin(orders["id"])
+    retracted_orders = state.orders.loc[edited]
+    retracted_lines = state.order_lines.loc[state.order_lines["__parentId"].isin(retracted_orders["id"])]
+
+    partials = dict(state.partials)
+    for sign, order_frame, line_frame in ((-1, retracted_orders, retracted_lines), (1, orders, order_lines)):
+        if order_frame.empty:
+            continue
+        for name, frame in {**_order_partials(order_frame), **_line_partials(line_frame, order_frame)}.items():
+            partials[name] = _merge_partial(partials[name], frame, name, sign)
+
+    ledger = _concat(state.orders.loc[~edited], orders)
+    lines_ledger = _concat(
+        state.order_lines.loc[~state.order_lines["__parentId"].isin(retracted_orders["id"])], order_lines
+    )
+    order_sketches, stale_sketch_orders = _fold_sketches(state, retracted_orders, orders, ledger)
+
+    new_attributes = pipeline.aggregate_products(items)[PRODUCT_ATTRIBUTES]
+    if state.product_attributes.empty:
+        product_attributes = new_attributes
+    else:
+        product_attributes = state.product_attributes.combine_first(new_attributes)[PRODUCT_ATTRIBUTES]
+
+    # last_purchase is a max and cannot be retracted, so touched customers are
+    # recomputed exactly from their rows in the order ledger.
+    touched = pd.concat([retracted_orders["customer.id"], orders["customer.id"]]).dropna().unique()
+    refreshed = pipeline.aggregate_customers(ledger.loc[ledger["customer.id"].isin(touched)])
+    customers = _concat(state.customers.loc[~state.customers["customer.id"].isin(touched)], refreshed)
+
+    # Scores only look back in time, so only points from the earliest touched day on can change.
+    since = pd.Timestamp(pd.concat([retracted_orders["created_date"], orders["created_date"]]).min())
+    anomalies = _concat(
+        state.anomalies.loc[pd.to_datetime(state.anomalies["period"]) < since],
+        pipeline.build_anomalies(ledger, partials["cube"], since),
+    )
+
+    watermark = orders["updatedAt"].max()
+    if state.watermark is not None:
+        watermark = max(watermark, state.watermark)
+
+    return PipelineState(
+        watermark=watermark,
+        orders=ledger,
+        order_lines=lines_ledger,
+        product_attributes=product_attributes,
+        customers=customers,
+        partials=partials,
+        anomalies=anomalies,
+        order_sketches=order_sketches,
+        stale_sketch_orders=stale_sketch_orders,
+    )
+
+
+def _quantiles(counts: pd.DataFrame, column: str, qs: list[float]) -> np.ndarray:
+    """``Series.quantile`` (linear interpolation) of a column stored as per-value order counts."""
+    if counts.empty:
+        return np.full(len(qs), np.nan)
+    counts = counts.sort_values(column)
+    values = counts[column].to_numpy(dtype=float)
+    cumulative = counts["orders"].to_numpy(dtype=float).cumsum()
+    positions = np.asarray(qs) * (cumulative[-1] - 1)
+    # The value at 0-based rank r is the first one whose cumulative count exceeds r.
+    lower = values[np.searchsorted(cumulative, np.floor(positions), side="right")]
+    upper = values[np.searchsorted(cumulative, np.ceil(positions), side="right")]
+    return lower + (upper - lower) * (positions - np.floor(positions))
+
+
+def _compute_kpis(state: PipelineState, sketches: pipeline.OrderSketches | None) -> pipeline.KPIBundle:
+    """``pipeline.compute_kpis`` of the order ledger, read from the partials instead of the ledger."""
+    kpi_daily = state.partials["kpi_daily"]
+    totals = kpis_from_sums(kpi_daily[MEASURES].sum().to_numpy())
+    if sketches is not None:
+        total_customers = round(sketches.customers.estimate())
+        median_order_value = sketches.order_value.quantile(0.5)
+        median_lines_per_order = sketches.lines.quantile(0.5)
+        median_units_per_order = sketches.units.quantile(0.5)
+    else:
+        total_customers = len(state.customers)
+        (median_order_value,) = _quantiles(state.partials["order_values"], "total_price", [0.5])
+        (median_lines_per_order,) = _quantiles(state.partials["lines_per_order"], "lines", [0.5])
+        (median_units_per_order,) = _quantiles(state.partials["units_per_order"], "units", [0.5])
+
+    # Trailing windows are bounded at timestamp precision, which daily rows cannot give,
+    # so they are read from the ledger's order timestamps.
+    revenue_last_30_days = revenue_last_90_days = revenue_last_365_days = 0.0
+    if not state.orders.empty:
+        created_at = state.orders["created_at_bogota"]
+        last = created_at.max()
+        revenue_last_30_days, revenue_last_90_days, revenue_last_365_days = (
+            state.orders.loc[created_at >= last - pd.Timedelta(days=days), "total_price"].sum()
+            for days in pipeline.REVENUE_WINDOWS
+        )
+
+    return pipeline.KPIBundle(
+        total_orders=int(totals["total_orders"]),
+        total_customers=total_customers,
+        total_revenue=totals["total_revenue"],
+        subtotal_revenue=totals["subtotal_revenue"],
+        total_discounts=totals["total_discounts"],
+        total_shipping=totals["total_shipping"],
+        total_tax=totals["total_tax"],
+        average_order_value=totals["average_order_value"],
+        median_order_value=median_order_value,
+        orders_with_discount=int(totals["orders_with_discount"]),
+        orders_with_shipping=int(totals["orders_with_shipping"]),
+        share_orders_discount=totals["share_orders_discount"],
+        share_orders_shipping=totals["share_orders_shipping"],
+        avg_lines_per_order=totals["avg_lines_per_order"],
+        median_lines_per_order=median_lines_per_order,
+        avg_units_per_order=totals["avg_units_per_order"],
+        median_units_per_order=median_units_per_order,
+        avg_items_per_order=totals["avg_units_per_order"],
+        median_items_per_order=median_units_per_order,
+        revenue_last_30_days=revenue_last_30_days,
+        revenue_last_90_days=revenue_last_90_days,
+        revenue_last_365_days=revenue_last_365_days,
+    )
+
+
+def _build_basket_shape(state: PipelineState, sketches: pipeline.OrderSketches | None) -> pd.DataFrame:
+    totals = state.partials["kpi_daily"][["total_orders", "total_lines", "total_units", *BASKET_COUNTS]].sum()
+    orders = totals["total_orders"]
+    if sketches is not None:
+        lines_quartiles = sketches.lines.quantiles([0.25, 0.5, 0.75])
+        units_quartiles = sketches.units.quantiles([0.25, 0.5, 0.75])
+    else:
+        lines_quartiles = _quantiles(state.partials["lines_per_order"], "lines", [0.25, 0.5, 0.75])
+        units_quartiles = _quantiles(state.partials["units_per_order"], "units", [0.25, 0.5, 0.75])
+    return pipeline.basket_shape_frame(
+        totals["total_lines"] / orders,
+        lines_quartiles,
+        totals["total_units"] / orders,
+        units_quartiles,
+        totals["orders_single_line"] / orders,
+        totals["orders_multi_line"] / orders,
+    )
+
+
+def _order_sketches(state: PipelineState, enabled: bool = False) -> pipeline.OrderSketches | None:
+    return state.order_sketches if enabled else None
+
+
+def _rank_products(state: PipelineState) -> pd.DataFrame:
+    products = state.partials["products"].set_index("variant.product.id")
+    products = state.product_attributes.join(products[["units", "revenue"]], how="inner")
+    return pipeline.rank_products(products[PRODUCT_ATTRIBUTES + ["units", "revenue"]])
+
+
+def _rank_categories(state: PipelineState) -> pd.DataFrame:
+    return pipeline.rank_categories(
+        state.partials["categories"].set_index(["category", "subcategory"])[["units", "revenue"]]
+    )
+
+
+def _time_series(state: PipelineState) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    daily = state.partials["daily"].sort_values("date").reset_index(drop=True)
+    hourly = state.partials["hourly"].sort_values("hour").reset_index(drop=True)
+    daily["orders_count"] = daily["orders_count"].astype(int)
+    hourly["orders_count"] = hourly["orders_count"].astype(int)
+    hourly["hour"] = hourly["hour"].astype(int)
+    kpi_daily = state.partials["kpi_daily"].sort_values("date").reset_index(drop=True)[["date", *MEASURES]]
+    return daily, hourly, kpi_daily
+
+
+def _score_rfm(state: PipelineState) -> pd.DataFrame:
+    customers = state.customers.sort_values("customer.id").reset_index(drop=True)
+    if customers.empty:
+        return pd.DataFrame()
+    return pipeline.score_rfm(customers, pipeline.rfm_reference_date(customers["last_purchase"]))
+
+
+def _sales_cube(state: PipelineState) -> pd.DataFrame:
+    keys, _, _ = PARTIALS["cube"]
+    sales_cube = state.partials["cube"].sort_values(keys).reset_index(drop=True)
+    sales_cube[["lines", "orders"]] = sales_cube[["lines", "orders"]].astype(int)
+    return sales_cube
+
+
+def _score_affinities(state: PipelineState) -> tuple[pd.DataFrame, pd.DataFrame]:
+    # The line ledger keeps one row per order and product, which is all the co-purchase counts need.
+    return pipeline.score_affinities(pipeline.count_affinities(state.order_lines), state.product_attributes)
+
+
+def _product_daily(state: PipelineState) -> pd.DataFrame:
+    order_dates = state.orders.set_index("id")["created_date"]
+    product_daily = (
+        state.order_lines.assign(date=state.order_lines["__parentId"].map(order_dates))
+        .dropna(subset=["date"])
+        .groupby(["date", "variant.product.id"])["units"]
+        .sum()
+        .reset_index()
+    )
+    product_daily["product_title"] = product_daily["variant.product.id"].map(state.product_attributes["product_title"])
+    return product_daily
+
+
+def _customer_products(state: PipelineState) -> pd.DataFrame:
+    order_customers = state.orders.set_index("id")["customer.id"]
+    customer_products = (
+        state.order_lines.assign(**{"customer.id": state.order_lines["__parentId"].map(order_customers)})
+        .groupby(["customer.id", "variant.product.id"])["units"]
+        .sum()
+        .reset_index()
+    )
+    customer_products["product_title"] = customer_products["variant.product.id"].map(
+        state.product_attributes["product_title"]
+    )
+    return customer_products
+
+
+def _build_cohorts(state: PipelineState) -> pd.DataFrame:
+    return pipeline.build_cohorts(state.orders)
+
+
+def _sorted_anomalies(state: PipelineState) -> pd.DataFrame:
+    return state.anomalies.sort_values(
+        ["period", "dimension", "key", "metric"], ascending=[False, True, True, True]
+    ).reset_index(drop=True)
+
+
+def output_stages(workers: int = 1, forecast_top: int | None = None, sketches: bool = False) -> list[Stage]:
+    """Stages that turn a ``state`` into the ``pipeline.EXPORT_ORDER`` outputs; they only read the state."""
+    return [
+        Stage("order_sketches", _order_sketches, ("state",), kwargs={"enabled": sketches}),
+        Stage("kpis", _compute_kpis, ("state", "order_sketches")),
+        Stage("basket_shape", _build_basket_shape, ("state", "order_sketches")),
+        Stage("top_products", _rank_products, ("state",)),
+        Stage("top_categories", _rank_categories, ("state",)),
+        Stage("time_series", _time_series, ("state",), outputs=("daily", "hourly", "kpi_daily")),
+        Stage("rfm", _score_rfm, ("state",)),
+        Stage("sales_cube", _sales_cube, ("state",)),
+        Stage("affinity", _score_affinities, ("state",), outputs=("product_affinity", "subcategory_affinity")),
+        Stage("cohorts", _build_cohorts, ("state",)),
+        Stage("anomalies", _sorted_anomalies, ("state",)),
+        Stage("product_daily", _product_daily, ("state",)),
+        Stage("customer_products", _customer_products, ("state",)),
+        Stage(
+            "forecast",
+            pipeline.build_forecasts,
+            ("product_daily", "sales_cube"),
+            kwargs={"workers": workers, "top_products": forecast_top},
+            outputs=("demand_forecast", "forecast_backtest"),
+        ),
+        Stage("similarity_index", pipeline.build_similarity_index, ("customer_products",)),
+    ]
+
+
+def build_outputs(
+    state: PipelineState,
+    workers: int = 1,
+    forecast_top: int | None = None,
+    sketches: bool = False,
+    trace_memory: bool = False,
+) -> tuple[tuple, list[StageTiming]]:
+    results, timings = run_stages(
+        output_stages(workers, forecast_top, sketches), {"state": state}, workers, trace_memory
+    )
+    return pipeline.collect_outputs(results), timings
@@ -0,0 +1,121 @@
+"""Trailing-window KPIs at any as-of date from prefix sums over time-sorted orders."""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+
+# KPI name -> order column summed into it.
+SUMMED_COLUMNS = {
+    "total_revenue": "total_price",
+    "subtotal_revenue": "subtotal_amount",
+    "total_discounts": "discount_amount",
+    "total_shipping": "shipping_amount",
+    "total_tax": "tax_amount",
+    "total_lines": "lines",
+    "total_units": "units",
+}
+MEASURES = ["total_orders", *SUMMED_COLUMNS, "orders_with_discount", "orders_with_shipping"]
+DAY_NANOSECONDS = 86_400 * 10**9
+
+
+def order_measures(orders: pd.DataFrame) -> pd.DataFrame:
+    """One row per order with the additive measures behind the decomposable ``KPIBundle`` fields."""
+    measures = pd.DataFrame({"total_orders": np.ones(len(orders))}, index=orders.index)
+    for name, column in SUMMED_COLUMNS.items():
+        measures[name] = orders[column].astype(float)
+    measures["orders_with_discount"] = (orders["discount_amount"] > 0).astype(float)
+    measures["orders_with_shipping"] = (orders["shipping_amount"] > 0).astype(float)
+    return measures[MEASURES]
+
+
+def _nanoseconds(values) -> np.ndarray:
+    return pd.DatetimeIndex(values).as_unit("ns").asi8
+
+
+def _day_after(as_of: pd.Timestamp) -> pd.Timestamp:
+    """Midnight after ``as_of``: the exclusive end of windows that include ``as_of``'s whole day."""
+    return pd.Timestamp(as_of).normalize() + pd.Timedelta(days=1)
+
+
+class WindowedKPIs:
+    """Answer sums, counts and shares over any time window in O(log n).
+
+    Rows are sorted once and every measure is turned into a prefix sum, so a
+    window is two ``searchsorted`` lookups and a subtraction. ``measures`` can
+    hold one row per order or pre-aggregated rows (e.g. one per day).
+    """
+
+    def __init__(self, timestamps: pd.Series, measures: pd.DataFrame) -> None:
+        nanoseconds = _nanoseconds(timestamps)
+        order = np.argsort(nanoseconds, kind="stable")
+        self.tz = pd.DatetimeIndex(timestamps).tz
+        self.timestamps = nanoseconds[order]
+        values = measures[MEASURES].to_numpy(dtype=float)[order]
+        self.prefix = np.vstack([np.zeros((1, len(MEASURES))), np.cumsum(values, axis=0)])
+
+    @classmethod
+    def from_orders(cls, orders: pd.DataFrame) -> WindowedKPIs:
+        return cls(orders["created_at_bogota"], order_measures(orders))
+
+    def _timestamp(self, nanoseconds: int) -> pd.Timestamp:
+        if self.tz is None:
+            return pd.Timestamp(nanoseconds)
+        return pd.Timestamp(nanoseconds, tz="UTC").tz_convert(self.tz)
+
+    @property
+    def first(self) -> pd.Timestamp | None:
+        return self._timestamp(self.timestamps[0]) if len(self.timestamps) else None
+
+    @property
+    def last(self) -> pd.Timestamp | None:
+        return self._timestamp(self.timestamps[-1]) if len(self.timestamps) else None
+
+    def _sums(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        return self.prefix[upper] - self.prefix[lower]
+
+    def trailing_sums(self, as_of: pd.Timestamp, days: list[int]) -> pd.DataFrame:
+        """Measure sums over ``[as_of - days, as_of]`` for every window length at once."""
+        as_of_ns = _nanoseconds([as_of])[0]
+        cutoffs = as_of_ns - np.asarray(days, dtype=np.int64) * DAY_NANOSECONDS
+        lower = np.searchsorted(self.timestamps, cutoffs, side="left")
+        upper = np.full(len(days), np.searchsorted(self.timestamps, as_of_ns, side="right"))
+        return pd.DataFrame(self._sums(lower, upper), index=pd.Index(days, name="days"), columns=MEASURES)
+
+    def day_sums(self, as_of: pd.Timestamp, days: list[int]) -> pd.DataFrame:
+        """Measure sums over the ``days`` calendar days ending on ``as_of``'s day, for every length at once.
+
+        Each window is half-open, ``[stop - days, stop)`` with ``stop`` the midnight after ``as_of``,
+        so a 7-day window holds exactly 7 daily rows.
+        """
+        stop_ns = _nanoseconds([_day_after(as_of)])[0]
+        starts = stop_ns - np.asarray(days, dtype=np.int64) * DAY_NANOSECONDS
+        lower = np.searchsorted(self.timestamps, starts, side="left")
+        upper = np.full(len(days), np.searchsorted(self.timestamps, stop_ns, side="left"))
+        return pd.DataFrame(self._sums(lower, upper), index=pd.Index(days, name="days"), columns=MEASURES)
+
+    def between(self, start: pd.Timestamp, stop: pd.Timestamp) -> dict[str, float]:
+        """KPIs over the half-open interval ``[start, stop)``."""
+        bounds = np.searchsorted(self.timestamps, _nanoseconds([start, stop]), side="left")
+        return kpis_from_sums(self._sums(bounds[:1], bounds[1:])[0])
+
+    def trailing_days(self, as_of: pd.Timestamp, days: int) -> dict[str, float]:
+        return kpis_from_sums(self.day_sums(as_of, [days]).to_numpy()[0])
+
+    def compare(self, as_of: pd.Timestamp, days: int) -> tuple[dict[str, float], dict[str, float]]:
+        """KPIs of the ``days`` calendar days ending on ``as_of`` and of the equally long period right before."""
+        window = pd.Timedelta(days=days)
+        stop = _day_after(as_of)
+        return self.trailing_days(as_of, days), self.between(stop - 2 * window, stop - window)
+
+
+def kpis_from_sums(sums: np.ndarray) -> dict[str, float]:
+    kpis = dict(zip(MEASURES, sums.tolist()))
+    orders = kpis["total_orders"]
+    kpis["average_order_value"] = kpis["total_revenue"] / orders if orders else 0.0
+    kpis["share_orders_discount"] = kpis["orders_with_discount"] / orders if orders else 0.0
+    kpis["share_orders_shipping"] = kpis["orders_with_shipping"] / orders if orders else 0.0
+    kpis["avg_lines_per_order"] = kpis["total_lines"] / orders if orders else 0.0
+    kpis["avg_units_per_order"] = kpis["total_units"] / orders if orders else 0.0
+    return kpis
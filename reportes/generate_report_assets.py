@@ -1,15 +1,29 @@
 #!/usr/bin/env python3
-"""Generate visuals (PNG) for the Premium Nutrition technical report."""
+"""Generate visuals (PNG/SVG) for the Premium Nutrition technical report."""
 
 from __future__ import annotations
 
+import argparse
+import hashlib
+import inspect
+import json
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable
 
-import matplotlib.pyplot as plt
-import pandas as pd
+import matplotlib
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+import pandas as pd  # noqa: E402
 
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR.parent / "analysis_outputs"
+MANIFEST_PATH = BASE_DIR / ".render_manifest.json"
+DEFAULT_DPI = 220
+PREVIEW_DPI = 72
 
 plt.style.use("seaborn-v0_8-whitegrid")
 
@@ -18,7 +32,7 @@ def load_csv(name: str, **kwargs) -> pd.DataFrame:
     return pd.read_csv(DATA_DIR / name, **kwargs)
 
 
-def plot_revenue_trend() -> None:
+def plot_revenue_trend(output: Path, dpi: int = DEFAULT_DPI) -> None:
     df = load_csv("sales_by_day.csv", parse_dates=["date"]).sort_values("date")
 
     fig, ax = plt.subplots(figsize=(12, 5.5))
@@ -29,11 +43,11 @@ def plot_revenue_trend() -> None:
     ax.grid(alpha=0.25)
     fig.autofmt_xdate()
     fig.tight_layout()
-    fig.savefig(BASE_DIR / "img_revenue_trend.png", dpi=220)
+    fig.savefig(output, dpi=dpi)
     plt.close(fig)
 
 
-def plot_sales_by_hour() -> None:
+def plot_sales_by_hour(output: Path, dpi: int = DEFAULT_DPI) -> None:
     df = load_csv("sales_by_hour.csv")
 
     fig, ax = plt.subplots(figsize=(11, 5))
@@ -44,11 +58,11 @@ def plot_sales_by_hour() -> None:
     ax.set_title("Ingresos promedio por hora del día", fontsize=15, color="#d9480f")
     ax.grid(axis="y", alpha=0.25)
     fig.tight_layout()
-    fig.savefig(BASE_DIR / "img_sales_by_hour.png", dpi=220)
+    fig.savefig(output, dpi=dpi)
     plt.close(fig)
 
 
-def plot_top_products() -> None:
+def plot_top_products(output: Path, dpi: int = DEFAULT_DPI) -> None:
     df = load_csv("top_products.csv").head(10)
 
     fig, ax = plt.subplots(figsize=(12, 6))
@@ -59,11 +73,11 @@ def plot_top_products() -> None:
     for bar, value in zip(bars, df["revenue"] / 1_000_000_000):
         ax.text(bar.get_width() + 0.05, bar.get_y() + bar.get_height() / 2, f"{value:.2f}", va="center", fontsize=9)
     fig.tight_layout()
-    fig.savefig(BASE_DIR / "img_top_products.png", dpi=220)
+    fig.savefig(output, dpi=dpi)
     plt.close(fig)
 
 
-def plot_rfm_segments() -> None:
+def plot_rfm_segments(output: Path, dpi: int = DEFAULT_DPI) -> None:
     df = load_csv("rfm_segments.csv")
     counts = df["segment"].map(
         {
@@ -87,16 +101,98 @@ def plot_rfm_segments() -> None:
     )
     ax.set_title("Distribución de clientes por segmento RFM", fontsize=15, color="#0b7285")
     fig.tight_layout()
-    fig.savefig(BASE_DIR / "img_rfm_segments.png", dpi=220)
+    fig.savefig(output, dpi=dpi)
     plt.close(fig)
 
 
+@dataclass(frozen=True)
+class Chart:
+    name: str
+    plot: Callable[[Path, int], None]
+    source: str
+
+
+CHARTS = [
+    Chart("revenue_trend", plot_revenue_trend, "sales_by_day.csv"),
+    Chart("sales_by_hour", plot_sales_by_hour, "sales_by_hour.csv"),
+    Chart("top_products", plot_top_products, "top_products.csv"),
+    Chart("rfm_segments", plot_rfm_segments, "rfm_segments.csv"),
+]
+
+
+def output_path(chart: Chart, output_format: str, preview: bool) -> Path:
+    suffix = "_preview" if preview else ""
+    return BASE_DIR / f"img_{chart.name}{suffix}.{output_format}"
+
+
+def content_hash(chart: Chart, output_format: str, dpi: int) -> str:
+    """Hash of the input CSV, the plot parameters and the plotting code, so any change re-renders the chart."""
+    digest = hashlib.sha256()
+    digest.update((DATA_DIR / chart.source).read_bytes())
+    digest.update(json.dumps({"chart": chart.name, "format": output_format, "dpi": dpi}, sort_keys=True).encode())
+    digest.update(inspect.getsource(chart.plot).encode())
+    return digest.hexdigest()
+
+
+def load_manifest() -> dict[str, str]:
+    if not MANIFEST_PATH.exists():
+        return {}
+    return json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+
+
+def render(chart: Chart, output: Path, dpi: int) -> str:
+    chart.plot(output, dpi)
+    return output.name
+
+
+def render_charts(
+    output_format: str = "png",
+    preview: bool = False,
+    workers: int = 4,
+    force: bool = False,
+) -> tuple[list[str], list[str]]:
+    """Render the charts whose inputs changed and return (rendered, skipped) file names."""
+    dpi = PREVIEW_DPI if preview else DEFAULT_DPI
+    manifest = load_manifest()
+    pending: list[tuple[Chart, Path, str]] = []
+    skipped: list[str] = []
+    for chart in CHARTS:
+        output = output_path(chart, output_format, preview)
+        digest = content_hash(chart, output_format, dpi)
+        if not force and output.exists() and manifest.get(output.name) == digest:
+            skipped.append(output.name)
+        else:
+            pending.append((chart, output, digest))
+
+    if len(pending) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            futures = [executor.submit(render, chart, output, dpi) for chart, output, _ in pending]
+            rendered = [future.result() for future in futures]
+    else:
+        rendered = [render(chart, output, dpi) for chart, output, _ in pending]
+
+    # Only charts that rendered successfully reach this point, so the manifest never vouches for a stale file.
+    manifest.update({output.name: digest for _, output, digest in pending})
+    MANIFEST_PATH.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    return rendered, skipped
+
+
 def main() -> None:
-    plot_revenue_trend()
-    plot_sales_by_hour()
-    plot_top_products()
-    plot_rfm_segments()
-    print("Charts refreshed in", BASE_DIR)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--format", choices=("png", "svg"), default="png", help="Image format of the charts.")
+    parser.add_argument(
+        "--preview",
+        action="store_true",
+        help=f"Render low-resolution *_preview files at {PREVIEW_DPI} dpi instead of {DEFAULT_DPI} dpi.",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Processes used to render charts in parallel.")
+    parser.add_argument("--force", action="store_true", help="Re-render every chart even if its inputs are unchanged.")
+    args = parser.parse_args()
+
+    rendered, skipped = render_charts(args.format, args.preview, args.workers, args.force)
+    print(f"Charts refreshed in {BASE_DIR}: {len(rendered)} rendered, {len(skipped)} unchanged")
+    for name in rendered:
+        print(f"  rendered {name}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+"""Item-item cosine index and per-customer recommendations from a sparse customer x product matrix.
+
+Nothing customer-sized is ever dense: purchases are a CSR matrix, product
+similarities keep the top ``NEIGHBORS`` per product, and a customer's
+recommendations come from summing the neighbour lists of what they bought.
+Results are saved as fixed-width ``.npy`` arrays that ``SimilarityIndex.load``
+memory-maps, customer ids included (sorted UTF-8 bytes), so a lookup is a
+binary search over the mapped ids plus one row read.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+NEIGHBORS = 20
+RECOMMENDATIONS = 10
+ARRAYS = ("customer_ids", "item_neighbors", "item_scores", "recommendations", "recommendation_scores")
+
+
+def purchase_matrix(
+    customer_ids: pd.Series, product_ids: pd.Series, units: pd.Series
+) -> tuple[sparse.csr_matrix, pd.Index, pd.Index]:
+    """CSR customer x product matrix weighted by ``log1p(units)``, with the row and column labels."""
+    customer_codes, customers = pd.factorize(customer_ids, sort=True)
+    product_codes, products = pd.factorize(product_ids, sort=True)
+    valid = (customer_codes >= 0) & (product_codes >= 0)
+    matrix = sparse.csr_matrix(
+        (units.to_numpy(dtype=float)[valid], (customer_codes[valid], product_codes[valid])),
+        shape=(len(customers), len(products)),
+    )
+    matrix.data = np.log1p(matrix.data)
+    matrix.eliminate_zeros()
+    return matrix, pd.Index(customers), pd.Index(products)
+
+
+def _find(sorted_ids: np.ndarray, key) -> int | None:
+    row = int(np.searchsorted(sorted_ids, key))
+    return row if row < len(sorted_ids) and sorted_ids[row] == key else None
+
+
+def top_k_per_row(matrix: sparse.csr_matrix, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Column indices and values of the ``k`` largest entries of every row, padded with -1 and 0."""
+    matrix = matrix.tocsr()
+    matrix.eliminate_zeros()
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    # The column breaks ties so the result does not depend on the storage order.
+    order = np.lexsort((matrix.indices, -matrix.data, rows))
+    rank = np.arange(len(order)) - matrix.indptr[rows[order]]
+    kept = order[rank < k]
+    columns = np.full((matrix.shape[0], k), -1, dtype=np.int32)
+    values = np.zeros((matrix.shape[0], k), dtype=np.float32)
+    columns[rows[kept], rank[rank < k]] = matrix.indices[kept]
+    values[rows[kept], rank[rank < k]] = matrix.data[kept]
+    return columns, values
+
+
+def item_cosine(matrix: sparse.csr_matrix, k: int = NEIGHBORS) -> tuple[np.ndarray, np.ndarray]:
+    """Top ``k`` most similar products per product by cosine over the customer axis."""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    normalized = matrix @ sparse.diags(np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0))
+    similarity = (normalized.T @ normalized).tocsr()
+    similarity.setdiag(0)
+    return top_k_per_row(similarity, k)
+
+
+def recommend(
+    matrix: sparse.csr_matrix, neighbors: np.ndarray, scores: np.ndarray, k: int = RECOMMENDATIONS
+) -> tuple[np.ndarray, np.ndarray]:
+    """Top ``k`` products per customer that they have not bought, scored through the neighbour lists."""
+    n_products = matrix.shape[1]
+    present = neighbors >= 0
+    neighbor_matrix = sparse.csr_matrix(
+        (scores[present], (np.nonzero(present)[0], neighbors[present])), shape=(n_products, n_products)
+    )
+    candidates = (matrix @ neighbor_matrix).tocsr()
+    candidates = candidates - candidates.multiply(matrix.astype(bool))
+    return top_k_per_row(candidates, k)
+
+
+@dataclass
+class SimilarityIndex:
+    # Ids are strings in sorted order, matching the rows of the arrays; customer ids are
+    # stored as UTF-8 bytes, whose order is the same, so they can be memory-mapped.
+    customer_ids: np.ndarray
+    product_ids: np.ndarray
+    product_titles: np.ndarray
+    item_neighbors: np.ndarray
+    item_scores: np.ndarray
+    recommendations: np.ndarray
+    recommendation_scores: np.ndarray
+
+    @classmethod
+    def build(
+        cls, customer_products: pd.DataFrame, neighbors: int = NEIGHBORS, recommendations: int = RECOMMENDATIONS
+    ) -> SimilarityIndex:
+        """Build from rows of ``customer.id``, ``variant.product.id``, ``product_title`` and ``units``."""
+        # Ids are looked up as strings whatever their type in the export, so they are also sorted as strings.
+        customer_ids = customer_products["customer.id"].astype("string")
+        product_ids = customer_products["variant.product.id"].astype("string")
+        matrix, customers, products = purchase_matrix(customer_ids, product_ids, customer_products["units"])
+        titles = customer_products["product_title"].groupby(product_ids).first()
+        item_neighbors, item_scores = item_cosine(matrix, neighbors)
+        recommended, recommendation_scores = recommend(matrix, item_neighbors, item_scores, recommendations)
+        return cls(
+            np.char.encode(customers.to_numpy(dtype=str), "utf-8"),
+            products.to_numpy(dtype=object),
+            titles.reindex(products).to_numpy(dtype=object),
+            item_neighbors,
+            item_scores,
+            recommended,
+            recommendation_scores,
+        )
+
+    def save(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        pd.DataFrame({"variant.product.id": self.product_ids, "product_title": self.product_titles}).to_csv(
+            directory / "products.csv", index=False
+        )
+
+    @classmethod
+    def load(cls, directory: Path) -> SimilarityIndex:
+        """Open a saved index; the arrays, customer ids included, stay on disk and are paged in per lookup."""
+        products = pd.read_csv(directory / "products.csv", dtype={"variant.product.id": str})
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in ARRAYS}
+        return cls(
+            product_ids=products["variant.product.id"].to_numpy(dtype=object),
+            product_titles=products["product_title"].to_numpy(dtype=object),
+            **arrays,
+        )
+
+    def _products(self, positions: np.ndarray, scores: np.ndarray) -> pd.DataFrame:
+        present = positions >= 0
+        return pd.DataFrame(
+            {
+                "variant.product.id": self.product_ids[positions[present]],
+                "product_title": self.product_titles[positions[present]],
+                "score": scores[present],
+            }
+        )
+
+    def recommend(self, customer_id: str) -> pd.DataFrame:
+        """Products the customer has not bought, best first; empty for unknown customers."""
+        row = _find(self.customer_ids, str(customer_id).encode("utf-8"))
+        if row is None:
+            return self._products(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+        return self._products(np.asarray(self.recommendations[row]), np.asarray(self.recommendation_scores[row]))
+
+    def similar_products(self, product_id: str) -> pd.DataFrame:
+        row = _find(self.product_ids, str(product_id))
+        if row is None:
+            return self._products(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+        return self._products(np.asarray(self.item_neighbors[row]), np.asarray(self.item_scores[row]))
@@ -0,0 +1,152 @@
+"""Mergeable, serializable sketches: KLL quantiles and HyperLogLog distinct counts.
+
+Error bounds (checked against exact values by benchmarks/bench_sketches.py):
+
+* ``KLLSketch(k=200)``: the rank of a returned quantile is within about 1.7% of
+  the requested rank (99% confidence), independent of the stream length; memory
+  grows with ``k * log(n / k)`` items.
+* ``HyperLogLog(precision=14)``: 16,384 one-byte registers, relative standard
+  error ``1.04 / sqrt(2 ** precision)`` = 0.81%; below ``2.5 * 2 ** precision``
+  (~41k) distinct values linear counting takes over, with a similar or lower error.
+
+Both are merged losslessly with respect to their bounds, so sketches built per
+chunk or per day can be combined later.
+"""
+
+from __future__ import annotations
+
+import base64
+import math
+
+import numpy as np
+import pandas as pd
+
+
+UPDATE_BATCH = 65_536
+
+
+class KLLSketch:
+    """KLL quantile sketch: level ``h`` keeps items with weight ``2 ** h``."""
+
+    def __init__(self, k: int = 200, seed: int = 0) -> None:
+        self.k = k
+        self.count = 0
+        self.levels: list[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        # Lower levels shrink geometrically (factor 2/3), which is what bounds the total size.
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item stays behind so the total weight is preserved exactly.
+                keep, items = items[: len(items) % 2], items[len(items) % 2 :]
+                promoted = items[self._rng.integers(0, 2) :: 2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values) -> KLLSketch:
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        # A compaction adds at most one unit of rank error per item weight whatever the buffer
+        # size, so large slices are both faster and no less accurate; they only bound memory.
+        for start in range(0, len(values), UPDATE_BATCH):
+            self.levels[0] = np.concatenate([self.levels[0], values[start : start + UPDATE_BATCH]])
+            self._compress()
+        self.count += len(values)
+        return self
+
+    def merge(self, other: KLLSketch) -> KLLSketch:
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def quantiles(self, qs) -> np.ndarray:
+        qs = np.atleast_1d(np.asarray(qs, dtype=float))
+        if self.count == 0:
+            return np.full(len(qs), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0**h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        positions = np.searchsorted(cumulative, qs * cumulative[-1], side="left")
+        return items[order][np.clip(positions, 0, len(items) - 1)]
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "count": self.count, "levels": [level.tolist() for level in self.levels]}
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> KLLSketch:
+        sketch = cls(payload["k"])
+        sketch.count = payload["count"]
+        sketch.levels = [np.asarray(level, dtype=float) for level in payload["levels"]]
+        return sketch
+
+
+def _leading_zeros(values: np.ndarray) -> np.ndarray:
+    zeros = np.zeros(len(values), dtype=np.int64)
+    values = values.copy()
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = (values >> np.uint64(64 - shift)) == 0
+        zeros += np.where(empty, shift, 0)
+        values = np.where(empty, values << np.uint64(shift), values)
+    return zeros + (values == 0)
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter over values hashed with ``pandas.util.hash_array``."""
+
+    def __init__(self, precision: int = 14) -> None:
+        self.precision = precision
+        self.registers = np.zeros(2**precision, dtype=np.uint8)
+
+    def update(self, values) -> HyperLogLog:
+        values = pd.Series(values).dropna().astype(str).to_numpy(dtype=object)
+        if len(values) == 0:
+            return self
+        hashes = pd.util.hash_array(values)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        remainder = hashes << np.uint64(self.precision)
+        rank = np.minimum(_leading_zeros(remainder), 64 - self.precision) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+        return self
+
+    def merge(self, other: HyperLogLog) -> HyperLogLog:
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.exp2(-self.registers.astype(float)))
+        empty = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and empty:
+            return m * math.log(m / empty)
+        return float(raw)
+
+    def to_dict(self) -> dict:
+        return {"precision": self.precision, "registers": base64.b64encode(self.registers.tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> HyperLogLog:
+        sketch = cls(payload["precision"])
+        sketch.registers = np.frombuffer(base64.b64decode(payload["registers"]), dtype=np.uint8).copy()
+        return sketch
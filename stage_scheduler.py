@@ -0,0 +1,124 @@
+"""Minimal DAG scheduler for the independent aggregation stages of analyze_bulk_data."""
+
+from __future__ import annotations
+
+import time
+import tracemalloc
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[..., Any]
+    inputs: tuple[str, ...] = ()
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    # When set, the result is stored under these names instead of ``name``; a
+    # returned tuple is unpacked when there are several.
+    outputs: tuple[str, ...] = ()
+
+    @property
+    def provides(self) -> tuple[str, ...]:
+        return self.outputs or (self.name,)
+
+
+@dataclass
+class StageTiming:
+    name: str
+    seconds: float
+    started: float
+    # Peak of the memory allocated while the stage ran (tracemalloc), when traced.
+    peak_mb: float | None = None
+
+
+def _validate(stages: list[Stage], available: set[str]) -> None:
+    names = [name for stage in stages for name in stage.provides]
+    duplicated = {name for name in names if names.count(name) > 1 or name in available}
+    if duplicated:
+        raise ValueError(f"Duplicated stage outputs: {sorted(duplicated)}")
+    known = available | set(names)
+    for stage in stages:
+        missing = [name for name in stage.inputs if name not in known]
+        if missing:
+            raise ValueError(f"Stage {stage.name!r} depends on unknown inputs {missing}")
+
+
+def run_stages(
+    stages: list[Stage],
+    context: dict[str, Any],
+    workers: int = 1,
+    trace_memory: bool = False,
+) -> tuple[dict[str, Any], list[StageTiming]]:
+    """Run ``stages`` as soon as their inputs are available and return (results, timings).
+
+    Stages run on a thread pool: the shared DataFrames in ``context`` are read in
+    place by every worker, without pickling or copying them. Stages must treat
+    their inputs as read-only.
+
+    With ``trace_memory`` every stage also records the peak memory it allocated
+    (Python and NumPy allocations, via ``tracemalloc``). Peaks of concurrent
+    stages would be indistinguishable, so tracing requires a single worker.
+    """
+    if trace_memory and workers > 1:
+        raise ValueError("trace_memory needs workers=1 so that stage peaks do not overlap")
+    _validate(stages, set(context))
+    results = dict(context)
+    timings: list[StageTiming] = []
+    pending = list(stages)
+    origin = time.perf_counter()
+
+    def timed(stage: Stage) -> tuple[Any, StageTiming]:
+        if trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        value = stage.func(*(results[name] for name in stage.inputs), **stage.kwargs)
+        timing = StageTiming(stage.name, time.perf_counter() - started, started - origin)
+        if trace_memory:
+            timing.peak_mb = (tracemalloc.get_traced_memory()[1] - baseline) / 2**20
+        return value, timing
+
+    stop_tracing = trace_memory and not tracemalloc.is_tracing()
+    if stop_tracing:
+        tracemalloc.start()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        running: dict[Future, Stage] = {}
+        while pending or running:
+            ready = [stage for stage in pending if all(name in results for name in stage.inputs)]
+            for stage in ready:
+                pending.remove(stage)
+                running[executor.submit(timed, stage)] = stage
+            if not running:
+                raise ValueError(f"Stages with unsatisfiable dependencies: {[stage.name for stage in pending]}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                value, timing = future.result()
+                if len(stage.outputs) == 1:
+                    results[stage.outputs[0]] = value
+                elif stage.outputs:
+                    results.update(zip(stage.outputs, value))
+                else:
+                    results[stage.name] = value
+                timings.append(timing)
+
+    if stop_tracing:
+        tracemalloc.stop()
+    return results, timings
+
+
+def format_timings(timings: list[StageTiming], total_seconds: float | None = None) -> str:
+    traced = any(timing.peak_mb is not None for timing in timings)
+    lines = [f"{'stage':<22}{'start (s)':>10}{'wall (s)':>10}" + (f"{'peak (MiB)':>12}" if traced else "")]
+    for timing in sorted(timings, key=lambda item: item.started):
+        line = f"{timing.name:<22}{timing.started:>10.3f}{timing.seconds:>10.3f}"
+        if traced:
+            line += f"{timing.peak_mb:>12.1f}" if timing.peak_mb is not None else f"{'':>12}"
+        lines.append(line)
+    if total_seconds is not None:
+        lines.append(f"{'total':<22}{'':>10}{total_seconds:>10.3f}")
+    return "\n".join(lines)